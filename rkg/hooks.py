@@ -88,6 +88,11 @@ doctype_js = {
 # before_install = "rkg.install.before_install"
 # after_install = "rkg.install.after_install"
 
+# Migration
+# ------------
+
+after_migrate = ["rkg.utils.schema.clear_schema_cache"]
+
 # Uninstallation
 # ------------
 
@@ -141,6 +146,27 @@ doctype_js = {
 # Hook on document methods and events
 
 doc_events = {
+    "Custom Field": {
+        "on_update": "rkg.utils.schema.clear_schema_cache",
+        "on_trash": "rkg.utils.schema.clear_schema_cache"
+    },
+    "Item Group": {
+        "on_update": "rkg.rkg.doctype.load_dispatch.load_dispatch.clear_item_group_cache",
+        "on_trash": "rkg.rkg.doctype.load_dispatch.load_dispatch.clear_item_group_cache",
+        "after_rename": "rkg.rkg.doctype.load_dispatch.load_dispatch.clear_item_group_cache"
+    },
+    "Load Dispatch": {
+        "on_submit": "rkg.rkg.doctype.frame_lineage.frame_lineage.update_lineage_from_load_dispatch",
+        "on_cancel": "rkg.rkg.doctype.frame_lineage.frame_lineage.clear_lineage_from_load_dispatch"
+    },
+    "Frame Bundle": {
+        "on_submit": "rkg.rkg.doctype.frame_lineage.frame_lineage.update_lineage_from_frame_bundle",
+        "on_cancel": "rkg.rkg.doctype.frame_lineage.frame_lineage.clear_lineage_from_frame_bundle"
+    },
+    "Damage Assessment": {
+        "on_submit": "rkg.rkg.doctype.frame_lineage.frame_lineage.update_lineage_from_damage_assessment",
+        "on_cancel": "rkg.rkg.doctype.frame_lineage.frame_lineage.clear_lineage_from_damage_assessment"
+    },
     "Purchase Receipt": {
         "validate": [
             "rkg.rkg.doctype.load_dispatch.load_dispatch.preserve_purchase_receipt_uom",
@@ -150,15 +176,12 @@ doc_events = {
             "rkg.rkg.doctype.load_dispatch.load_dispatch.sync_warehouse_from_purchase_receipt_to_load_dispatch"
         ],
         "on_submit": [
-            "rkg.rkg.doctype.load_dispatch.load_dispatch.sync_warehouse_from_purchase_receipt_to_load_dispatch",
-            "rkg.rkg.doctype.load_plan.load_plan.update_load_plan_status_from_document",
-            "rkg.rkg.doctype.load_dispatch.load_dispatch.update_load_dispatch_totals_from_document",
-            "rkg.rkg.doctype.load_dispatch.load_dispatch.update_load_dispatch_status_from_totals"
+            "rkg.rkg.doctype.frame_lineage.frame_lineage.update_lineage_from_purchase_receipt",
+            "rkg.rkg.doctype.load_dispatch.load_dispatch.on_purchase_document_event"
         ],
         "on_cancel": [
-            "rkg.rkg.doctype.load_dispatch.load_dispatch.update_load_dispatch_totals_from_document",
-            "rkg.rkg.doctype.load_dispatch.load_dispatch.update_load_dispatch_status_from_totals",
-            "rkg.rkg.doctype.load_plan.load_plan.update_load_plan_status_from_document"
+            "rkg.rkg.doctype.frame_lineage.frame_lineage.clear_lineage_from_purchase_receipt",
+            "rkg.rkg.doctype.load_dispatch.load_dispatch.on_purchase_document_event"
         ]
     },
     "Purchase Invoice": {
@@ -168,14 +191,12 @@ doc_events = {
             "rkg.rkg.doctype.load_dispatch.load_dispatch.preserve_purchase_invoice_serial_no_from_receipt"
         ],
         "on_submit": [
-            "rkg.rkg.doctype.load_plan.load_plan.update_load_plan_status_from_document",
-            "rkg.rkg.doctype.load_dispatch.load_dispatch.update_load_dispatch_totals_from_document",
-            "rkg.rkg.doctype.load_dispatch.load_dispatch.update_load_dispatch_status_from_totals"
+            "rkg.rkg.doctype.frame_lineage.frame_lineage.update_lineage_from_purchase_invoice",
+            "rkg.rkg.doctype.load_dispatch.load_dispatch.on_purchase_document_event"
         ],
         "on_cancel": [
-            "rkg.rkg.doctype.load_dispatch.load_dispatch.update_load_dispatch_totals_from_document",
-            "rkg.rkg.doctype.load_dispatch.load_dispatch.update_load_dispatch_status_from_totals",
-            "rkg.rkg.doctype.load_plan.load_plan.update_load_plan_status_from_document"
+            "rkg.rkg.doctype.frame_lineage.frame_lineage.clear_lineage_from_purchase_invoice",
+            "rkg.rkg.doctype.load_dispatch.load_dispatch.on_purchase_document_event"
         ]
     }    
 }
@@ -201,6 +222,15 @@ doc_events = {
 # 	],
 # }
 
+scheduler_events = {
+    "all": [
+        "rkg.utils.rollups.flush_rollup_queue"
+    ],
+    "daily": [
+        "rkg.rkg.doctype.load_dispatch.load_dispatch.reconcile_dispatch_counters"
+    ]
+}
+
 # Testing
 # -------
 
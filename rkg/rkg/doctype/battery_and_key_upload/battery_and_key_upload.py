@@ -5,11 +5,53 @@ import frappe
 from frappe import _
 from frappe.model.document import Document
 import os
-import csv
 import re
-from frappe.utils import get_site_path, getdate, date_diff, now_datetime, time_diff_in_hours
+from frappe.utils import getdate, date_diff, now_datetime, time_diff_in_hours
 from datetime import datetime as dt, timedelta
 
+from rkg.utils.file_import import compile_column_plan, get_file_path, iter_chunks, read_tabular_file
+from rkg.rkg.doctype.frame_lineage.frame_lineage import get_frame_lineage, get_purchase_receipts_by_frame
+from rkg.utils.parse_cache import get_cached_parse
+from rkg.utils.write_buffer import buffer_set_value
+
+
+BATTERY_COLUMN_MAPPING = {
+	'frame no': 'frame_no',
+	'frame number': 'frame_no',
+	'serial no': 'frame_no',
+	'key no': 'key_no',
+	'key number': 'key_no',
+	'battery serial no': 'battery_serial_no',
+	'sample battery serial no': 'battery_serial_no',
+	'battery no': 'battery_serial_no',
+	'battery number': 'battery_serial_no',
+	'battery brand': 'battery_brand',
+	'brand': 'battery_brand',
+	'battery type': 'battery_type',
+	'type': 'battery_type',
+	'batery type': 'battery_type',
+	'sample charging date': 'sample_charging_date',
+	'sample battery charging date': 'sample_charging_date',
+	'charging date': 'charging_date',
+}
+
+
+def _cell_str(value):
+	return str(value).strip()
+
+
+def read_battery_upload_rows(file_path):
+	"""Read a Battery and Key Upload file into dicts keyed by upload fieldname (all values as stripped strings).
+
+	Rows are cached by file content, so the preview and the import of the same file parse it once.
+	"""
+	def parse():
+		headers, rows = read_tabular_file(file_path)
+		plan = compile_column_plan(headers, BATTERY_COLUMN_MAPPING, default_converter=_cell_str)
+		return [plan.map_row(row) for chunk in iter_chunks(rows) for row in chunk]
+
+	return get_cached_parse("battery_and_key_upload", file_path, parse)
+
 
 @frappe.whitelist()
 def process_excel_file_for_preview(file_url):
@@ -17,57 +59,32 @@ def process_excel_file_for_preview(file_url):
 		if not file_url:
 			return {"error": "No file attached"}
 		
-		if file_url.startswith('/files/'):
-			file_path = get_site_path('public', file_url[1:])
-		elif file_url.startswith('/private/files/'):
-			file_path = get_site_path('private', 'files', file_url.split('/')[-1])
-		else:
-			file_path = get_site_path('public', 'files', file_url)
+		file_path = get_file_path(file_url)
 		
 		if not os.path.exists(file_path):
 			return {"error": f"File not found: {file_path}"}
 		
 		file_ext = os.path.splitext(file_path)[1].lower()
-		rows = []
-		
-		if file_ext == '.csv':
-			with open(file_path, 'r', encoding='utf-8-sig') as f:
-				reader = csv.DictReader(f)
-				rows = list(reader)
-		elif file_ext in ['.xlsx', '.xls']:
-			try:
-				import pandas as pd
-				df = pd.read_excel(file_path)
-				rows = df.to_dict('records')
-			except ImportError:
-				return {"error": "pandas library is required for Excel files. Please install it or use CSV format."}
-		else:
+		if file_ext not in ['.csv', '.xlsx', '.xls']:
 			return {"error": "Unsupported file format. Please upload CSV or Excel file."}
 		
+		rows = read_battery_upload_rows(file_path)
 		if not rows:
 			return {"error": "No data found in the file."}
 		
 		doc = frappe.new_doc("Battery and Key Upload")
 		doc.excel_file = file_url
 		
-		column_map = doc.normalize_columns([col for col in rows[0].keys()] if rows else [])
 		child_table_data = []
 		
-		for idx, row in enumerate(rows, start=1):
-			frame_no = doc.get_value(row, column_map, ['frame_no', 'frame no', 'frame number', 'serial_no', 'serial no'])
-			key_no = doc.get_value(row, column_map, ['key_no', 'key no', 'key number'])
-			battery_serial_no = doc.get_value(row, column_map, [
-				'battery_serial_no', 'battery serial no', 'sample battery serial no',
-				'battery_no', 'battery no', 'battery number'
-			])
-			battery_brand = doc.get_value(row, column_map, ['battery_brand', 'battery brand', 'brand'])
-			battery_type = doc.get_value(row, column_map, ['battery_type', 'battery type', 'type', 'batery type'])
-			sample_charging_date = doc.get_value(row, column_map, [
-				'sample_charging_date', 'sample charging date', 'sample battery charging date'
-			])
-			charging_date_str = doc.get_value(row, column_map, ['charging_date', 'charging date'])
-			if not charging_date_str and sample_charging_date:
-				charging_date_str = sample_charging_date
+		for row in rows:
+			frame_no = row.get('frame_no')
+			key_no = row.get('key_no')
+			battery_serial_no = row.get('battery_serial_no')
+			battery_brand = row.get('battery_brand')
+			battery_type = row.get('battery_type')
+			sample_charging_date = row.get('sample_charging_date')
+			charging_date_str = row.get('charging_date') or sample_charging_date
 			charging_date = doc.parse_date(charging_date_str) if charging_date_str else None
 			
 			if not frame_no:
@@ -175,54 +192,28 @@ class BatteryandKeyUpload(Document):
         if self.upload_items:
             for item in self.upload_items:
                 if item.frame_no:
-                    frappe.db.set_value("Battery Key Upload Item", item.name, "frame_no", None, update_modified=False)
-            frappe.db.commit()
+                    buffer_set_value("Battery Key Upload Item", item.name, {"frame_no": None})
 
     def process_excel_file(self):
         file_path = self.get_file_path()
         if not os.path.exists(file_path):
             frappe.throw(_("File not found: {0}").format(file_path))
 
-        file_ext = os.path.splitext(file_path)[1].lower()
-        rows = []
-
-        if file_ext == '.csv':
-            with open(file_path, 'r', encoding='utf-8-sig') as f:
-                reader = csv.DictReader(f)
-                rows = list(reader)
-        elif file_ext in ['.xlsx', '.xls']:
-            try:
-                import pandas as pd
-                df = pd.read_excel(file_path)
-                rows = df.to_dict('records')
-            except ImportError:
-                frappe.throw(_("pandas library is required for Excel files. Please install it or use CSV format."))
-        else:
-            frappe.throw(_("Unsupported file format. Please upload CSV or Excel file."))
-
+        rows = read_battery_upload_rows(file_path)
         if not rows:
             frappe.throw(_("No data found in the file."))
 
-        column_map = self.normalize_columns([col for col in rows[0].keys()] if rows else [])
-
         child_table_data = []
         total_errors = 0
 
-        for idx, row in enumerate(rows, start=1):
-            frame_no = self.get_value(row, column_map, ['frame_no', 'frame no', 'frame number', 'serial_no', 'serial no'])
-            key_no = self.get_value(row, column_map, ['key_no', 'key no', 'key number'])
-            battery_serial_no = self.get_value(row, column_map, [
-                'battery_serial_no', 'battery serial no', 'sample battery serial no',
-                'battery_no', 'battery no', 'battery number'
-            ])
-            battery_brand = self.get_value(row, column_map, ['battery_brand', 'battery brand', 'brand'])
-            battery_type = self.get_value(row, column_map, ['battery_type', 'battery type', 'type', 'batery type'])
-            sample_charging_date = self.get_value(row, column_map, [
-                'sample_charging_date', 'sample charging date', 'sample battery charging date'
-            ])
-            charging_date_str = self.get_value(row, column_map, ['charging_date', 'charging date'])
-            if not charging_date_str and sample_charging_date:
-                charging_date_str = sample_charging_date
+        for row in rows:
+            frame_no = row.get('frame_no')
+            key_no = row.get('key_no')
+            battery_serial_no = row.get('battery_serial_no')
+            battery_brand = row.get('battery_brand')
+            battery_type = row.get('battery_type')
+            sample_charging_date = row.get('sample_charging_date')
+            charging_date_str = row.get('charging_date') or sample_charging_date
             charging_date = self.parse_date(charging_date_str) if charging_date_str else None
 
             if not frame_no:
@@ -289,43 +280,8 @@ class BatteryandKeyUpload(Document):
             child_row.charging_date = row_data.get("charging_date")
             child_row.item_code = row_data.get("item_code") or ""
 
-        frappe.db.commit()
-
     def get_file_path(self):
-        file_url = self.excel_file
-        if file_url.startswith('/files/'):
-            return get_site_path('public', file_url[1:])
-        elif file_url.startswith('/private/files/'):
-            return get_site_path('private', 'files', file_url.split('/')[-1])
-        else:
-            return get_site_path('public', 'files', file_url)
-
-    def normalize_columns(self, columns):
-        column_map = {}
-        for col in columns:
-            if not col:
-                continue
-            normalized = str(col).lower().strip().replace('.', '').replace('_', ' ').replace('-', ' ')
-            normalized = ' '.join(normalized.split())
-            column_map[normalized] = col
-        return column_map
-
-    def get_value(self, row, column_map, possible_names):
-        for name in possible_names:
-            normalized = name.lower().strip().replace('.', '').replace('_', ' ').replace('-', ' ')
-            normalized = ' '.join(normalized.split())
-            if normalized in column_map:
-                original_col = column_map[normalized]
-                value = row.get(original_col)
-                if value is not None:
-                    if isinstance(value, float):
-                        import math
-                        if math.isnan(value):
-                            continue
-                    value_str = str(value).strip()
-                    if value_str:
-                        return value_str
-        return None
+        return get_file_path(self.excel_file)
 
     def parse_date(self, date_value):
         if not date_value:
@@ -358,13 +314,8 @@ class BatteryandKeyUpload(Document):
     def find_serial_no(self, frame_no):
         if not frame_no:
             return None
-        frame_no = str(frame_no).strip()
-        serial_no = frappe.db.get_value("Serial No", {"serial_no": frame_no}, "name")
-        if serial_no:
-            return str(serial_no).strip()
-        if frappe.db.exists("Serial No", frame_no):
-            return str(frame_no).strip()
-        return None
+        lineage = get_frame_lineage(str(frame_no).strip())
+        return lineage.serial_no if lineage else None
 
     def create_or_update_battery_information(self, battery_serial_no=None, battery_brand=None, 
                                              battery_type=None, sample_charging_date=None, charging_date=None):
@@ -381,8 +332,7 @@ class BatteryandKeyUpload(Document):
             if sample_charging_date: update_fields["sample_charging_date"] = str(sample_charging_date).strip()
             if parsed_charging_date: update_fields["charging_date"] = parsed_charging_date
             if update_fields:
-                frappe.db.set_value("Battery Information", existing, update_fields, update_modified=False)
-                frappe.db.commit()
+                buffer_set_value("Battery Information", existing, update_fields)
             return existing
         else:
             try:
@@ -396,7 +346,6 @@ class BatteryandKeyUpload(Document):
                 })
                 doc.insert(ignore_permissions=True)
                 doc.submit()
-                frappe.db.commit()
                 return doc.name
             except Exception as e:
                 return None
@@ -431,7 +380,6 @@ class BatteryandKeyUpload(Document):
                 return None
             
             doc.submit()
-            frappe.db.commit()
             
             if not frappe.db.exists("Frame Bundle", doc.name):
                 existing = frappe.db.get_value("Frame Bundle", {"frame_no": actual_frame_no}, "name")
@@ -493,35 +441,24 @@ class BatteryandKeyUpload(Document):
         
         overdue_frames = []
         
-        for item in self.upload_items:
-            if not item.frame_no:
-                continue
-            
-            frame_no = str(item.frame_no).strip()
-            
-            purchase_receipt_info = frappe.db.sql("""
-                SELECT 
-                    pr.name as purchase_receipt_name,
-                    pr.creation as pr_creation_date
-                FROM `tabPurchase Receipt` pr
-                INNER JOIN `tabPurchase Receipt Item` pri ON pr.name = pri.parent
-                WHERE (pri.serial_no = %s OR FIND_IN_SET(%s, pri.serial_no) > 0)
-                    AND pr.docstatus = 1
-                ORDER BY pr.creation DESC
-                LIMIT 1
-            """, (frame_no, frame_no), as_dict=True)
-            
-            if not purchase_receipt_info:
+        frame_nos = list(dict.fromkeys(str(item.frame_no).strip() for item in self.upload_items if item.frame_no))
+        
+        # Latest submitted Purchase Receipt of every frame in one query; Frame Lineage
+        # only keeps the first one
+        receipts = get_purchase_receipts_by_frame(frame_nos, latest=True)
+        
+        for frame_no in frame_nos:
+            pr_info = receipts.get(frame_no)
+            if not pr_info:
                 continue
             
-            pr_info = purchase_receipt_info[0]
-            pr_creation = pr_info['pr_creation_date']
+            pr_creation = pr_info.purchase_receipt_date
             hours_passed = time_diff_in_hours(now_datetime(), pr_creation)
             
             if hours_passed > default_time_hours:
                 overdue_frames.append({
                     'frame_no': frame_no,
-                    'purchase_receipt': pr_info['purchase_receipt_name'],
+                    'purchase_receipt': pr_info.purchase_receipt,
                     'hours_passed': round(hours_passed, 2),
                     'pr_creation_date': pr_creation
                 })
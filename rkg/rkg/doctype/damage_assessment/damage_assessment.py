@@ -3,6 +3,9 @@ from frappe.model.document import Document
 from frappe import _
 from frappe.utils import flt
 
+from rkg.rkg.doctype.frame_lineage.frame_lineage import get_frame_lineage
+from rkg.utils.write_buffer import buffer_set_value
+
 
 class DamageAssessment(Document):
 	def validate(self):
@@ -322,8 +325,8 @@ class DamageAssessment(Document):
 				serial_warehouse = frappe.db.get_value("Serial No", serial_no, "warehouse")
 				if not serial_warehouse and source_warehouse:
 					try:
+						# Written directly: the Stock Entry validation reads it back
 						frappe.db.set_value("Serial No", serial_no, "warehouse", source_warehouse, update_modified=False)
-						frappe.db.commit()
 					except Exception as e:
 						frappe.log_error(
 							f"Error updating Serial No {serial_no} warehouse: {str(e)}",
@@ -503,9 +506,8 @@ class DamageAssessment(Document):
 				title=_("Load Dispatch Already Linked")
 			)
 		
-		# Link this Damage Assessment to the Load Dispatch
+		# Written directly, not buffered: update_load_dispatch_frames_counts looks the dispatch up by this link
 		frappe.db.set_value("Load Dispatch", self.load_dispatch, "damage_assessment", self.name, update_modified=False)
-		frappe.db.commit()
 	
 	def update_load_dispatch_frames_counts(self):
 		"""Update frames OK/Not OK counts in linked Load Dispatch."""
@@ -525,41 +527,27 @@ class DamageAssessment(Document):
 		
 		ok_count = max(0, total_frames - not_ok_count)
 		
-		frappe.db.set_value("Load Dispatch", load_dispatch, {
+		buffer_set_value("Load Dispatch", load_dispatch, {
 			"frames_ok": ok_count,
 			"frames_not_ok": not_ok_count
-		}, update_modified=False)
-		frappe.db.commit()
+		})
 
 
 @frappe.whitelist()
 def get_load_dispatch_from_serial_no(serial_no):
-	"""Get the Load Dispatch document from which a Serial No (frame) originated, and also get the warehouse where the Serial No is currently located. The Serial No name is the same as the frame_no in Load Dispatch Item. This function looks up which Load Dispatch Item has this frame_no and returns the parent Load Dispatch name and the warehouse. Args: serial_no: The Serial No (frame_no) to look up. Returns: dict with load_dispatch name and warehouse, or None if not found."""
+	"""Get the Load Dispatch document from which a Serial No (frame) originated, and also get the warehouse where the Serial No is currently located. Both come from one Frame Lineage read. Args: serial_no: The Serial No (frame_no) to look up. Returns: dict with load_dispatch name and warehouse, or None if not found."""
 	if not serial_no:
 		return {"load_dispatch": None, "warehouse": None}
 	
-	warehouse = frappe.db.get_value("Serial No", serial_no, "warehouse")
-	
-	load_dispatch_item = frappe.db.get_value(
-		"Load Dispatch Item",
-		{"frame_no": serial_no},
-		["parent"],
-		as_dict=True
-	)
-	
-	result = {"load_dispatch": None, "warehouse": warehouse}
-	if load_dispatch_item and load_dispatch_item.get("parent"):
-		result["load_dispatch"] = load_dispatch_item.parent
+	lineage = get_frame_lineage(serial_no) or {}
 	
-	return result
+	return {"load_dispatch": lineage.get("load_dispatch"), "warehouse": lineage.get("warehouse")}
 
 
 @frappe.whitelist()
 def get_load_reference_no_from_serial_no(serial_no):
 	"""Get the Load Reference Number (Load Plan) from which a Serial No (frame) originated.
-	The Serial No name is the same as the frame_no in Load Dispatch Item.
-	This function looks up which Load Dispatch Item has this frame_no, gets the parent Load Dispatch,
-	and returns the load_reference_no from that Load Dispatch.
+	The Load Plan is recorded on the frame's Frame Lineage when its Load Dispatch is submitted.
 	
 	Args:
 		serial_no: The Serial No (frame_no) to look up.
@@ -570,27 +558,7 @@ def get_load_reference_no_from_serial_no(serial_no):
 	if not serial_no:
 		return None
 	
-	# Find Load Dispatch Item with this frame_no
-	load_dispatch_item = frappe.db.get_value(
-		"Load Dispatch Item",
-		{"frame_no": serial_no},
-		["parent"],
-		as_dict=True
-	)
-	
-	if not load_dispatch_item or not load_dispatch_item.get("parent"):
-		return None
-	
-	load_dispatch_name = load_dispatch_item.parent
-	
-	# Get load_reference_no from Load Dispatch
-	load_reference_no = frappe.db.get_value(
-		"Load Dispatch",
-		load_dispatch_name,
-		"load_reference_no"
-	)
-	
-	return load_reference_no
+	return frappe.db.get_value("Frame Lineage", serial_no, "load_plan")
 
 
 @frappe.whitelist()
@@ -663,7 +631,6 @@ def break_circular_dependency(damage_assessment_name=None, load_dispatch_name=No
 							"frames_ok": 0,
 							"frames_not_ok": 0
 						}, update_modified=False)
-						frappe.db.commit()
 						return {"message": f"Cleared damage_assessment link in Load Dispatch {da.load_dispatch}"}
 		except Exception as e:
 			frappe.log_error(
@@ -681,7 +648,6 @@ def break_circular_dependency(damage_assessment_name=None, load_dispatch_name=No
 					"frames_ok": 0,
 					"frames_not_ok": 0
 				}, update_modified=False)
-				frappe.db.commit()
 				return {"message": f"Cleared damage_assessment link in Load Dispatch {load_dispatch_name}"}
 		except Exception as e:
 			frappe.log_error(
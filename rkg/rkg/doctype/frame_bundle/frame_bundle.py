@@ -4,6 +4,9 @@ import frappe
 from frappe.model.document import Document
 from frappe.utils import getdate, today, date_diff, now_datetime
 
+from rkg.rkg.doctype.frame_lineage.frame_lineage import get_frame_lineage
+from rkg.utils.write_buffer import buffer_set_value
+
 
 class FrameBundle(Document):
 	@property
@@ -44,19 +47,8 @@ class FrameBundle(Document):
 	
 	def update_warehouse(self):
 		"""Update warehouse from Serial No when frame_no changes"""
-		if self.frame_no:
-			# Find Serial No by frame_no (try by serial_no field first, then by name)
-			serial_no_name = frappe.db.get_value("Serial No", {"serial_no": self.frame_no}, "name")
-			if not serial_no_name and frappe.db.exists("Serial No", self.frame_no):
-				serial_no_name = self.frame_no
-			
-			if serial_no_name:
-				warehouse = frappe.db.get_value("Serial No", serial_no_name, "warehouse")
-				self.warehouse = warehouse or None
-			else:
-				self.warehouse = None
-		else:
-			self.warehouse = None
+		lineage = get_frame_lineage(self.frame_no) if self.frame_no else None
+		self.warehouse = (lineage.warehouse if lineage else None) or None
 	
 	def before_submit(self):
 		if self.battery_serial_no and not self.battery_installed_on:
@@ -270,7 +262,7 @@ class FrameBundle(Document):
 				if item.swapped_with_frame:
 					linked_frames.append(item.swapped_with_frame)
 					# Clear the link in this document's swap history
-					frappe.db.set_value("Frame Bundle Swap History", item.name, "swapped_with_frame", None, update_modified=False)
+					buffer_set_value("Frame Bundle Swap History", item.name, {"swapped_with_frame": None})
 			
 			# Clear reciprocal links in the linked Frame Bundles' swap history
 			for linked_frame in linked_frames:
@@ -282,9 +274,7 @@ class FrameBundle(Document):
 						fields=["name"]
 					)
 					for row in swap_history_rows:
-						frappe.db.set_value("Frame Bundle Swap History", row.name, "swapped_with_frame", None, update_modified=False)
-			
-			frappe.db.commit()
+						buffer_set_value("Frame Bundle Swap History", row.name, {"swapped_with_frame": None})
 
 
 @frappe.whitelist()
@@ -354,9 +344,6 @@ def mark_battery_expired(frame_name):
 				update_modified=False
 			)
 		
-		# Commit transaction
-		frappe.db.commit()
-		
 		return {"success": True, "message": "Battery marked as discarded successfully"}
 	finally:
 		# Clear flags
@@ -387,7 +374,6 @@ def refresh_battery_aging(frame_name):
 	
 	frame = frappe.get_doc("Frame Bundle", frame_name)
 	frame.refresh_battery_aging()
-	frappe.db.commit()
 	
 	return {"success": True, "battery_aging_days": frame.battery_aging_days}
 
@@ -526,8 +512,5 @@ def swap_batteries(current_frame, target_frame, force_swap=False):
 	frappe.flags.allow_swap_history_modification = False
 	frappe.flags.ignore_permissions = False
 	
-	# Commit transaction
-	frappe.db.commit()
-	
 	return {"success": True}
 
@@ -0,0 +1,298 @@
+# Copyright (c) 2026, beetashoke.chakraborty@clapgrow.com and contributors
+# For license information, please see license.txt
+
+"""Frame Lineage: one row per frame (named by frame_no, same as the Serial No name)
+holding the Load Plan, Load Dispatch, Purchase Receipt, Purchase Invoice, Frame
+Bundle and Damage Assessment the frame went through.
+
+Rows are kept current by the doc event handlers below, so every lookup that used
+to scan Load Dispatch Item or FIND_IN_SET over Purchase Receipt Item serial_no
+text is one primary-key read. The current warehouse is not copied here: it is
+joined from Serial No (same primary key), which stays its source of truth.
+"""
+
+import frappe
+from frappe.model.document import Document
+
+from rkg.utils.db import BULK_CHUNK_SIZE, bulk_set_values
+
+LINEAGE_FIELDS = (
+	"item_code",
+	"load_plan",
+	"load_dispatch",
+	"purchase_receipt",
+	"purchase_receipt_date",
+	"purchase_invoice",
+	"frame_bundle",
+	"damage_assessment",
+)
+
+
+class FrameLineage(Document):
+	pass
+
+
+def get_frame_lineage(frame_no):
+	"""Return the lineage of a frame together with its current warehouse in one primary-key read.
+
+	Returns:
+		frappe._dict with serial_no, warehouse and the LINEAGE_FIELDS, or None if the Serial No does not exist.
+	"""
+	if not frame_no:
+		return None
+
+	rows = frappe.db.sql(
+		f"""
+		SELECT sn.name as serial_no, sn.warehouse,
+			IFNULL(fl.item_code, sn.item_code) as item_code,
+			{", ".join(f"fl.{field}" for field in LINEAGE_FIELDS if field != "item_code")}
+		FROM `tabSerial No` sn
+		LEFT JOIN `tabFrame Lineage` fl ON fl.name = sn.name
+		WHERE sn.name = %s
+		""",
+		(frame_no,),
+		as_dict=True,
+	)
+	return rows[0] if rows else None
+
+
+def parse_serial_nos(serial_no_text):
+	"""Split a newline/comma separated serial_no field into a list of frame numbers."""
+	if not serial_no_text:
+		return []
+	return [s.strip() for s in serial_no_text.replace(",", "\n").split("\n") if s.strip()]
+
+
+def update_frame_lineage(values_by_frame, overwrite=True):
+	"""Create or update lineage rows in bulk.
+
+	Args:
+		values_by_frame: {frame_no: {lineage_field: value}}
+		overwrite: when False, fields that already hold a value are left untouched
+			(used to keep the first Purchase Receipt of a frame)
+	"""
+	if not values_by_frame:
+		return
+
+	frame_nos = list(values_by_frame)
+	existing = {}
+	for start in range(0, len(frame_nos), BULK_CHUNK_SIZE):
+		for row in frappe.get_all(
+			"Frame Lineage",
+			filters={"name": ["in", frame_nos[start:start + BULK_CHUNK_SIZE]]},
+			fields=["name", *LINEAGE_FIELDS],
+		):
+			existing[row.name] = row
+
+	updates = {}
+	new_rows = []
+	now = frappe.utils.now()
+	for frame_no, values in values_by_frame.items():
+		current = existing.get(frame_no)
+		if current is None:
+			new_rows.append((frame_no, frame_no, now, now, frappe.session.user, frappe.session.user,
+				*(values.get(field) for field in LINEAGE_FIELDS)))
+			continue
+
+		for field, value in values.items():
+			if current.get(field) == value or (not overwrite and current.get(field)):
+				continue
+			updates.setdefault(field, {})[frame_no] = value
+
+	if new_rows:
+		frappe.db.bulk_insert(
+			"Frame Lineage",
+			["name", "frame_no", "creation", "modified", "owner", "modified_by", *LINEAGE_FIELDS],
+			new_rows,
+			ignore_duplicates=True,
+			chunk_size=BULK_CHUNK_SIZE,
+		)
+
+	for field, values_by_name in updates.items():
+		bulk_set_values("Frame Lineage", field, values_by_name)
+
+
+def clear_frame_lineage(fieldname, docname, also_clear=()):
+	"""Unset a lineage link on every frame that points to docname (on cancel).
+
+	Returns:
+		list of frame numbers that were cleared.
+	"""
+	frame_nos = frappe.get_all("Frame Lineage", filters={fieldname: docname}, pluck="name")
+	if frame_nos:
+		set_sql = ", ".join(f"`{field}` = NULL" for field in (fieldname, *also_clear))
+		frappe.db.sql(f"UPDATE `tabFrame Lineage` SET {set_sql} WHERE `{fieldname}` = %s", (docname,))
+	return frame_nos
+
+
+def _get_purchase_document_frames(doc):
+	"""Return {frame_no: item_code} for the serial numbers on a Purchase Receipt / Invoice."""
+	frames = {}
+	for item in doc.get("items") or []:
+		for frame_no in parse_serial_nos(item.get("serial_no")):
+			frames[frame_no] = item.item_code
+	return frames
+
+
+def get_purchase_receipts_by_frame(frame_nos, latest=False):
+	"""Return {frame_no: {purchase_receipt, purchase_receipt_date}} from each frame's first
+	(or, with latest, most recent) submitted Purchase Receipt."""
+	if not frame_nos:
+		return {}
+
+	wanted = set(frame_nos)
+	item_codes = frappe.get_all("Frame Lineage", filters={"name": ["in", list(wanted)]}, pluck="item_code", distinct=True)
+	receipts = frappe.db.sql(
+		"""
+		SELECT pr.name, pr.creation, pri.serial_no
+		FROM `tabPurchase Receipt` pr
+		INNER JOIN `tabPurchase Receipt Item` pri ON pri.parent = pr.name
+		WHERE pr.docstatus = 1 AND pri.item_code IN %(item_codes)s
+			AND IFNULL(pri.serial_no, '') != ''
+		ORDER BY pr.creation {order}
+		""".format(order="DESC" if latest else "ASC"),
+		{"item_codes": [item_code for item_code in item_codes if item_code] or [""]},
+		as_dict=True,
+	)
+
+	values = {}
+	for receipt in receipts:
+		for frame_no in parse_serial_nos(receipt.serial_no):
+			if frame_no in wanted and frame_no not in values:
+				values[frame_no] = frappe._dict(purchase_receipt=receipt.name, purchase_receipt_date=receipt.creation)
+	return values
+
+
+def _restore_first_purchase_receipts(frame_nos):
+	"""Point frames back to their earliest remaining submitted Purchase Receipt after a cancel."""
+	update_frame_lineage(get_purchase_receipts_by_frame(frame_nos))
+
+
+def update_lineage_from_load_dispatch(doc, method=None):
+	"""Load Dispatch on_submit: record item, Load Plan and Load Dispatch for every frame."""
+	values = {}
+	for item in doc.items or []:
+		if item.frame_no:
+			values[item.frame_no.strip()] = {
+				"item_code": item.item_code,
+				"load_plan": doc.load_reference_no or item.hmsi_load_reference_no,
+				"load_dispatch": doc.name,
+			}
+	update_frame_lineage(values)
+
+
+def clear_lineage_from_load_dispatch(doc, method=None):
+	"""Load Dispatch on_cancel."""
+	clear_frame_lineage("load_dispatch", doc.name, also_clear=("load_plan",))
+
+
+def update_lineage_from_purchase_receipt(doc, method=None):
+	"""Purchase Receipt on_submit: the first submitted receipt of a frame is its receipt date (aging start)."""
+	values = {
+		frame_no: {"item_code": item_code, "purchase_receipt": doc.name, "purchase_receipt_date": doc.creation}
+		for frame_no, item_code in _get_purchase_document_frames(doc).items()
+	}
+	update_frame_lineage(values, overwrite=False)
+
+
+def clear_lineage_from_purchase_receipt(doc, method=None):
+	"""Purchase Receipt on_cancel."""
+	frame_nos = clear_frame_lineage("purchase_receipt", doc.name, also_clear=("purchase_receipt_date",))
+	_restore_first_purchase_receipts(frame_nos)
+
+
+def update_lineage_from_purchase_invoice(doc, method=None):
+	"""Purchase Invoice on_submit."""
+	values = {
+		frame_no: {"item_code": item_code, "purchase_invoice": doc.name}
+		for frame_no, item_code in _get_purchase_document_frames(doc).items()
+	}
+	update_frame_lineage(values)
+
+
+def clear_lineage_from_purchase_invoice(doc, method=None):
+	"""Purchase Invoice on_cancel."""
+	clear_frame_lineage("purchase_invoice", doc.name)
+
+
+def update_lineage_from_frame_bundle(doc, method=None):
+	"""Frame Bundle on_submit."""
+	if doc.frame_no:
+		update_frame_lineage({doc.frame_no: {"frame_bundle": doc.name}})
+
+
+def clear_lineage_from_frame_bundle(doc, method=None):
+	"""Frame Bundle on_cancel."""
+	clear_frame_lineage("frame_bundle", doc.name)
+
+
+def update_lineage_from_damage_assessment(doc, method=None):
+	"""Damage Assessment on_submit."""
+	update_frame_lineage({
+		item.serial_no: {"damage_assessment": doc.name}
+		for item in doc.damage_assessment_item or []
+		if item.serial_no
+	})
+
+
+def clear_lineage_from_damage_assessment(doc, method=None):
+	"""Damage Assessment on_cancel."""
+	clear_frame_lineage("damage_assessment", doc.name)
+
+
+def rebuild_frame_lineage():
+	"""Rebuild every lineage row from submitted documents (used by the backfill patch)."""
+	frappe.db.delete("Frame Lineage")
+
+	values = {}
+	for row in frappe.db.sql(
+		"""
+		SELECT ldi.frame_no, ldi.item_code, ldi.hmsi_load_reference_no, ld.load_reference_no, ld.name
+		FROM `tabLoad Dispatch` ld
+		INNER JOIN `tabLoad Dispatch Item` ldi ON ldi.parent = ld.name
+		WHERE ld.docstatus = 1 AND IFNULL(ldi.frame_no, '') != ''
+		ORDER BY ld.creation
+		""",
+		as_dict=True,
+	):
+		values[row.frame_no.strip()] = {
+			"item_code": row.item_code,
+			"load_plan": row.load_reference_no or row.hmsi_load_reference_no,
+			"load_dispatch": row.name,
+		}
+
+	for doctype, fields in (
+		("Purchase Receipt", ("purchase_receipt", "purchase_receipt_date")),
+		("Purchase Invoice", ("purchase_invoice",)),
+	):
+		for row in frappe.db.sql(
+			f"""
+			SELECT p.name, p.creation, pi.item_code, pi.serial_no
+			FROM `tab{doctype}` p
+			INNER JOIN `tab{doctype} Item` pi ON pi.parent = p.name
+			WHERE p.docstatus = 1 AND IFNULL(pi.serial_no, '') != ''
+			ORDER BY p.creation
+			""",
+			as_dict=True,
+		):
+			for frame_no in parse_serial_nos(row.serial_no):
+				frame = values.setdefault(frame_no, {"item_code": row.item_code})
+				if doctype == "Purchase Invoice" or not frame.get("purchase_receipt"):
+					frame.update(zip(fields, (row.name, row.creation)))
+
+	for frame_no, name in frappe.get_all("Frame Bundle", filters={"docstatus": 1}, fields=["frame_no", "name"], as_list=True):
+		if frame_no:
+			values.setdefault(frame_no, {})["frame_bundle"] = name
+
+	for serial_no, name in frappe.db.sql(
+		"""
+		SELECT dai.serial_no, da.name
+		FROM `tabDamage Assessment` da
+		INNER JOIN `tabDamage Assessment Item` dai ON dai.parent = da.name
+		WHERE da.docstatus = 1 AND IFNULL(dai.serial_no, '') != ''
+		ORDER BY da.creation
+		"""
+	):
+		values.setdefault(serial_no, {})["damage_assessment"] = name
+
+	update_frame_lineage(values)
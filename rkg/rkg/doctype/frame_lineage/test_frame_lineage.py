@@ -0,0 +1,107 @@
+# Copyright (c) 2026, beetashoke.chakraborty@clapgrow.com and Contributors
+# See license.txt
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from rkg.rkg.doctype.frame_lineage.frame_lineage import (
+	clear_lineage_from_purchase_receipt,
+	get_frame_lineage,
+	update_frame_lineage,
+)
+
+
+def make_serial_no(frame_no, item_code, warehouse=None):
+	frappe.get_doc({
+		"doctype": "Serial No",
+		"name": frame_no,
+		"serial_no": frame_no,
+		"item_code": item_code,
+		"warehouse": warehouse,
+	}).db_insert()
+
+
+def make_purchase_receipt(name, frame_no, item_code, creation, docstatus=1):
+	"""Insert a bare submitted Purchase Receipt row; only what the lineage queries read."""
+	receipt = frappe.get_doc({
+		"doctype": "Purchase Receipt",
+		"name": name,
+		"docstatus": docstatus,
+		"creation": creation,
+		"modified": creation,
+		"items": [{"item_code": item_code, "serial_no": frame_no, "docstatus": docstatus}],
+	})
+	receipt.db_insert()
+	for item in receipt.items:
+		item.db_insert()
+	return receipt
+
+
+class TestFrameLineage(FrappeTestCase):
+	def setUp(self):
+		self.frame_no = f"_T-FRAME-{frappe.generate_hash(length=8)}"
+		self.item_code = f"_T-ITEM-{frappe.generate_hash(length=8)}"
+
+	def test_first_purchase_receipt_is_kept(self):
+		update_frame_lineage({self.frame_no: {
+			"item_code": self.item_code,
+			"purchase_receipt": "_T-PR-FIRST",
+			"purchase_receipt_date": "2026-01-01 10:00:00",
+		}})
+		update_frame_lineage({self.frame_no: {
+			"item_code": self.item_code,
+			"purchase_receipt": "_T-PR-SECOND",
+			"purchase_receipt_date": "2026-02-01 10:00:00",
+			"purchase_invoice": "_T-PI",
+		}}, overwrite=False)
+
+		lineage = frappe.db.get_value(
+			"Frame Lineage", self.frame_no, ["purchase_receipt", "purchase_receipt_date", "purchase_invoice"], as_dict=True
+		)
+		self.assertEqual(lineage.purchase_receipt, "_T-PR-FIRST")
+		self.assertEqual(str(lineage.purchase_receipt_date), "2026-01-01 10:00:00")
+		# Empty fields are still filled without overwrite
+		self.assertEqual(lineage.purchase_invoice, "_T-PI")
+
+	def test_cancel_restores_earliest_remaining_receipt(self):
+		first = f"_T-PR-{frappe.generate_hash(length=8)}"
+		second = f"_T-PR-{frappe.generate_hash(length=8)}"
+		make_purchase_receipt(first, self.frame_no, self.item_code, "2026-01-01 10:00:00")
+		make_purchase_receipt(second, self.frame_no, self.item_code, "2026-02-01 10:00:00")
+		update_frame_lineage({self.frame_no: {
+			"item_code": self.item_code,
+			"purchase_receipt": first,
+			"purchase_receipt_date": "2026-01-01 10:00:00",
+		}})
+
+		frappe.db.set_value("Purchase Receipt", first, "docstatus", 2, update_modified=False)
+		clear_lineage_from_purchase_receipt(frappe._dict(name=first))
+
+		lineage = frappe.db.get_value(
+			"Frame Lineage", self.frame_no, ["purchase_receipt", "purchase_receipt_date"], as_dict=True
+		)
+		self.assertEqual(lineage.purchase_receipt, second)
+		self.assertEqual(str(lineage.purchase_receipt_date), "2026-02-01 10:00:00")
+
+	def test_cancel_without_other_receipt_clears_link(self):
+		receipt = f"_T-PR-{frappe.generate_hash(length=8)}"
+		make_purchase_receipt(receipt, self.frame_no, self.item_code, "2026-01-01 10:00:00", docstatus=2)
+		update_frame_lineage({self.frame_no: {"item_code": self.item_code, "purchase_receipt": receipt}})
+
+		clear_lineage_from_purchase_receipt(frappe._dict(name=receipt))
+
+		self.assertIsNone(frappe.db.get_value("Frame Lineage", self.frame_no, "purchase_receipt"))
+
+	def test_serial_no_without_lineage_row(self):
+		make_serial_no(self.frame_no, self.item_code)
+
+		lineage = get_frame_lineage(self.frame_no)
+
+		self.assertEqual(lineage.serial_no, self.frame_no)
+		self.assertEqual(lineage.item_code, self.item_code)
+		self.assertIsNone(lineage.load_dispatch)
+		self.assertIsNone(lineage.purchase_receipt)
+
+	def test_unknown_frame(self):
+		self.assertIsNone(get_frame_lineage(self.frame_no))
+		self.assertIsNone(get_frame_lineage(None))
@@ -104,111 +104,14 @@ frappe.ui.form.on("Load Dispatch", {
 			}, 3);
 
 			frappe.call({
-				method: "rkg.rkg.doctype.load_dispatch.load_dispatch.process_tabular_file",
+				method: "rkg.rkg.doctype.load_dispatch.load_dispatch.enqueue_tabular_file_import",
 				args: {
 					file_url: frm.doc.load_dispatch_file_attach,
 					selected_load_reference_no: frm.doc.load_reference_no || null
 				},
 				callback: function(r) {
-					try {
-						if (r && r.message) {
-							let response_data = r.message;
-							let rows = [];
-							let has_multiple_load_ref_nos = false;
-							let load_ref_nos = [];
-							let valid_load_ref_nos = [];
-							let invalid_load_ref_nos = [];
-							
-							if (response_data.rows) {
-								rows = response_data.rows;
-								has_multiple_load_ref_nos = response_data.has_multiple_load_ref_nos || false;
-								load_ref_nos = response_data.load_ref_nos || [];
-								valid_load_ref_nos = response_data.valid_load_ref_nos || [];
-								invalid_load_ref_nos = response_data.invalid_load_ref_nos || [];
-							} else if (Array.isArray(response_data)) {
-								rows = response_data;
-								const load_ref_nos_set = new Set();
-								rows.forEach(row => {
-									if (row.hmsi_load_reference_no) {
-										load_ref_nos_set.add(row.hmsi_load_reference_no);
-									}
-								});
-								load_ref_nos = Array.from(load_ref_nos_set);
-								load_ref_nos.forEach(ref_no => {
-									valid_load_ref_nos.push(ref_no);
-								});
-							} else {
-								frappe.show_alert({
-									message: __("Unexpected response format from server"),
-									indicator: "orange"
-								}, 5);
-								return;
-							}
-							
-							if (invalid_load_ref_nos.length > 0) {
-								frappe.msgprint({
-									title: __("Invalid Load Reference Numbers"),
-									message: __("The following Load Reference Numbers in the file do not exist as Load Plans and will be skipped:\n{0}\n\nPlease create these Load Plans first or remove them from the file.", 
-										[invalid_load_ref_nos.join(", ")]),
-									indicator: "orange"
-								});
-								
-								rows = rows.filter(row => {
-									const row_load_ref_no = row.hmsi_load_reference_no;
-									return !row_load_ref_no || valid_load_ref_nos.includes(row_load_ref_no);
-								});
-							}
-							
-							if (rows.length === 0) {
-								frappe.msgprint({
-									title: __("No Valid Data"),
-									message: __("No rows with valid Load Reference Numbers found. Please ensure the Load Reference Numbers in the file exist as Load Plans."),
-									indicator: "red"
-								});
-								return;
-							}
-							
-							if (has_multiple_load_ref_nos && !response_data.filtered && valid_load_ref_nos.length > 1) {
-								show_load_ref_no_selection_dialog(frm, valid_load_ref_nos, rows);
-								return;
-							}
-							
-							if (valid_load_ref_nos.length === 1) {
-								const single_load_ref_no = valid_load_ref_nos[0];
-								frappe.call({
-									method: "frappe.client.get",
-									args: {
-										doctype: "Load Plan",
-										name: single_load_ref_no
-									},
-									callback: function(load_plan_r) {
-										if (load_plan_r.message) {
-											import_rows_to_load_dispatch(frm, rows, single_load_ref_no);
-										} else {
-											frappe.msgprint({
-												title: __("Invalid Load Reference Number"),
-												message: __("Load Reference Number '{0}' does not exist as a Load Plan. Please create the Load Plan first.", [single_load_ref_no]),
-												indicator: "red"
-											});
-										}
-									}
-								});
-								return;
-							}
-							
-							import_rows_to_load_dispatch(frm, rows);
-						} else {
-							frappe.show_alert({
-								message: __("Unexpected response format from server"),
-								indicator: "orange"
-							}, 5);
-						}
-					} catch (error) {
-						console.error("Error processing CSV import:", error);
-						frappe.show_alert({
-							message: __("Error processing imported data: {0}", [error.message || "Unknown error"]),
-							indicator: "red"
-						}, 5);
+					if (r && r.message && r.message.job_id) {
+						wait_for_tabular_file_import(frm, r.message.job_id);
 					}
 				},
 				error: function(r) {
@@ -232,6 +135,181 @@ frappe.ui.form.on("Load Dispatch", {
 
 });
 
+function wait_for_tabular_file_import(frm, job_id) {
+	// Progress is pushed over realtime; polling covers a missed or unavailable socket.
+	let done = false;
+	let poll_timer = null;
+	
+	const finish = function(state) {
+		if (done) {
+			return;
+		}
+		done = true;
+		clearInterval(poll_timer);
+		frappe.realtime.off("load_dispatch_import_progress", on_progress);
+		frappe.hide_progress();
+		
+		if (state.status === "finished") {
+			handle_tabular_file_response(frm, state.result);
+		} else {
+			frappe.msgprint({
+				title: __("Import Failed"),
+				message: state.error || __("The file import did not complete. Please attach the file again."),
+				indicator: "red"
+			});
+		}
+	};
+	
+	const fetch_result = function() {
+		frappe.call({
+			method: "rkg.rkg.doctype.load_dispatch.load_dispatch.get_tabular_file_import_result",
+			args: { job_id: job_id },
+			callback: function(r) {
+				const state = r.message || {};
+				if (["finished", "failed", "not_found"].includes(state.status)) {
+					finish(state);
+				}
+			}
+		});
+	};
+	
+	const on_progress = function(data) {
+		if (!data || data.job_id !== job_id || done) {
+			return;
+		}
+		if (data.status === "running") {
+			frappe.show_progress(__("Importing File"), data.rows_read, data.rows_read,
+				__("{0} rows read", [data.rows_read]));
+		} else {
+			// the result itself is fetched once, it is not sent over the socket
+			fetch_result();
+		}
+	};
+	
+	frappe.realtime.on("load_dispatch_import_progress", on_progress);
+	poll_timer = setInterval(fetch_result, 2000);
+}
+
+function handle_tabular_file_response(frm, response_data) {
+	try {
+		if (response_data) {
+			let rows = [];
+			let has_multiple_load_ref_nos = false;
+			let load_ref_nos = [];
+			let valid_load_ref_nos = [];
+			let invalid_load_ref_nos = [];
+		
+			if (response_data.rows) {
+				rows = response_data.rows;
+				has_multiple_load_ref_nos = response_data.has_multiple_load_ref_nos || false;
+				load_ref_nos = response_data.load_ref_nos || [];
+				valid_load_ref_nos = response_data.valid_load_ref_nos || [];
+				invalid_load_ref_nos = response_data.invalid_load_ref_nos || [];
+
+				const missing_item_codes = response_data.missing_item_codes || [];
+				if (missing_item_codes.length > 0) {
+					frappe.show_alert({
+						message: __("{0} new model(s) will be created as Items when this Load Dispatch is submitted", [missing_item_codes.length]),
+						indicator: "blue"
+					}, 5);
+				}
+
+				const bad_cells = response_data.bad_cells || [];
+				if (bad_cells.length > 0) {
+					const bad_row_count = bad_cells.reduce((total, cell) => total + cell.count, 0);
+					frappe.show_alert({
+						message: __("{0} date value(s) could not be read and were left empty: {1}",
+							[bad_row_count, bad_cells.map(cell => cell.value).join(", ")]),
+						indicator: "orange"
+					}, 8);
+				}
+			} else if (Array.isArray(response_data)) {
+				rows = response_data;
+				const load_ref_nos_set = new Set();
+				rows.forEach(row => {
+					if (row.hmsi_load_reference_no) {
+						load_ref_nos_set.add(row.hmsi_load_reference_no);
+					}
+				});
+				load_ref_nos = Array.from(load_ref_nos_set);
+				load_ref_nos.forEach(ref_no => {
+					valid_load_ref_nos.push(ref_no);
+				});
+			} else {
+				frappe.show_alert({
+					message: __("Unexpected response format from server"),
+					indicator: "orange"
+				}, 5);
+				return;
+			}
+		
+			if (invalid_load_ref_nos.length > 0) {
+				frappe.msgprint({
+					title: __("Invalid Load Reference Numbers"),
+					message: __("The following Load Reference Numbers in the file do not exist as Load Plans and will be skipped:\n{0}\n\nPlease create these Load Plans first or remove them from the file.", 
+						[invalid_load_ref_nos.join(", ")]),
+					indicator: "orange"
+				});
+			
+				rows = rows.filter(row => {
+					const row_load_ref_no = row.hmsi_load_reference_no;
+					return !row_load_ref_no || valid_load_ref_nos.includes(row_load_ref_no);
+				});
+			}
+		
+			if (rows.length === 0) {
+				frappe.msgprint({
+					title: __("No Valid Data"),
+					message: __("No rows with valid Load Reference Numbers found. Please ensure the Load Reference Numbers in the file exist as Load Plans."),
+					indicator: "red"
+				});
+				return;
+			}
+		
+			if (has_multiple_load_ref_nos && !response_data.filtered && valid_load_ref_nos.length > 1) {
+				show_load_ref_no_selection_dialog(frm, valid_load_ref_nos, rows);
+				return;
+			}
+		
+			if (valid_load_ref_nos.length === 1) {
+				const single_load_ref_no = valid_load_ref_nos[0];
+				frappe.call({
+					method: "frappe.client.get",
+					args: {
+						doctype: "Load Plan",
+						name: single_load_ref_no
+					},
+					callback: function(load_plan_r) {
+						if (load_plan_r.message) {
+							import_rows_to_load_dispatch(frm, rows, single_load_ref_no);
+						} else {
+							frappe.msgprint({
+								title: __("Invalid Load Reference Number"),
+								message: __("Load Reference Number '{0}' does not exist as a Load Plan. Please create the Load Plan first.", [single_load_ref_no]),
+								indicator: "red"
+							});
+						}
+					}
+				});
+				return;
+			}
+		
+			import_rows_to_load_dispatch(frm, rows);
+		} else {
+			frappe.show_alert({
+				message: __("Unexpected response format from server"),
+				indicator: "orange"
+			}, 5);
+		}
+	} catch (error) {
+		console.error("Error processing CSV import:", error);
+		frappe.show_alert({
+			message: __("Error processing imported data: {0}", [error.message || "Unknown error"]),
+			indicator: "red"
+		}, 5);
+	}
+}
+
 function show_load_ref_no_selection_dialog(frm, load_ref_nos, all_rows) {
 	const dialog = new frappe.ui.Dialog({
 		title: __("Multiple Load Reference Numbers Found"),
@@ -341,7 +419,15 @@ function import_rows_to_load_dispatch(frm, rows, selected_load_ref_no) {
 	}
 }
 
+// Saved drafts with more rows than this are filled on the server instead of in the form
+const SERVER_IMPORT_ROW_THRESHOLD = 200;
+
 function do_import_rows(frm, rows, selected_load_ref_no) {
+	if (!frm.is_new() && !frm.is_dirty() && frm.doc.docstatus === 0 && rows.length > SERVER_IMPORT_ROW_THRESHOLD) {
+		import_rows_on_server(frm, selected_load_ref_no);
+		return;
+	}
+	
 	frm.clear_table("items");
 	
 	rows.forEach(function(row) {
@@ -395,6 +481,43 @@ function do_import_rows(frm, rows, selected_load_ref_no) {
 	}, 5);
 }
 
+function import_rows_on_server(frm, selected_load_ref_no) {
+	frappe.call({
+		method: "rkg.rkg.doctype.load_dispatch.load_dispatch.import_file_into_load_dispatch",
+		args: {
+			load_dispatch_name: frm.doc.name,
+			file_url: frm.doc.load_dispatch_file_attach,
+			selected_load_reference_no: selected_load_ref_no || null
+		},
+		freeze: true,
+		freeze_message: __("Importing rows..."),
+		callback: function(r) {
+			if (!r.message) {
+				return;
+			}
+			frm.reload_doc().then(() => {
+				frm._load_reference_no_from_csv = frm.doc.load_reference_no;
+				setTimeout(() => apply_custom_field_styling(frm), 200);
+			});
+			
+			const skipped_frames = r.message.skipped_frames || [];
+			if (skipped_frames.length > 0) {
+				frappe.msgprint({
+					title: __("Duplicate Frame Numbers Skipped"),
+					message: __("{0} frame(s) are already on a submitted Load Dispatch and were not imported:\n{1}",
+						[skipped_frames.length, skipped_frames.slice(0, 20).join(", ")]),
+					indicator: "orange"
+				});
+			}
+			
+			frappe.show_alert({
+				message: __("Successfully imported {0} rows from file", [r.message.rows_imported]),
+				indicator: "green"
+			}, 5);
+		}
+	});
+}
+
 function calculate_total_dispatch_quantity(frm) {
 	let total_dispatch_quantity = 0;
 	if (frm.doc.items) {
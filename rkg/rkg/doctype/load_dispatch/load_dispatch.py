@@ -1,9 +1,53 @@
+from functools import lru_cache
+
 import frappe
-import csv
-import os
 from frappe.model.document import Document
 from frappe import _
-from frappe.utils import flt
+from frappe.utils import cstr, flt, get_datetime
+
+from rkg.utils.file_import import (
+	IMPORT_CHUNK_SIZE,
+	compile_column_plan,
+	get_file_path,
+	is_empty_value,
+	iter_chunks,
+	read_tabular_file,
+)
+from rkg.utils.db import BULK_CHUNK_SIZE, bulk_set_values
+from rkg.utils.parse_cache import get_cached_parse
+from rkg.utils.rollups import request_rollups
+from rkg.utils.schema import has_column
+from rkg.utils.worker_cache import WorkerCache
+from rkg.utils.write_buffer import buffer_set_value
+
+
+# Load Dispatch Item fields whose change requires the serial, item group and print name stages to rerun
+LOAD_DISPATCH_ITEM_TRACKED_FIELDS = (
+	"frame_no",
+	"model_serial_no",
+	"engnie_no_motor_no",
+	"key_no",
+	"color_code",
+	"model_name",
+	"price_unit",
+	"dispatch_date",
+	"planned_arrival_date",
+)
+
+# Load Dispatch fields the item stages derive row data from; a change reruns the stages for every row
+LOAD_DISPATCH_HEADER_TRACKED_FIELDS = (
+	"load_reference_no",
+	"dispatch_date",
+)
+
+# (Load Dispatch Item field, Serial No column) copied onto the frame's Serial No
+SERIAL_NO_ITEM_FIELDS = (
+	("engnie_no_motor_no", "custom_engine_number"),
+	("key_no", "custom_key_no"),
+	("color_code", "color_code"),
+)
+
+SERIAL_NO_ATTRIBUTE_COLUMNS = ("custom_engine_number", "custom_key_no", "color_code", "purchase_date")
 
 
 class LoadDispatch(Document):
@@ -47,18 +91,88 @@ class LoadDispatch(Document):
 			)
 	
 	def before_save(self):
-		"""Populate item_code from model_serial_no before saving (only if Item exists)."""
-		if not self.is_new() and self.items:
-			self.set_item_code()
+		"""Populate item_code from model_serial_no before saving (only if Item exists).
+		
+		Stages already run by validate in this save are skipped.
+		"""
+		if self.items:
+			self._run_item_stage("set_item_code")
 		
 		if self.items and self.has_valid_load_plan():
-			self.create_serial_nos()
-			self.set_fields_value()
-			self.set_item_group()
+			self._run_item_stage("create_serial_nos")
+			self._run_item_stage("set_fields_value")
+			self._run_item_stage("set_item_group")
 			self.set_supplier()
 		
 		if self.items:
-			self.sync_print_name_to_items()
+			self._run_item_stage("sync_print_name_to_items")
+	
+	def _reset_item_stages(self):
+		self._completed_item_stages = set()
+		self._changed_items = None
+	
+	def _get_changed_items(self):
+		"""Rows that are new or whose tracked fields differ from the last saved version.
+		
+		Every row counts as changed when a tracked header field changed or the Load Plan
+		was created since the last save (the plan-gated stages were skipped then).
+		"""
+		if getattr(self, "_changed_items", None) is not None:
+			return self._changed_items
+		
+		doc_before_save = self.get_doc_before_save()
+		if not doc_before_save or self._has_header_changed(doc_before_save):
+			self._changed_items = list(self.items or [])
+			return self._changed_items
+		
+		def tracked_values(item):
+			return tuple(cstr(item.get(fieldname)).strip() for fieldname in LOAD_DISPATCH_ITEM_TRACKED_FIELDS)
+		
+		saved_values = {item.name: tracked_values(item) for item in (doc_before_save.items or [])}
+		self._changed_items = [
+			item for item in (self.items or [])
+			if not item.name or saved_values.get(item.name) != tracked_values(item)
+		]
+		return self._changed_items
+	
+	def _has_header_changed(self, doc_before_save):
+		"""True if a field the item stages depend on changed since doc_before_save."""
+		if any(
+			cstr(self.get(fieldname)) != cstr(doc_before_save.get(fieldname))
+			for fieldname in LOAD_DISPATCH_HEADER_TRACKED_FIELDS
+		):
+			return True
+		
+		if not self.load_reference_no:
+			return False
+		load_plan_created = frappe.db.get_value("Load Plan", self.load_reference_no, "creation")
+		return bool(load_plan_created and doc_before_save.modified
+			and get_datetime(load_plan_created) > get_datetime(doc_before_save.modified))
+	
+	def apply_item_stages(self, items):
+		"""Run the per-row stages of a save over rows written without one (the server side file import)."""
+		if not items:
+			return
+		
+		self.set_item_code(items=items)
+		if self.has_valid_load_plan():
+			self.create_serial_nos(items=items)
+			self.set_fields_value(items=items)
+			self.set_item_group(items=items)
+		self.sync_print_name_to_items(items=items)
+	
+	def _run_item_stage(self, stage):
+		"""Run an item stage at most once per save, over the changed rows only."""
+		if not hasattr(self, "_completed_item_stages"):
+			self._reset_item_stages()
+		
+		if stage in self._completed_item_stages:
+			return
+		self._completed_item_stages.add(stage)
+		
+		items = self._get_changed_items()
+		if items:
+			getattr(self, stage)(items=items)
 	
 	def on_submit(self):
 		"""On submit, set status and update Load Plan."""
@@ -67,25 +181,21 @@ class LoadDispatch(Document):
 	
 	def validate(self):
 		"""Validate Load Dispatch (Items created in before_submit, not here)."""
+		self._reset_item_stages()
+		
 		if not self.items:
 			self.calculate_total_dispatch_quantity()
 			return
 		
-		for item in self.items:
-			if item.model_serial_no and str(item.model_serial_no).strip():
-				item_code = str(item.model_serial_no).strip()
-				if frappe.db.exists("Item", item_code):
-					item.item_code = item_code
-				else:
-					item.item_code = None
+		self._run_item_stage("set_item_code")
 		
 		if self.items and self.has_valid_load_plan():
-			self.create_serial_nos()
-			self.set_fields_value()
-			self.set_item_group()
+			self._run_item_stage("create_serial_nos")
+			self._run_item_stage("set_fields_value")
+			self._run_item_stage("set_item_group")
 		
 		if self.items:
-			self.sync_print_name_to_items()
+			self._run_item_stage("sync_print_name_to_items")
 		
 		has_imported_items = any(item.frame_no and str(item.frame_no).strip() for item in (self.items or []))
 		
@@ -117,172 +227,96 @@ class LoadDispatch(Document):
 			self.calculate_total_receipt_quantity()
 			self.total_billed_quantity = 0
 	
-	def create_serial_nos(self):
-		"""Create serial nos for all items on save."""
+	def create_serial_nos(self, items=None):
+		"""Create serial nos for the given items (all items by default) on save.
+		
+		Existing Serial Nos are read with one IN query, missing ones are bulk inserted and
+		engine number, key no, colour code and purchase date are updated per column in bulk.
+		"""
 		if not self.has_valid_load_plan():
 			return
 		
-		if self.items:
-			has_purchase_date = frappe.db.has_column("Serial No", "purchase_date")
-			for item in self.items:
-				item_code = str(item.model_serial_no).strip() if item.model_serial_no else ""
-				if item_code and item.frame_no:
-					serial_no_name = str(item.frame_no).strip()
-
-					if not frappe.db.exists("Serial No", serial_no_name):
-						try:
-							serial_no = frappe.get_doc({
-								"doctype": "Serial No",
-								"item_code": item_code,
-								"serial_no": serial_no_name,
-							})
-
-							engnie_no = getattr(item, "engnie_no_motor_no", None)
-							if engnie_no is not None and str(engnie_no).strip():
-								if frappe.db.has_column("Serial No", "custom_engine_number"):
-									serial_no.custom_engine_number = str(engnie_no).strip()
-
-							key_no_value = getattr(item, "key_no", None)
-							if key_no_value is not None and str(key_no_value).strip():
-								if frappe.db.has_column("Serial No", "custom_key_no"):
-									serial_no.custom_key_no = str(key_no_value).strip()
-
-							color_code_value = getattr(item, "color_code", None)
-							if color_code_value is not None and str(color_code_value).strip():
-								if frappe.db.has_column("Serial No", "color_code"):
-									serial_no.color_code = str(color_code_value).strip()
-
-							if has_purchase_date:
-								purchase_date = (
-									getattr(item, "dispatch_date", None)
-									or getattr(item, "planned_arrival_date", None)
-									or getattr(self, "dispatch_date", None)
-								)
-								if purchase_date:
-									try:
-										from frappe.utils import getdate
-										setattr(serial_no, "purchase_date", getdate(purchase_date))
-									except Exception:
-										pass
-
-							serial_no.insert(ignore_permissions=True)
-						except Exception as e:
-							frappe.log_error(f"Error creating Serial No {serial_no_name}: {str(e)}", "Serial No Creation Error")
-					else:
-						engnie_no = getattr(item, "engnie_no_motor_no", None)
-						if engnie_no is not None and str(engnie_no).strip():
-							if frappe.db.has_column("Serial No", "custom_engine_number"):
-								try:
-									frappe.db.set_value(
-										"Serial No",
-										serial_no_name,
-										"custom_engine_number",
-										str(engnie_no).strip(),
-										update_modified=False
-									)
-								except Exception as e:
-									frappe.log_error(
-										f"Error updating custom_engine_number for Serial No {serial_no_name}: {str(e)}",
-										"Serial No Update Error",
-									)
-						
-						key_no_value = getattr(item, "key_no", None)
-						if key_no_value is not None and str(key_no_value).strip():
-							if frappe.db.has_column("Serial No", "custom_key_no"):
-								try:
-									frappe.db.set_value(
-										"Serial No",
-										serial_no_name,
-										"custom_key_no",
-										str(key_no_value).strip(),
-										update_modified=False
-									)
-								except Exception as e:
-									frappe.log_error(
-										f"Error updating custom_key_no for Serial No {serial_no_name}: {str(e)}",
-										"Serial No Update Error",
-									)
-
-						color_code_value = getattr(item, "color_code", None)
-						if color_code_value is not None and str(color_code_value).strip():
-							if frappe.db.has_column("Serial No", "color_code"):
-								try:
-									frappe.db.set_value(
-										"Serial No",
-										serial_no_name,
-										"color_code",
-										str(color_code_value).strip(),
-										update_modified=False
-									)
-								except Exception as e:
-									frappe.log_error(
-										f"Error updating color_code for Serial No {serial_no_name}: {str(e)}",
-										"Serial No Update Error",
-									)
-
-						if has_purchase_date:
-							purchase_date = (
-								getattr(item, "dispatch_date", None)
-								or getattr(item, "planned_arrival_date", None)
-								or getattr(self, "dispatch_date", None)
-							)
-							if purchase_date:
-								try:
-									from frappe.utils import getdate
-									frappe.db.set_value(
-										"Serial No",
-										serial_no_name,
-										"purchase_date",
-										getdate(purchase_date),
-									)
-								except Exception as e:
-									frappe.log_error(
-										f"Error setting purchase_date for Serial No {serial_no_name}: {str(e)}",
-										"Serial No Update Error",
-									)
-	
-	def set_item_code(self):
+		items = self.items if items is None else items
+		if not items:
+			return
+		
+		serial_no_values = {}
+		for item in items:
+			item_code = str(item.model_serial_no).strip() if item.model_serial_no else ""
+			if not item_code or not item.frame_no:
+				continue
+			
+			values = {"item_code": item_code}
+			for fieldname, column in SERIAL_NO_ITEM_FIELDS:
+				value = getattr(item, fieldname, None)
+				if value is not None and str(value).strip():
+					values[column] = str(value).strip()
+			
+			purchase_date = (
+				getattr(item, "dispatch_date", None)
+				or getattr(item, "planned_arrival_date", None)
+				or getattr(self, "dispatch_date", None)
+			)
+			if purchase_date:
+				values["purchase_date"] = purchase_date
+			
+			serial_no_values[str(item.frame_no).strip()] = values
+		
+		errors = upsert_serial_nos(serial_no_values)
+		if errors:
+			frappe.log_error(
+				"Serial No errors for Load Dispatch {0}:\n{1}".format(self.name, "\n".join(errors)),
+				"Serial No Creation Error"
+			)
+	
+	def set_item_code(self, items=None):
 		"""Populate item_code from model_serial_no, only if Item already exists."""
-		if not self.items:
+		items = self.items if items is None else items
+		if not items:
 			return
 		
-		for item in self.items:
+		item_codes = {str(item.model_serial_no).strip() for item in items if item.model_serial_no and str(item.model_serial_no).strip()}
+		existing_item_codes = set(frappe.get_all("Item", filters={"name": ["in", list(item_codes)]}, pluck="name")) if item_codes else set()
+		
+		for item in items:
 			if not item.model_serial_no or not str(item.model_serial_no).strip():
 				continue
 			
 			item_code = str(item.model_serial_no).strip()
-			
-			if frappe.db.exists("Item", item_code):
-				item.item_code = item_code
-			else:
-				item.item_code = None
+			item.item_code = item_code if item_code in existing_item_codes else None
 	
-	def set_fields_value(self):
+	def set_fields_value(self, items=None):
 		"""Set default values: calculate print_name and rate from price_unit."""
-		if not self.items:
+		items = self.items if items is None else items
+		if not items:
 			return
 		
-		for item in self.items:
+		for item in items:
 			if hasattr(item, "model_serial_no") and item.model_serial_no:
 				item.print_name = calculate_print_name(item.model_serial_no, getattr(item, "model_name", None))
 			
 			if hasattr(item, "price_unit") and item.price_unit:
-				price_unit = flt(item.price_unit)
-				if price_unit > 0:
-					calculated_rate = price_unit / 1.18
-					item.rate = calculated_rate
+				rate = _rate_from_price_unit(item.price_unit)
+				if rate:
+					item.rate = rate
 
-	def set_item_group(self):
+	def set_item_group(self, items=None):
 		"""Set item_group for Load Dispatch Items based on model_name using unified function."""
 		if not self.has_valid_load_plan():
 			return
 		
-		if not self.items:
+		items = self.items if items is None else items
+		if not items:
 			return
 		
-		for item in self.items:
-			if hasattr(item, 'item_group') and not item.item_group and item.model_name:
-				item.item_group = _get_or_create_item_group_unified(item.model_name)
+		rows = [item for item in items if hasattr(item, 'item_group') and not item.item_group and item.model_name]
+		if not rows:
+			return
+		
+		# Distinct model names resolved once per document
+		item_groups = resolve_item_groups([item.model_name for item in rows])
+		for item in rows:
+			item.item_group = item_groups.get(str(item.model_name).strip())
 	
 	def set_supplier(self):
 		"""Set supplier for items from RKG Settings."""
@@ -301,18 +335,20 @@ class LoadDispatch(Document):
 		except frappe.DoesNotExistError:
 			pass
 	
-	def sync_print_name_to_items(self):
-		"""Sync print_name from Load Dispatch Item to Item doctype for all items with item_code."""
-		if not self.items:
+	def sync_print_name_to_items(self, items=None):
+		"""Sync print_name from Load Dispatch Item to Item doctype for the given items (all by default) with item_code."""
+		items = self.items if items is None else items
+		if not items:
 			return
 		
-		if not frappe.db.has_column("Item", "print_name"):
+		if not has_column("Item", "print_name"):
 			return
 		
-		updated_items = []
-		for item in self.items:
-			if not item.item_code or not str(item.item_code).strip() or not frappe.db.exists("Item", (item_code := str(item.item_code).strip())):
+		print_names = {}
+		for item in items:
+			if not item.item_code or not str(item.item_code).strip():
 				continue
+			item_code = str(item.item_code).strip()
 			
 			print_name = (str(item.print_name).strip() if hasattr(item, "print_name") and item.print_name else None)
 			if not print_name and item.model_serial_no:
@@ -320,20 +356,33 @@ class LoadDispatch(Document):
 				item.print_name = print_name
 			
 			if print_name:
-				current_print_name = frappe.db.get_value("Item", item_code, "print_name")
-				if current_print_name != print_name:
-					try:
-						frappe.db.set_value("Item", item_code, "print_name", print_name, update_modified=False)
-						updated_items.append(item_code)
-					except Exception as e:
-						frappe.log_error(
-							f"Failed to sync print_name for Item {item_code}: {str(e)}",
-							"Print Name Sync Error"
-						)
+				print_names[item_code] = print_name
 		
-		if updated_items:
-			frappe.db.commit()
-			frappe.clear_cache(doctype="Item")
+		if not print_names:
+			return
+		
+		# One read for all distinct Items, one write for the ones that differ
+		current_print_names = dict(frappe.get_all(
+			"Item", filters={"name": ["in", list(print_names)]}, fields=["name", "print_name"], as_list=True
+		))
+		updates = {
+			item_code: print_name for item_code, print_name in print_names.items()
+			if item_code in current_print_names and current_print_names[item_code] != print_name
+		}
+		if not updates:
+			return
+		
+		try:
+			bulk_set_values("Item", "print_name", updates)
+		except Exception as e:
+			frappe.log_error(
+				f"Failed to sync print_name for Items {', '.join(updates)}: {str(e)}",
+				"Print Name Sync Error"
+			)
+			return
+		
+		for item_code in updates:
+			frappe.clear_document_cache("Item", item_code)
 
 	def before_submit(self):
 		"""Validate Load Plan and create Items before submitting Load Dispatch."""
@@ -386,55 +435,20 @@ class LoadDispatch(Document):
 			frappe.local.load_dispatch_print_name_map = {}
 		frappe.local.load_dispatch_print_name_map.update(print_name_map)
 		
-		for item in self.items:
-			if item.item_code and str(item.item_code).strip():
-				item_code = str(item.item_code).strip()
-				if not frappe.db.exists("Item", item_code):
+		linked_item_codes = {str(item.item_code).strip() for item in self.items if item.item_code and str(item.item_code).strip()}
+		if linked_item_codes:
+			existing_item_codes = set(frappe.get_all("Item", filters={"name": ["in", list(linked_item_codes)]}, pluck="name"))
+			for item in self.items:
+				item_code = str(item.item_code).strip() if item.item_code else ""
+				if item_code and item_code not in existing_item_codes:
 					frappe.throw(
 						_("Row #{0}: Item '{1}' does not exist. Please check the Item Code.").format(
 							getattr(item, 'idx', 'Unknown'), item_code
 						),
 						title=_("Invalid Item Code")
 					)
-				continue
-			
-			if not item.model_serial_no or not str(item.model_serial_no).strip():
-				continue
-			
-			item_code = str(item.model_serial_no).strip()
-			
-			if frappe.db.exists("Item", item_code):
-				item.item_code = item_code
-			else:
-				try:
-					print_name_for_item = self._print_name_map.get(item_code) if hasattr(self, '_print_name_map') and self._print_name_map else None
-					if print_name_for_item:
-						item.print_name = print_name_for_item
-					
-					self._create_single_item_from_dispatch_item(item, item_code)
-					frappe.clear_cache(doctype="Item")
-					frappe.db.commit()
-					
-					if frappe.db.exists("Item", item_code):
-						item.item_code = item_code
-					else:
-						frappe.throw(
-							_("Item '{0}' was not created for Row #{1} before submit. Please check Error Log.").format(
-								item_code, getattr(item, 'idx', 'Unknown')
-							),
-							title=_("Item Creation Failed")
-						)
-				except Exception as e:
-					frappe.log_error(
-						f"Failed to create Item {item_code} for Row #{getattr(item, 'idx', 'Unknown')} before submit: {str(e)}\nTraceback: {frappe.get_traceback()}",
-						"Item Creation Error in before_submit"
-					)
-					frappe.throw(
-						_("Failed to create Item '{0}' for Row #{1} before submit.\n\nError: {2}\n\nPlease check Error Log for details.").format(
-							item_code, getattr(item, 'idx', 'Unknown'), str(e)
-						),
-						title=_("Item Creation Failed")
-					)
+		
+		self.create_missing_items()
 		
 		missing_items = []
 		for item in self.items:
@@ -453,45 +467,66 @@ class LoadDispatch(Document):
 					title=_("Item Code Missing")
 				)
 	
+	def create_missing_items(self):
+		"""Create Items for models on this document that have none yet, as one batch inside the submit transaction."""
+		rows = [
+			item for item in self.items
+			if not (item.item_code and str(item.item_code).strip())
+			and item.model_serial_no and str(item.model_serial_no).strip()
+		]
+		if not rows:
+			return
+		
+		upsert_items_from_dispatch_rows(rows, print_name_map=getattr(self, '_print_name_map', None))
+		
+		for row in rows:
+			row.item_code = str(row.model_serial_no).strip()
+	
 	def on_cancel(self):
 		self.add_dispatch_quanity_to_load_plan(docstatus=2)
+		clear_load_dispatch_projection(self.name)
+	
+	def on_update_after_submit(self):
+		clear_load_dispatch_projection(self.name)
 	
 	def update_status(self):
 		"""Update Load Dispatch status based on received quantity from Purchase Receipts."""
-		total_dispatch = flt(self.total_dispatch_quantity) or 0
-		
-		total_received = flt(self.total_receipt_quantity) or 0
-		
-		if total_dispatch > 0 and total_received >= total_dispatch:
-			new_status = "Received"
-		else:
-			new_status = "In-Transit"
+		new_status = _get_load_dispatch_status(self.total_dispatch_quantity, self.total_receipt_quantity)
 		
 		if self.status != new_status:
 			frappe.db.set_value("Load Dispatch", self.name, "status", new_status, update_modified=False)
 			self.status = new_status
 	
 	def add_dispatch_quanity_to_load_plan(self, docstatus):
-		"""Update load_dispatch_quantity in Load Plan when Load Dispatch is submitted or cancelled."""
+		"""Update load_dispatch_quantity in Load Plan when Load Dispatch is submitted or cancelled.
+		
+		Applied as one atomic UPDATE ... SET x = x + delta, so concurrent dispatch submits against
+		the same Load Plan cannot lose an update.
+		"""
 		if not self.load_reference_no:
 			return
 		
 		if not self.total_dispatch_quantity:
 			self.calculate_total_dispatch_quantity()
 		
-		current_quantity = frappe.db.get_value("Load Plan", self.load_reference_no, "load_dispatch_quantity") or 0
-		
 		if docstatus == 1:
-			new_quantity = current_quantity + (self.total_dispatch_quantity or 0)
+			delta = flt(self.total_dispatch_quantity)
 		elif docstatus == 2:
-			new_quantity = max(0, current_quantity - (self.total_dispatch_quantity or 0))
+			delta = -flt(self.total_dispatch_quantity)
 		else:
 			return
 		
-		status = 'In-Transit' if flt(new_quantity) > 0 else 'Submitted'
-		
-		frappe.db.set_value("Load Plan", self.load_reference_no, "load_dispatch_quantity", new_quantity, update_modified=False)
-		frappe.db.set_value("Load Plan", self.load_reference_no, "status", status, update_modified=False)
+		# status is computed from the new quantity expression, not the column assigned after it
+		frappe.db.sql(
+			"""
+			UPDATE `tabLoad Plan`
+			SET status = IF(IFNULL(load_dispatch_quantity, 0) + %(delta)s > 0, 'In-Transit', 'Submitted'),
+				load_dispatch_quantity = GREATEST(0, IFNULL(load_dispatch_quantity, 0) + %(delta)s)
+			WHERE name = %(load_plan)s
+			""",
+			{"delta": delta, "load_plan": self.load_reference_no},
+		)
+		frappe.clear_document_cache("Load Plan", self.load_reference_no)
 	
 	def calculate_total_dispatch_quantity(self):
 		"""Count the number of rows with non-empty frame_no in Load Dispatch Item child table."""
@@ -503,83 +538,16 @@ class LoadDispatch(Document):
 	
 	def calculate_totals_from_purchase_documents(self):
 		"""Calculate total_receipt_quantity and total_billed_quantity from Purchase Receipts/Invoices linked to Load Dispatch."""
-		total_received_qty = 0
-		total_billed_qty = 0
-		
-		if frappe.db.has_column("Purchase Receipt", "custom_load_dispatch"):
-			pr_list = frappe.get_all(
-				"Purchase Receipt",
-				filters={
-					"docstatus": 1,
-					"custom_load_dispatch": self.name
-				},
-				fields=["name", "total_qty"]
-			)
-			
-			for pr in pr_list:
-				try:
-					pr_qty = flt(pr.get("total_qty")) or 0
-					if pr_qty == 0:
-						try:
-							pr_doc = frappe.get_doc("Purchase Receipt", pr.name)
-							if hasattr(pr_doc, "items") and pr_doc.items:
-								pr_qty = sum(flt(item.get("qty") or item.get("stock_qty") or item.get("received_qty") or 0) for item in pr_doc.items)
-						except Exception:
-							pass
-					total_received_qty += pr_qty
-				except Exception:
-					continue
-		
-		if frappe.db.has_column("Purchase Invoice", "custom_load_dispatch"):
-			pi_list = frappe.get_all(
-				"Purchase Invoice",
-				filters={
-					"docstatus": 1,
-					"custom_load_dispatch": self.name
-				},
-				fields=["name", "total_qty"]
-			)
-			
-			for pi in pi_list:
-				try:
-					pi_qty = flt(pi.get("total_qty")) or 0
-					if pi_qty == 0:
-						try:
-							pi_doc = frappe.get_doc("Purchase Invoice", pi.name)
-							if hasattr(pi_doc, "items") and pi_doc.items:
-								pi_qty = sum(flt(item.get("qty") or item.get("stock_qty") or item.get("received_qty") or 0) for item in pi_doc.items)
-						except Exception:
-							pass
-					total_billed_qty += pi_qty
-				except Exception:
-					continue
-			
-			for pi in pi_list:
-				try:
-					pi_doc = frappe.get_doc("Purchase Invoice", pi.name)
-					if hasattr(pi_doc, "items") and pi_doc.items:
-						linked_purchase_receipts = {item.purchase_receipt for item in pi_doc.items if hasattr(item, "purchase_receipt") and item.purchase_receipt}
-						if linked_purchase_receipts:
-							for pr_name in linked_purchase_receipts:
-								if frappe.db.has_column("Purchase Receipt", "custom_load_dispatch"):
-									pr_load_dispatch = frappe.db.get_value("Purchase Receipt", pr_name, "custom_load_dispatch")
-									if pr_load_dispatch == self.name:
-										total_received_qty = total_billed_qty
-										break
-				except Exception:
-					continue
-		
-		self.total_receipt_quantity = total_received_qty
-		self.total_billed_quantity = total_billed_qty
+		totals = get_purchase_totals([self.name])[self.name]
+		self.total_receipt_quantity = totals["total_receipt_quantity"]
+		self.total_billed_quantity = totals["total_billed_quantity"]
 	
 	def _filter_duplicate_frame_numbers(self):
 		"""Filter out Load Dispatch Items with frame numbers already existing in Serial No doctype."""
 		if not self.items:
 			return
 		
-		items_to_remove = []
-		skipped_items = []
-		
+		candidates = []
 		for item in self.items:
 			if not item.frame_no:
 				continue
@@ -594,45 +562,25 @@ class LoadDispatch(Document):
 			if not item_code:
 				continue
 			
-			if frappe.db.exists("Serial No", frame_no):
-				if self.name:
-					existing_load_dispatch_item = frappe.db.sql("""
-						SELECT 
-							ldi.name,
-							ldi.frame_no,
-							ldi.item_code,
-							ld.name as load_dispatch_name,
-							ld.docstatus
-						FROM `tabLoad Dispatch Item` ldi
-						INNER JOIN `tabLoad Dispatch` ld ON ldi.parent = ld.name
-						WHERE ldi.frame_no = %s
-							AND ldi.item_code = %s
-							AND ld.docstatus = 1
-							AND ld.name != %s
-					""", (frame_no, item_code, self.name), as_dict=True)
-				else:
-					existing_load_dispatch_item = frappe.db.sql("""
-						SELECT 
-							ldi.name,
-							ldi.frame_no,
-							ldi.item_code,
-							ld.name as load_dispatch_name,
-							ld.docstatus
-						FROM `tabLoad Dispatch Item` ldi
-						INNER JOIN `tabLoad Dispatch` ld ON ldi.parent = ld.name
-						WHERE ldi.frame_no = %s
-							AND ldi.item_code = %s
-							AND ld.docstatus = 1
-					""", (frame_no, item_code), as_dict=True)
-				
-				if existing_load_dispatch_item:
-					existing_doc_name = existing_load_dispatch_item[0].get('load_dispatch_name', 'Unknown')
-					items_to_remove.append(item)
-					skipped_items.append({
-						'frame_no': frame_no,
-						'item_code': item_code,
-						'existing_doc': existing_doc_name
-					})
+			candidates.append((item, frame_no, item_code))
+		
+		if not candidates:
+			return
+		
+		# One query for all rows instead of an exists + join per row
+		submitted_frames = _get_submitted_dispatch_frames([frame_no for _item, frame_no, _code in candidates], self.name)
+		
+		items_to_remove = []
+		skipped_items = []
+		for item, frame_no, item_code in candidates:
+			existing_doc_name = submitted_frames.get((frame_no, item_code))
+			if existing_doc_name:
+				items_to_remove.append(item)
+				skipped_items.append({
+					'frame_no': frame_no,
+					'item_code': item_code,
+					'existing_doc': existing_doc_name
+				})
 		
 		if items_to_remove:
 			for item in items_to_remove:
@@ -660,177 +608,31 @@ class LoadDispatch(Document):
 		if not self.items:
 			return
 		
-		rkg_settings = None
-		try:
-			rkg_settings = frappe.get_single("RKG Settings")
-		except frappe.DoesNotExistError:
-			pass
-		
-		created_items = []
-		updated_items = []
-		skipped_items = []
-		failed_items = []
-		
+		rows = []
 		for item in self.items:
-			item_code = (str(item.model_serial_no).strip() if item.model_serial_no and str(item.model_serial_no).strip()
-				else (str(item.item_code).strip() if hasattr(item, 'item_code') and item.item_code and str(item.item_code).strip() else None))
+			item_code = _get_dispatch_row_item_code(item)
 			if not item_code:
 				continue
 			
 			item.item_code = item_code
 			if not hasattr(item, "print_name") or not item.print_name:
 				item.print_name = calculate_print_name(item.model_serial_no, getattr(item, "model_name", None))
-			
-			try:
-				if frappe.db.exists("Item", item_code):
-					item_doc = frappe.get_doc("Item", item_code)
-					updated = False
-					
-					# Update print_name if provided
-					if hasattr(item, "print_name") and item.print_name:
-						if hasattr(item_doc, "print_name"):
-							item_doc.print_name = item.print_name
-							updated = True
-					
-					# Update HSN code if provided
-					if hasattr(item, "hsn_code") and item.hsn_code:
-						hsn_code = item.hsn_code
-						if hasattr(item_doc, "gst_hsn_code"):
-							if item_doc.gst_hsn_code != hsn_code:
-								item_doc.gst_hsn_code = hsn_code
-								updated = True
-						elif hasattr(item_doc, "custom_gst_hsn_code"):
-							if item_doc.custom_gst_hsn_code != hsn_code:
-								item_doc.custom_gst_hsn_code = hsn_code
-								updated = True
-
-					if updated:
-						item_doc.save(ignore_permissions=True)
-						frappe.db.commit()
-						
-						# Also update using db.set_value to ensure persistence
-						if hasattr(item, "print_name") and item.print_name and frappe.db.has_column("Item", "print_name"):
-							try:
-								frappe.db.set_value("Item", item_code, "print_name", item.print_name, update_modified=False)
-								frappe.db.commit()
-							except Exception as e:
-								frappe.log_error(f"Failed to update print_name for Item {item_code}: {str(e)}", "Item Print Name Update Failed")
-						
-						if hasattr(item, "hsn_code") and item.hsn_code:
-							hsn_code = item.hsn_code
-							hsn_field = None
-							if frappe.db.has_column("Item", "gst_hsn_code"):
-								hsn_field = "gst_hsn_code"
-							elif frappe.db.has_column("Item", "custom_gst_hsn_code"):
-								hsn_field = "custom_gst_hsn_code"
-							
-							if hsn_field:
-								try:
-									frappe.db.set_value("Item", item_code, hsn_field, hsn_code, update_modified=False)
-									frappe.db.commit()
-								except Exception as e:
-									frappe.log_error(f"Failed to update HSN code for Item {item_code}: {str(e)}", "Item HSN Code Update Failed")
-						
-						updated_items.append(item_code)
-					else:
-						skipped_items.append(item_code)
-					continue
-
-				model_name = str(item.model_name).strip() if (item.model_name and str(item.model_name).strip()) else None
-				item_group = _get_or_create_item_group_unified(model_name)
-				
-				stock_uom = str(item.unit).strip() if hasattr(item, "unit") and item.unit else "Pcs"
-				
-				# Get HSN code before creating item_doc
-				hsn_code = None
-				if hasattr(item, "hsn_code") and item.hsn_code:
-					hsn_code = item.hsn_code
-				
-				# Build item_dict with HSN code if field exists
-				item_dict = {
-					"doctype": "Item",
-					"item_code": item_code,
-					"item_name": item.model_variant or item_code,
-					"item_group": item_group,
-					"stock_uom": stock_uom,
-					"is_stock_item": 1,
-					"has_serial_no": 1,
-				}
-				
-				# Add HSN code to item_dict if field exists
-				if hsn_code:
-					if frappe.db.has_column("Item", "gst_hsn_code"):
-						item_dict["gst_hsn_code"] = hsn_code
-					elif frappe.db.has_column("Item", "custom_gst_hsn_code"):
-						item_dict["custom_gst_hsn_code"] = hsn_code
-				
-				# Add print_name to item_dict if it exists
-				if hasattr(item, "print_name") and item.print_name:
-					item_dict["print_name"] = item.print_name
-				
-				item_doc = frappe.get_doc(item_dict)
-				
-				if rkg_settings and rkg_settings.get("default_supplier"):
-					if hasattr(item_doc, "supplier_items"):
-						item_doc.append("supplier_items", {
-							"supplier": rkg_settings.default_supplier,
-							"is_default": 1
-						})
-					elif hasattr(item_doc, "supplier"):
-						item_doc.supplier = rkg_settings.default_supplier
-				
-				# Also set HSN code on item_doc object as backup
-				if hsn_code:
-					if hasattr(item_doc, "gst_hsn_code"):
-						item_doc.gst_hsn_code = hsn_code
-					elif hasattr(item_doc, "custom_gst_hsn_code"):
-						item_doc.custom_gst_hsn_code = hsn_code
-				
-				if hasattr(item, "print_name") and item.print_name:
-					if hasattr(item_doc, "print_name"):
-						item_doc.print_name = item.print_name
-
-				item_doc.insert(ignore_permissions=True)
-				frappe.db.commit()
-				
-				# Save HSN code using db.set_value to ensure it's persisted
-				if hsn_code:
-					hsn_field = None
-					if frappe.db.has_column("Item", "gst_hsn_code"):
-						hsn_field = "gst_hsn_code"
-					elif frappe.db.has_column("Item", "custom_gst_hsn_code"):
-						hsn_field = "custom_gst_hsn_code"
-					
-					if hsn_field:
-						try:
-							frappe.db.set_value("Item", item_code, hsn_field, hsn_code, update_modified=False)
-							frappe.db.commit()
-						except Exception as e:
-							frappe.log_error(f"Failed to set HSN code for Item {item_code}: {str(e)}", "Item HSN Code Update Failed")
-				
-				# Save print_name using db.set_value to ensure it's persisted
-				if hasattr(item, "print_name") and item.print_name and frappe.db.has_column("Item", "print_name"):
-					try:
-						frappe.db.set_value("Item", item_code, "print_name", item.print_name, update_modified=False)
-						frappe.db.commit()
-					except Exception as e:
-						frappe.log_error(f"Failed to set print_name for Item {item_code}: {str(e)}", "Item Print Name Update Failed")
-				
-				created_items.append(item_code)
-				
-			except Exception as e:
-				import traceback
-				error_details = traceback.format_exc()
-				frappe.log_error(
-					f"Error creating Item {item_code}: {str(e)}\n{error_details}", 
-					"Item Creation Error"
-				)
-				failed_items.append({
-					"item_code": item_code,
-					"error": str(e),
-					"row": getattr(item, 'idx', 'Unknown')
-				})
-				continue
+			rows.append(item)
+		
+		failed_items = []
+		try:
+			result = upsert_items_from_dispatch_rows(rows, update_existing=True)
+		except frappe.ValidationError as e:
+			result = {"created": [], "updated": [], "skipped": []}
+			failed_items.append({
+				"item_code": getattr(e, "item_code", None) or "",
+				"error": str(e),
+				"row": getattr(e, "row_idx", None) or "Unknown"
+			})
+		
+		created_items = result["created"]
+		updated_items = result["updated"]
+		skipped_items = result["skipped"]
 		
 		if created_items:
 			frappe.msgprint(
@@ -880,8 +682,162 @@ class LoadDispatch(Document):
 			)
 
 
+def _get_dispatch_row_item_code(row):
+	"""Item code of a dispatch row: its model serial no, else an already set item_code."""
+	model_serial_no = row.get("model_serial_no")
+	if model_serial_no and str(model_serial_no).strip():
+		return str(model_serial_no).strip()
+	item_code = row.get("item_code")
+	if item_code and str(item_code).strip():
+		return str(item_code).strip()
+	return None
+
+
+def _get_item_hsn_field():
+	if has_column("Item", "gst_hsn_code"):
+		return "gst_hsn_code"
+	if has_column("Item", "custom_gst_hsn_code"):
+		return "custom_gst_hsn_code"
+	return None
+
+
+def _get_default_supplier():
+	try:
+		return frappe.db.get_single_value("RKG Settings", "default_supplier")
+	except Exception:
+		return None
+
+
+def _build_item_doc(item_code, item_name, item_group, stock_uom, print_name=None, hsn_code=None, default_supplier=None):
+	"""Build (not insert) a serialised stock Item with print name, HSN code and supplier already set."""
+	item_dict = {
+		"doctype": "Item",
+		"item_code": item_code,
+		"item_name": item_name,
+		"item_group": item_group,
+		"stock_uom": stock_uom,
+		"is_stock_item": 1,
+		"has_serial_no": 1,
+	}
+	if print_name:
+		item_dict["print_name"] = print_name
+	
+	hsn_field = _get_item_hsn_field()
+	if hsn_code and hsn_field:
+		item_dict[hsn_field] = hsn_code
+	
+	item_doc = frappe.get_doc(item_dict)
+	
+	if default_supplier:
+		if hasattr(item_doc, "supplier_items"):
+			item_doc.append("supplier_items", {"supplier": default_supplier, "is_default": 1})
+		elif hasattr(item_doc, "supplier"):
+			item_doc.supplier = default_supplier
+	
+	return item_doc
+
+
+def upsert_items_from_dispatch_rows(rows, print_name_map=None, update_existing=False):
+	"""Create the Items missing for a set of Load Dispatch rows inside the caller's transaction.
+	
+	The distinct models are diffed against the Item table in one query. Missing Items are inserted
+	with print name, HSN code and the RKG Settings default supplier already set, so nothing is
+	written twice and nothing is committed. With update_existing, differing print names and HSN
+	codes of existing Items are written with one statement per field.
+	
+	Raises on the first Item that cannot be created, so the caller's transaction rolls back
+	instead of leaving half the masters behind.
+	
+	Returns {"created": [...], "updated": [...], "skipped": [...]} item codes.
+	"""
+	print_name_map = print_name_map or {}
+	result = {"created": [], "updated": [], "skipped": []}
+	
+	models = {}
+	for row in rows:
+		item_code = _get_dispatch_row_item_code(row)
+		if item_code and item_code not in models:
+			models[item_code] = row
+	
+	if not models:
+		return result
+	
+	hsn_field = _get_item_hsn_field()
+	has_print_name = has_column("Item", "print_name")
+	fields = ["name"] + (["print_name"] if has_print_name else []) + ([hsn_field] if hsn_field else [])
+	existing_items = {
+		item.name: item
+		for item in frappe.get_all("Item", filters={"name": ["in", list(models)]}, fields=fields)
+	}
+	
+	default_supplier = _get_default_supplier()
+	item_groups = resolve_item_groups(
+		[row.get("model_name") for item_code, row in models.items() if item_code not in existing_items]
+	)
+	updates = {"print_name": {}, hsn_field: {}}
+	
+	for item_code, row in models.items():
+		model_name = cstr(row.get("model_name")).strip() or None
+		print_name = (print_name_map.get(item_code) or cstr(row.get("print_name")).strip()
+			or calculate_print_name(cstr(row.get("model_serial_no")).strip() or item_code, model_name))
+		hsn_code = row.get("hsn_code") or None
+		
+		existing_item = existing_items.get(item_code)
+		if existing_item:
+			changed = False
+			if update_existing and has_print_name and print_name and existing_item.print_name != print_name:
+				updates["print_name"][item_code] = print_name
+				changed = True
+			if update_existing and hsn_field and hsn_code and cstr(existing_item.get(hsn_field)) != cstr(hsn_code):
+				updates[hsn_field][item_code] = hsn_code
+				changed = True
+			result["updated" if changed else "skipped"].append(item_code)
+			continue
+		
+		try:
+			item_doc = _build_item_doc(
+				item_code,
+				cstr(row.get("model_variant")).strip() or item_code,
+				item_groups.get(model_name) or _get_or_create_item_group_unified(None),
+				cstr(row.get("unit")).strip() or "Pcs",
+				print_name=print_name,
+				hsn_code=hsn_code,
+				default_supplier=default_supplier,
+			)
+			item_doc.insert(ignore_permissions=True)
+		except Exception as e:
+			row_idx = row.get("idx") or "Unknown"
+			frappe.log_error(
+				f"Failed to create Item {item_code} for Row #{row_idx}: {str(e)}\nTraceback: {frappe.get_traceback()}",
+				"Item Creation Error"
+			)
+			error = frappe.ValidationError(
+				_("Failed to create Item '{0}' for Row #{1}.\n\nError: {2}\n\nPlease check Error Log for details.").format(
+					item_code, row_idx, str(e)
+				)
+			)
+			error.item_code = item_code
+			error.row_idx = row_idx
+			raise error
+		
+		result["created"].append(item_code)
+	
+	for fieldname, values in updates.items():
+		if fieldname and values:
+			bulk_set_values("Item", fieldname, values)
+	
+	for item_code in result["updated"]:
+		frappe.clear_document_cache("Item", item_code)
+	
+	return result
+
+
+@lru_cache(maxsize=2048)
 def calculate_print_name(model_serial_no, model_name=None):
-	"""Calculate Print Name: Model Name + (Model Serial Number up to "-ID") + (BS-VI)"""
+	"""Calculate Print Name: Model Name + (Model Serial Number up to "-ID") + (BS-VI)
+	
+	Memoised: a dispatch repeats the same few models across hundreds of rows.
+	"""
 	if not model_serial_no:
 		return ""
 	
@@ -908,29 +864,6 @@ def calculate_print_name(model_serial_no, model_name=None):
 	
 	# If no model_name, just use serial_part
 	return f"{serial_part} (BS-VI)"
-def update_load_dispatch_status_from_totals(doc, method=None):
-	"""Update Load Dispatch status based on totals when Purchase Receipt/Invoice is submitted or cancelled."""
-	try:
-		load_dispatch_name = (doc.custom_load_dispatch if hasattr(doc, "custom_load_dispatch") and doc.custom_load_dispatch
-			else (frappe.db.get_value(doc.doctype, doc.name, "custom_load_dispatch") if frappe.db.has_column(doc.doctype, "custom_load_dispatch") else None))
-
-		if not load_dispatch_name:
-			return
-
-		if not frappe.db.exists("Load Dispatch", load_dispatch_name):
-			return
-
-		# Recalculate totals which will also update status
-		load_dispatch = frappe.get_doc("Load Dispatch", load_dispatch_name)
-		load_dispatch.calculate_totals_from_purchase_documents()
-		load_dispatch.update_status()
-		
-		frappe.db.commit()
-	except Exception as e:
-		frappe.log_error(
-			f"Error updating Load Dispatch status from {doc.doctype} {doc.name}: {str(e)}\nTraceback: {frappe.get_traceback()}",
-			"Load Dispatch Status Update Error"
-		)
 
 
 @frappe.whitelist()
@@ -946,7 +879,7 @@ def check_existing_documents(load_dispatch_name):
 	if not load_dispatch_name:
 		return result
 	
-	if frappe.db.has_column("Purchase Receipt", "custom_load_dispatch"):
+	if has_column("Purchase Receipt", "custom_load_dispatch"):
 		pr_list = frappe.get_all(
 			"Purchase Receipt",
 			filters={
@@ -960,7 +893,7 @@ def check_existing_documents(load_dispatch_name):
 			result["has_purchase_receipt"] = True
 			result["purchase_receipt_name"] = pr_list[0].name
 	
-	if frappe.db.has_column("Purchase Invoice", "custom_load_dispatch"):
+	if has_column("Purchase Invoice", "custom_load_dispatch"):
 		pi_list = frappe.get_all(
 			"Purchase Invoice",
 			filters={
@@ -977,294 +910,615 @@ def check_existing_documents(load_dispatch_name):
 	return result
 
 
-@frappe.whitelist()
-def process_tabular_file(file_url, selected_load_reference_no=None):
-	"""Process CSV/Excel file, create Items if they don't exist, and return tabular data with item_code populated."""
-	from frappe.utils import get_site_path
-	
+DISPATCH_COLUMN_MAPPING = {
+	'model serial no': 'model_serial_no',
+	'model serial number': 'model_serial_no',
+	'modelvariant': 'model_variant',
+	'model variant': 'model_variant',
+	'modelname': 'model_name',
+	'model name': 'model_name',
+	'frameno': 'frame_no',
+	'frame no': 'frame_no',
+	'frame number': 'frame_no',
+	'engineno': 'engnie_no_motor_no',
+	'engine no': 'engnie_no_motor_no',
+	'engine number': 'engnie_no_motor_no',
+	'motor no': 'engnie_no_motor_no',
+	'motor number': 'engnie_no_motor_no',
+	'colorno': 'color_code',
+	'color no': 'color_code',
+	'color': 'color_code',
+	'colorcode': 'color_code',
+	'colourno': 'color_code',
+	'colour no': 'color_code',
+	'colour': 'color_code',
+	'colourcode': 'color_code',
+	'invoiceno': 'invoice_no',
+	'invoice no': 'invoice_no',
+	'invoice number': 'invoice_no',
+	'hsncode': 'hsn_code',
+	'hsn code': 'hsn_code',
+	'priceunit': 'price_unit',
+	'price unit': 'price_unit',
+	'price/unit': 'price_unit',
+	'taxrate': 'tax_rate',
+	'tax rate': 'tax_rate',
+	'dispatchdate': 'dispatch_date',
+	'dispatch date': 'dispatch_date',
+	'dor': 'dor',
+	'qty': 'qty',
+	'quantity': 'qty',
+	'unit': 'unit',
+	'keyno': 'key_no',
+	'key no': 'key_no',
+	'batteryno': 'battery_no',
+	'battery no': 'battery_no',
+	'printname': 'print_name',
+	'print name': 'print_name',
+	'hmsi load reference no': 'hmsi_load_reference_no',
+	'hmsi load reference number': 'hmsi_load_reference_no',
+	'load reference no': 'hmsi_load_reference_no',
+	'load reference number': 'hmsi_load_reference_no',
+}
+
+
+def _parse_date_value(date_value):
+	"""Parse a date cell into YYYY-MM-DD, or None if it is empty or cannot be parsed."""
+	if not date_value or is_empty_value(date_value):
+		return None
+	
+	if hasattr(date_value, 'strftime'):
+		return date_value.strftime('%Y-%m-%d')
+	
+	date_str = str(date_value).strip()
+	if not date_str:
+		return None
+	
+	from frappe.utils import getdate
 	try:
-		if file_url.startswith('/files/'):
-			file_path = get_site_path('public', file_url[1:])
-		elif file_url.startswith('/private/files/'):
-			file_path = get_site_path('private', 'files', file_url.split('/')[-1])
-		else:
-			file_path = get_site_path('public', 'files', file_url)
-		
-		file_ext = os.path.splitext(file_path)[1].lower()
-		
-		rows = []
-		if file_ext == '.csv':
-			# Try multiple encodings to handle different file formats
-			encodings = ["utf-8-sig", "utf-8", "utf-16-le", "utf-16-be", "latin-1", "cp1252"]
-			csvfile = None
-			for encoding in encodings:
-				try:
-					csvfile = open(file_path, "r", encoding=encoding)
-					sample = csvfile.read(1024)
-					csvfile.seek(0)
-					break
-				except (UnicodeDecodeError, UnicodeError):
-					if csvfile:
-						csvfile.close()
-					csvfile = None
-					continue
-			
-			if not csvfile:
-				frappe.throw(_("Unable to read the file. Please ensure it is saved as CSV with a supported encoding (UTF-8, UTF-16, or Windows-1252)."))
-			
-			try:
-				reader = csv.DictReader(csvfile)
-				rows = list(reader)
-			finally:
-				if csvfile:
-					csvfile.close()
-		elif file_ext in ['.xlsx', '.xls']:
-			try:
-				import pandas as pd
-				df = pd.read_excel(file_path)
-				rows = df.to_dict('records')
-			except ImportError:
-				frappe.throw(_("pandas library is required for Excel files. Please install it or use CSV format."))
-		else:
-			frappe.throw(_("Unsupported file format. Please upload CSV or Excel file."))
-		
-		def normalize_column_name(col_name):
-			"""Normalize column name to handle case-insensitive matching and variations."""
-			if not col_name:
-				return None
-			normalized = str(col_name).lower().strip()
-			normalized = normalized.replace('.', '').replace('_', ' ').replace('-', ' ')
-			normalized = ' '.join(normalized.split())
-			return normalized
-		
-		def is_empty_value(value):
-			"""Check if value is empty or NaN."""
-			if value is None:
-				return True
-			if isinstance(value, float):
-				try:
-					import math
-					return math.isnan(value)
-				except:
-					return False
-			if isinstance(value, str):
-				return not value.strip()
-			return False
-		
-		# Create mapping from normalized column names to field names
-		column_mapping = {
-			'model serial no': 'model_serial_no',
-			'model serial number': 'model_serial_no',
-			'modelvariant': 'model_variant',
-			'model variant': 'model_variant',
-			'modelname': 'model_name',
-			'model name': 'model_name',
-			'frameno': 'frame_no',
-			'frame no': 'frame_no',
-			'frame number': 'frame_no',
-			'engineno': 'engnie_no_motor_no',
-			'engine no': 'engnie_no_motor_no',
-			'engine number': 'engnie_no_motor_no',
-			'motor no': 'engnie_no_motor_no',
-			'motor number': 'engnie_no_motor_no',
-			'colorno': 'color_code',
-			'color no': 'color_code',
-			'color': 'color_code',
-			'colorcode': 'color_code',
-			'colourno': 'color_code',
-			'colour no': 'color_code',
-			'colour': 'color_code',
-			'colourcode': 'color_code',
-			'invoiceno': 'invoice_no',
-			'invoice no': 'invoice_no',
-			'invoice number': 'invoice_no',
-			'hsncode': 'hsn_code',
-			'hsn code': 'hsn_code',
-			'priceunit': 'price_unit',
-			'price unit': 'price_unit',
-			'price/unit': 'price_unit',
-			'taxrate': 'tax_rate',
-			'tax rate': 'tax_rate',
-			'dispatchdate': 'dispatch_date',
-			'dispatch date': 'dispatch_date',
-			'dor': 'dor',
-			'qty': 'qty',
-			'quantity': 'qty',
-			'unit': 'unit',
-			'keyno': 'key_no',
-			'key no': 'key_no',
-			'batteryno': 'battery_no',
-			'battery no': 'battery_no',
-			'printname': 'print_name',
-			'print name': 'print_name',
-			'hmsi load reference no': 'hmsi_load_reference_no',
-			'hmsi load reference number': 'hmsi_load_reference_no',
-			'load reference no': 'hmsi_load_reference_no',
-			'load reference number': 'hmsi_load_reference_no',
-		}
-		
-		def parse_date(date_value):
-			"""Parse date from various formats and return YYYY-MM-DD format."""
-			if not date_value or is_empty_value(date_value):
-				return None
-			
-			if hasattr(date_value, 'strftime'):
-				return date_value.strftime('%Y-%m-%d')
-			
-			date_str = str(date_value).strip()
-			if not date_str:
-				return None
-			
-			from frappe.utils import getdate
-			try:
-				parsed_date = getdate(date_str)
-				return parsed_date.strftime('%Y-%m-%d')
-			except:
-				try:
-					import re
-					match = re.match(r'(\d{1,2})[/-](\d{1,2})[/-](\d{4})', date_str)
-					if match:
-						month, day, year = match.groups()
-						if int(day) > 12:
-							day, month = month, day
-						return f"{year}-{month.zfill(2)}-{day.zfill(2)}"
-					
-					match = re.match(r'(\d{4})[/-](\d{1,2})[/-](\d{1,2})', date_str)
-					if match:
-						year, month, day = match.groups()
-						return f"{year}-{month.zfill(2)}-{day.zfill(2)}"
-				except:
-					pass
-			
-			frappe.log_error(f"Could not parse date: {date_str}", "Date Parsing Error")
-			return None
-		
-		processed_rows = []
-		load_ref_nos = set()
-		
-		for idx, row in enumerate(rows, start=1):
-			normalized_row = {}
-			for excel_col, value in row.items():
-				if is_empty_value(value):
-					continue
-				normalized_col = normalize_column_name(excel_col)
-				if normalized_col and normalized_col in column_mapping:
-					field_name = column_mapping[normalized_col]
-					if field_name in ['dispatch_date', 'dor']:
-						parsed_date = parse_date(value)
-						if parsed_date:
-							normalized_row[field_name] = parsed_date
-					else:
-						normalized_row[field_name] = value
-				else:
-					normalized_row[excel_col] = value
-			
-			hmsi_load_ref_no = (
-				normalized_row.get('hmsi_load_reference_no') or
-				row.get('hmsi_load_reference_no') or
-				row.get('HMSI Load Reference No') or
-				row.get('HMSI_LOAD_REFERENCE_NO') or
-				row.get('Load Reference No') or
-				row.get('LOAD_REFERENCE_NO')
-			)
-			
-			if hmsi_load_ref_no and str(hmsi_load_ref_no).strip():
-				load_ref_nos.add(str(hmsi_load_ref_no).strip())
-				normalized_row['hmsi_load_reference_no'] = str(hmsi_load_ref_no).strip()
-			
-			model_serial_no = (
-				normalized_row.get('model_serial_no') or
-				row.get('model_serial_no') or 
-				row.get('Model Serial No') or 
-				row.get('MODEL_SERIAL_NO') or
-				row.get('Model Serial No.') or
-				row.get('MODEL_SERIAL_NO.') or
-				row.get('Model Serial Number') or
-				row.get('MODEL_SERIAL_NUMBER')
-			)
+		parsed_date = getdate(date_str)
+		return parsed_date.strftime('%Y-%m-%d')
+	except:
+		try:
+			import re
+			match = re.match(r'(\d{1,2})[/-](\d{1,2})[/-](\d{4})', date_str)
+			if match:
+				month, day, year = match.groups()
+				if int(day) > 12:
+					day, month = month, day
+				return f"{year}-{month.zfill(2)}-{day.zfill(2)}"
 			
-			if not model_serial_no or not str(model_serial_no).strip():
-				processed_rows.append(normalized_row)
+			match = re.match(r'(\d{4})[/-](\d{1,2})[/-](\d{1,2})', date_str)
+			if match:
+				year, month, day = match.groups()
+				return f"{year}-{month.zfill(2)}-{day.zfill(2)}"
+		except:
+			pass
+	
+	return None
+
+
+def _strip_value(value):
+	return str(value).strip()
+
+
+# Dates are parsed once per distinct value in normalise_dispatch_rows, not per cell
+DISPATCH_DATE_FIELDS = ('dispatch_date', 'dor')
+
+DISPATCH_COLUMN_CONVERTERS = {
+	'hmsi_load_reference_no': _strip_value,
+	'model_serial_no': _strip_value,
+}
+
+
+def compile_dispatch_column_plan(headers):
+	"""Compile a Load Dispatch file header row; unknown columns are passed through under their header."""
+	return compile_column_plan(headers, DISPATCH_COLUMN_MAPPING, converters=DISPATCH_COLUMN_CONVERTERS, passthrough=True)
+
+
+def iter_dispatch_row_chunks(file_path, chunk_size=IMPORT_CHUNK_SIZE):
+	"""Yield chunks of normalised Load Dispatch Item rows, reading the file lazily."""
+	headers, rows = read_tabular_file(file_path)
+	if not headers:
+		return
+	
+	plan = compile_dispatch_column_plan(headers)
+	for chunk in iter_chunks(rows, chunk_size):
+		yield [plan.map_row(row) for row in chunk]
+
+
+def _rate_from_price_unit(price_unit):
+	price_unit = flt(price_unit)
+	return price_unit / 1.18 if price_unit > 0 else None
+
+
+def normalise_dispatch_rows(rows, bad_cells):
+	"""Parse date columns and derive rate and print_name for a chunk of mapped rows, in place.
+	
+	Each distinct date string is parsed once. Unparsable dates are left out of the row and
+	counted in bad_cells as {fieldname: {value: count}} instead of being logged one by one.
+	"""
+	parsed_dates = {}
+	for row in rows:
+		for fieldname in DISPATCH_DATE_FIELDS:
+			if fieldname not in row:
 				continue
-			
-			item_code = str(model_serial_no).strip()
-			
-			normalized_row['model_serial_no'] = item_code
-			
-			if frappe.db.exists("Item", item_code):
-				normalized_row['item_code'] = item_code
-			else:
-				try:
-					_create_item_unified(normalized_row, item_code, source_type="row_data")
-					frappe.clear_cache(doctype="Item")
-					if frappe.db.exists("Item", item_code):
-						normalized_row['item_code'] = item_code
-					else:
-						frappe.log_error(f"Item '{item_code}' was not created. Row index: {idx}", "Item Creation Failed")
-						normalized_row['item_code'] = None
-				except Exception as e:
-					frappe.log_error(
-						f"Failed to create Item '{item_code}' for row {idx}: {str(e)}\nTraceback: {frappe.get_traceback()}",
-						"Item Creation Error in process_tabular_file"
-					)
-					normalized_row['item_code'] = None
-			
-			processed_rows.append(normalized_row)
-		
-		load_ref_nos_list = sorted(list(load_ref_nos))
-		
-		invalid_load_ref_nos = []
-		valid_load_ref_nos = []
-		for load_ref_no in load_ref_nos_list:
-			if frappe.db.exists("Load Plan", load_ref_no):
-				valid_load_ref_nos.append(load_ref_no)
+			value = row[fieldname]
+			key = value if isinstance(value, str) else str(value)
+			if key not in parsed_dates:
+				parsed_dates[key] = _parse_date_value(value)
+			if parsed_dates[key]:
+				row[fieldname] = parsed_dates[key]
 			else:
-				invalid_load_ref_nos.append(load_ref_no)
-		
-		if selected_load_reference_no and selected_load_reference_no.strip():
-			selected_load_ref_no = str(selected_load_reference_no).strip()
-			
-			if not frappe.db.exists("Load Plan", selected_load_ref_no):
-				frappe.throw(
-					_("Load Reference Number '{0}' does not exist as a Load Plan. Please create the Load Plan first or select a valid Load Reference Number.").format(selected_load_ref_no),
-					title=_("Invalid Load Reference Number")
-				)
-			
-			filtered_rows = []
-			for row in processed_rows:
-				row_load_ref_no = row.get('hmsi_load_reference_no')
-				if row_load_ref_no and str(row_load_ref_no).strip() == selected_load_ref_no:
-					filtered_rows.append(row)
-				elif not row_load_ref_no:
-					filtered_rows.append(row)
-			
-			return {
-				'rows': filtered_rows,
-				'has_multiple_load_ref_nos': len(load_ref_nos_list) > 1,
-				'load_ref_nos': load_ref_nos_list,
-				'valid_load_ref_nos': valid_load_ref_nos,
-				'invalid_load_ref_nos': invalid_load_ref_nos,
-				'selected_load_ref_no': selected_load_ref_no,
-				'filtered': True
-			}
-		
-		# Return all rows with metadata about Load Ref Nos
-		return {
-			'rows': processed_rows,
-			'has_multiple_load_ref_nos': len(load_ref_nos_list) > 1,
-			'load_ref_nos': load_ref_nos_list,
-			'valid_load_ref_nos': valid_load_ref_nos,
-			'invalid_load_ref_nos': invalid_load_ref_nos,
-			'selected_load_ref_no': None,
-			'filtered': False
-		}
-		
-	except Exception as e:
+				raw = str(row.pop(fieldname)).strip()
+				field_bad_cells = bad_cells.setdefault(fieldname, {})
+				field_bad_cells[raw] = field_bad_cells.get(raw, 0) + 1
+		
+		if row.get('price_unit'):
+			rate = _rate_from_price_unit(row['price_unit'])
+			if rate:
+				row['rate'] = rate
+		
+		if row.get('model_serial_no'):
+			model_name = row.get('model_name')
+			row['print_name'] = calculate_print_name(row['model_serial_no'], None if is_empty_value(model_name) else model_name)
+
+
+def _read_dispatch_rows(file_path, selected_load_ref_no=None, on_chunk=None):
+	"""Read and normalise a Load Dispatch file, keeping only the rows of selected_load_ref_no (all if None).
+	
+	Rows are filtered chunk by chunk, so only the rows that survive the filter are held in memory.
+	on_chunk is called with the number of rows read so far after every chunk.
+	
+	Returns {'rows': [...], 'load_ref_nos': [...every load reference in the file],
+	'bad_cells': [{'fieldname', 'value', 'count'}, ...]}.
+	"""
+	rows = []
+	load_ref_nos = set()
+	bad_cells = {}
+	rows_read = 0
+	for chunk in iter_dispatch_row_chunks(file_path):
+		normalise_dispatch_rows(chunk, bad_cells)
+		rows_read += len(chunk)
+		for row in chunk:
+			row_load_ref_no = row.get('hmsi_load_reference_no')
+			if row_load_ref_no:
+				load_ref_nos.add(row_load_ref_no)
+			if selected_load_ref_no and row_load_ref_no and row_load_ref_no != selected_load_ref_no:
+				continue
+			rows.append(row)
+		if on_chunk:
+			on_chunk(rows_read)
+	
+	bad_cell_list = [
+		{'fieldname': fieldname, 'value': value, 'count': count}
+		for fieldname, values in bad_cells.items()
+		for value, count in values.items()
+	]
+	if bad_cell_list:
 		frappe.log_error(
-			f"Error processing tabular file {file_url}: {str(e)}\nTraceback: {frappe.get_traceback()}",
-			"process_tabular_file Error"
+			"Could not parse dates in {0}:\n{1}".format(
+				file_path,
+				"\n".join(f"{cell['fieldname']}: {cell['value']} ({cell['count']} rows)" for cell in bad_cell_list)
+			),
+			"Date Parsing Error"
 		)
-		frappe.throw(_("Error processing file: {0}").format(str(e)))
+	
+	return {'rows': rows, 'load_ref_nos': sorted(load_ref_nos), 'bad_cells': bad_cell_list}
+
+
+def _resolve_dispatch_item_codes(rows):
+	"""Set item_code on rows whose model already exists as an Item, using one IN query.
+	
+	Returns the model serial nos that have no Item yet. Nothing is created here; missing
+	Items are created in one batch when the Load Dispatch is submitted (create_missing_items).
+	"""
+	item_codes = {row['model_serial_no'] for row in rows if row.get('model_serial_no')}
+	if not item_codes:
+		return set()
+	
+	existing_item_codes = set(frappe.get_all("Item", filters={"name": ["in", list(item_codes)]}, pluck="name"))
+	for row in rows:
+		item_code = row.get('model_serial_no')
+		if item_code:
+			row['item_code'] = item_code if item_code in existing_item_codes else None
+	
+	return item_codes - existing_item_codes
+
+
+def build_tabular_file_result(file_url, selected_load_reference_no=None, on_chunk=None):
+	"""Read a Load Dispatch file chunk by chunk and build the import payload.
+	
+	on_chunk, if given, is called with the number of rows read so far after every chunk.
+	"""
+	file_path = get_file_path(file_url)
+	
+	selected_load_ref_no = None
+	if selected_load_reference_no and str(selected_load_reference_no).strip():
+		selected_load_ref_no = str(selected_load_reference_no).strip()
+		if not frappe.db.exists("Load Plan", selected_load_ref_no):
+			frappe.throw(
+				_("Load Reference Number '{0}' does not exist as a Load Plan. Please create the Load Plan first or select a valid Load Reference Number.").format(selected_load_ref_no),
+				title=_("Invalid Load Reference Number")
+			)
+	
+	# The filtered rows are cached by file content and selection, so re-attaching the same file skips the parse
+	parsed = get_cached_parse(
+		f"load_dispatch:{selected_load_ref_no or ''}",
+		file_path,
+		lambda: _read_dispatch_rows(file_path, selected_load_ref_no, on_chunk)
+	)
+	
+	processed_rows = parsed['rows']
+	missing_item_codes = _resolve_dispatch_item_codes(processed_rows)
+	load_ref_nos_list = parsed['load_ref_nos']
+	
+	valid_load_ref_nos = []
+	invalid_load_ref_nos = []
+	for load_ref_no in load_ref_nos_list:
+		if frappe.db.exists("Load Plan", load_ref_no):
+			valid_load_ref_nos.append(load_ref_no)
+		else:
+			invalid_load_ref_nos.append(load_ref_no)
+	
+	return {
+		'rows': processed_rows,
+		'has_multiple_load_ref_nos': len(load_ref_nos_list) > 1,
+		'load_ref_nos': load_ref_nos_list,
+		'valid_load_ref_nos': valid_load_ref_nos,
+		'invalid_load_ref_nos': invalid_load_ref_nos,
+		'selected_load_ref_no': selected_load_ref_no,
+		'filtered': bool(selected_load_ref_no),
+		'missing_item_codes': sorted(missing_item_codes),
+		'bad_cells': parsed['bad_cells']
+	}
+
+
+@frappe.whitelist()
+def process_tabular_file(file_url, selected_load_reference_no=None):
+	"""Process CSV/Excel file chunk by chunk and return tabular data, with item_code set where the Item exists.
+	
+	Unknown models are only reported in missing_item_codes; their Items are created on submit.
+	"""
+	try:
+		return build_tabular_file_result(file_url, selected_load_reference_no)
+	except Exception as e:
+		frappe.log_error(
+			f"Error processing tabular file {file_url}: {str(e)}\nTraceback: {frappe.get_traceback()}",
+			"process_tabular_file Error"
+		)
+		frappe.throw(_("Error processing file: {0}").format(str(e)))
+
+
+IMPORT_JOB_CACHE_KEY = "rkg:load_dispatch_import:{0}"
+IMPORT_JOB_EXPIRY = 60 * 60
+IMPORT_PROGRESS_EVENT = "load_dispatch_import_progress"
+
+
+def _set_import_job_state(job_id, state):
+	frappe.cache().set_value(IMPORT_JOB_CACHE_KEY.format(job_id), state, expires_in_sec=IMPORT_JOB_EXPIRY)
+
+
+def _publish_import_progress(job_id, user, status, rows_read=0, error=None):
+	frappe.publish_realtime(
+		IMPORT_PROGRESS_EVENT,
+		{"job_id": job_id, "status": status, "rows_read": rows_read, "error": error},
+		user=user
+	)
+
+
+@frappe.whitelist()
+def enqueue_tabular_file_import(file_url, selected_load_reference_no=None):
+	"""Process a Load Dispatch file in a background job. Returns the job_id to follow progress with."""
+	if not file_url:
+		frappe.throw(_("No file provided"))
+	
+	job_id = frappe.generate_hash(length=12)
+	user = frappe.session.user
+	_set_import_job_state(job_id, {"status": "queued", "user": user, "rows_read": 0})
+	
+	frappe.enqueue(
+		"rkg.rkg.doctype.load_dispatch.load_dispatch.run_tabular_file_import",
+		queue="long",
+		timeout=1800,
+		job_name=f"load_dispatch_import_{job_id}",
+		import_job_id=job_id,
+		file_url=file_url,
+		selected_load_reference_no=selected_load_reference_no,
+		user=user,
+	)
+	
+	return {"job_id": job_id}
+
+
+def run_tabular_file_import(import_job_id, file_url, selected_load_reference_no=None, user=None):
+	"""Background job for enqueue_tabular_file_import; the result is kept in Redis under the job id."""
+	job_id = import_job_id
+	
+	def on_chunk(rows_read):
+		_set_import_job_state(job_id, {"status": "running", "user": user, "rows_read": rows_read})
+		_publish_import_progress(job_id, user, "running", rows_read)
+	
+	try:
+		result = build_tabular_file_result(file_url, selected_load_reference_no, on_chunk=on_chunk)
+	except Exception as e:
+		frappe.log_error(
+			f"Error processing tabular file {file_url}: {str(e)}\nTraceback: {frappe.get_traceback()}",
+			"process_tabular_file Error"
+		)
+		error = _("Error processing file: {0}").format(str(e))
+		_set_import_job_state(job_id, {"status": "failed", "user": user, "error": error})
+		_publish_import_progress(job_id, user, "failed", error=error)
+		return
+	
+	rows_read = len(result.get("rows") or [])
+	_set_import_job_state(job_id, {"status": "finished", "user": user, "rows_read": rows_read, "result": result})
+	_publish_import_progress(job_id, user, "finished", rows_read)
+
+
+@frappe.whitelist()
+def get_tabular_file_import_result(job_id):
+	"""Return the state of a background file import: status, rows_read and, once finished, the result."""
+	state = frappe.cache().get_value(IMPORT_JOB_CACHE_KEY.format(job_id))
+	if not state:
+		return {"status": "not_found"}
+	
+	if state.get("user") != frappe.session.user:
+		frappe.throw(_("Not permitted"), frappe.PermissionError)
+	
+	return state
+
+
+def upsert_serial_nos(serial_no_values):
+	"""Create or update Serial Nos in bulk.
+	
+	Args:
+		serial_no_values: {serial_no: {"item_code": ..., "custom_engine_number": ..., "custom_key_no": ...,
+			"color_code": ..., "purchase_date": ...}}; attribute keys are optional
+	
+	Attributes are only written where the Serial No has the column and the value differs.
+	Returns a list of per-serial error messages; nothing is raised.
+	"""
+	if not serial_no_values:
+		return []
+	
+	from frappe.utils import getdate
+	
+	columns = [column for column in SERIAL_NO_ATTRIBUTE_COLUMNS if has_column("Serial No", column)]
+	errors = []
+	
+	# Normalise purchase dates once per distinct value, on copies so the caller's dicts are left untouched
+	serial_no_values = {serial_no: dict(values) for serial_no, values in serial_no_values.items()}
+	parsed_dates = {}
+	for serial_no, values in serial_no_values.items():
+		if "purchase_date" not in values:
+			continue
+		raw = values.pop("purchase_date")
+		if "purchase_date" not in columns:
+			continue
+		if raw not in parsed_dates:
+			try:
+				parsed_dates[raw] = getdate(raw)
+			except Exception as e:
+				parsed_dates[raw] = None
+				errors.append(f"{serial_no}: invalid purchase date {raw} ({str(e)})")
+		if parsed_dates[raw]:
+			values["purchase_date"] = parsed_dates[raw]
+	
+	existing = {
+		row.name: row
+		for row in frappe.get_all(
+			"Serial No",
+			filters={"name": ["in", list(serial_no_values)]},
+			fields=["name"] + columns,
+		)
+	}
+	
+	to_create = {serial_no: values for serial_no, values in serial_no_values.items() if serial_no not in existing}
+	if to_create:
+		errors.extend(_bulk_insert_serial_nos(to_create, columns))
+	
+	for column in columns:
+		updates = {
+			serial_no: values[column]
+			for serial_no, values in serial_no_values.items()
+			if serial_no in existing and values.get(column) is not None
+				and cstr(existing[serial_no].get(column)) != cstr(values[column])
+		}
+		if not updates:
+			continue
+		try:
+			bulk_set_values("Serial No", column, updates)
+		except Exception as e:
+			errors.append(f"Updating {column} for {len(updates)} Serial No(s): {str(e)}")
+	
+	return errors
+
+
+def _bulk_insert_serial_nos(serial_no_values, columns):
+	"""Insert new Serial Nos with one multi-row INSERT per chunk; returns error messages."""
+	item_codes = list({values["item_code"] for values in serial_no_values.values()})
+	item_details = {
+		item.name: item
+		for item in frappe.get_all(
+			"Item",
+			filters={"name": ["in", item_codes]},
+			fields=["name", "item_name", "item_group", "brand", "description"],
+		)
+	}
+	
+	errors = []
+	now = frappe.utils.now()
+	table_columns = frappe.db.get_table_columns("Serial No")
+	rows = []
+	for serial_no, values in serial_no_values.items():
+		item = item_details.get(values["item_code"])
+		if not item:
+			errors.append(f"{serial_no}: Item {values['item_code']} does not exist")
+			continue
+		
+		serial_doc = frappe.new_doc("Serial No")
+		serial_doc.update({
+			"name": serial_no,
+			"serial_no": serial_no,
+			"item_code": item.name,
+			"item_name": item.item_name,
+			"item_group": item.item_group,
+			"brand": item.brand,
+			"description": item.description,
+			"owner": frappe.session.user,
+			"modified_by": frappe.session.user,
+			"creation": now,
+			"modified": now,
+		})
+		serial_doc.update({column: values[column] for column in columns if values.get(column) is not None})
+		valid_dict = serial_doc.get_valid_dict(convert_dates_to_str=True)
+		rows.append(tuple(valid_dict.get(column) for column in table_columns))
+	
+	try:
+		frappe.db.bulk_insert("Serial No", table_columns, rows, ignore_duplicates=True, chunk_size=BULK_CHUNK_SIZE)
+	except Exception as e:
+		errors.append(f"Creating {len(rows)} Serial No(s): {str(e)}")
+	
+	return errors
+
+
+def _get_submitted_dispatch_frames(frame_nos, exclude_load_dispatch=None):
+	"""Return {(frame_no, item_code): load_dispatch} for frames that have a Serial No and are on a
+	submitted Load Dispatch, in one query (backed by the frame_no, item_code index)."""
+	frame_nos = list({str(frame_no).strip() for frame_no in frame_nos if frame_no and str(frame_no).strip()})
+	if not frame_nos:
+		return {}
+
+	rows = frappe.db.sql("""
+		SELECT ldi.frame_no, ldi.item_code, ld.name as load_dispatch_name
+		FROM `tabLoad Dispatch Item` ldi
+		INNER JOIN `tabLoad Dispatch` ld ON ldi.parent = ld.name
+		INNER JOIN `tabSerial No` sn ON sn.name = ldi.frame_no
+		WHERE ldi.frame_no IN %(frame_nos)s
+			AND ld.docstatus = 1
+			AND ld.name != %(exclude)s
+	""", {"frame_nos": frame_nos, "exclude": exclude_load_dispatch or ""}, as_dict=True)
+
+	submitted_frames = {}
+	for row in rows:
+		submitted_frames.setdefault((row.frame_no, row.item_code), row.load_dispatch_name)
+	return submitted_frames
+
+
+@frappe.whitelist()
+def import_file_into_load_dispatch(load_dispatch_name, file_url, selected_load_reference_no=None):
+	"""Write the rows of a dispatch file straight into a saved draft Load Dispatch.
+
+	Rows are validated server side and bulk inserted into `tabLoad Dispatch Item`, replacing
+	the existing items, so large files never travel to the browser and back. The per-row stages
+	of a save (item code, serial nos, rate, item group, print name) run once over the new rows
+	before they are written, so no later save has to fill them in.
+	"""
+	doc = frappe.get_doc("Load Dispatch", load_dispatch_name)
+	doc.check_permission("write")
+
+	if doc.docstatus != 0:
+		frappe.throw(_("Items can only be imported into a draft Load Dispatch."))
+
+	selected_load_ref_no = selected_load_reference_no or doc.load_reference_no
+	result = build_tabular_file_result(file_url, selected_load_ref_no)
+
+	valid_load_ref_nos = set(result['valid_load_ref_nos'])
+	rows = [row for row in result['rows'] if not row.get('hmsi_load_reference_no') or row['hmsi_load_reference_no'] in valid_load_ref_nos]
+	if not rows:
+		frappe.throw(
+			_("No rows with valid Load Reference Numbers found. Please ensure the Load Reference Numbers in the file exist as Load Plans."),
+			title=_("No Valid Data")
+		)
+
+	row_load_ref_nos = {row['hmsi_load_reference_no'] for row in rows if row.get('hmsi_load_reference_no')}
+	if len(row_load_ref_nos) > 1:
+		frappe.throw(
+			_("The file contains {0} different Load Reference Numbers. Please select which one to import.").format(len(row_load_ref_nos)),
+			title=_("Multiple Load Reference Numbers Found")
+		)
+
+	load_ref_no = next(iter(row_load_ref_nos), None) or doc.load_reference_no
+
+	submitted_frames = _get_submitted_dispatch_frames([row.get('frame_no') for row in rows], doc.name)
+	skipped_frames = []
+	if submitted_frames:
+		kept_rows = []
+		for row in rows:
+			frame_no = str(row.get('frame_no') or '').strip()
+			if frame_no and (frame_no, row.get('model_serial_no')) in submitted_frames:
+				skipped_frames.append(frame_no)
+			else:
+				kept_rows.append(row)
+		rows = kept_rows
+
+	frame_counts = {}
+	for row in rows:
+		frame_no = str(row.get('frame_no') or '').strip()
+		if frame_no:
+			frame_counts[frame_no] = frame_counts.get(frame_no, 0) + 1
+	duplicate_frames = [frame_no for frame_no, count in frame_counts.items() if count > 1]
+	if duplicate_frames:
+		frappe.throw(
+			_("The file contains duplicate Frame Numbers:\n{0}").format(
+				"\n".join(duplicate_frames[:20]) + ("\n..." if len(duplicate_frames) > 20 else "")
+			),
+			title=_("Duplicate Frame Numbers")
+		)
+
+	if load_ref_no and doc.load_reference_no != load_ref_no:
+		doc.load_reference_no = load_ref_no
+	if rows and rows[0].get('invoice_no'):
+		doc.invoice_no = rows[0]['invoice_no']
+
+	now = frappe.utils.now()
+	user = frappe.session.user
+	children = []
+	for idx, row in enumerate(rows, start=1):
+		children.append(frappe.get_doc({
+			**row,
+			'doctype': "Load Dispatch Item",
+			'name': frappe.generate_hash(length=10),
+			'parent': doc.name,
+			'parenttype': "Load Dispatch",
+			'parentfield': "items",
+			'idx': idx,
+			'docstatus': 0,
+			'owner': user,
+			'modified_by': user,
+			'creation': now,
+			'modified': now,
+		}))
+
+	# The per-row stages a save would run (item code, serial nos, rate, item group, print name),
+	# once over the new rows before they are written
+	doc.apply_item_stages(children)
+
+	columns = frappe.db.get_table_columns("Load Dispatch Item")
+	values = []
+	for child in children:
+		child_dict = child.get_valid_dict(convert_dates_to_str=True)
+		values.append(tuple(child_dict.get(column) for column in columns))
+
+	frappe.db.delete("Load Dispatch Item", {"parent": doc.name, "parenttype": "Load Dispatch", "parentfield": "items"})
+	frappe.db.bulk_insert("Load Dispatch Item", columns, values, chunk_size=IMPORT_CHUNK_SIZE)
+
+	doc.items = children
+	doc.calculate_total_dispatch_quantity()
+	frappe.db.set_value("Load Dispatch", doc.name, {
+		"load_reference_no": doc.load_reference_no,
+		"invoice_no": doc.invoice_no,
+		"total_dispatch_quantity": doc.total_dispatch_quantity,
+	})
+
+	return {
+		'rows_imported': len(rows),
+		'skipped_frames': skipped_frames,
+		'invalid_load_ref_nos': result['invalid_load_ref_nos'],
+		'missing_item_codes': result['missing_item_codes'],
+		'bad_cells': result['bad_cells'],
+	}
 
 
 def _create_item_from_row_data(row_data, item_code):
@@ -1273,7 +1527,10 @@ def _create_item_from_row_data(row_data, item_code):
 
 
 def _create_item_unified(item_data, item_code, source_type="dispatch_item", print_name=None):
-	"""Unified Item creation - handles both dispatch_item and row_data."""
+	"""Unified Item creation - handles both dispatch_item and row_data.
+	
+	Nothing is committed, so several Items can be created inside the caller's transaction.
+	"""
 	if source_type == "dispatch_item":
 		model_name = getattr(item_data, "model_name", None)
 		model_variant = getattr(item_data, "model_variant", None) or item_code
@@ -1299,18 +1556,11 @@ def _create_item_unified(item_data, item_code, source_type="dispatch_item", prin
 	if not item_group:
 		frappe.throw(_("Could not determine Item Group for Item '{0}'. Model Name: {1}").format(item_code, model_name or 'N/A'))
 	
-	rkg_settings = None
-	try:
-		rkg_settings = frappe.get_single("RKG Settings")
-	except frappe.DoesNotExistError:
-		pass
-	
 	stock_uom = str(unit).strip() if unit else "Pcs"
 	print_name_value = None
 	if print_name and str(print_name).strip():
 		print_name_value = str(print_name).strip()
 	
-	# Get HSN code before creating item_dict
 	hsn_code = None
 	if source_type == "dispatch_item":
 		if hasattr(item_data, "hsn_code") and item_data.hsn_code:
@@ -1318,77 +1568,19 @@ def _create_item_unified(item_data, item_code, source_type="dispatch_item", prin
 	elif source_type == "row_data":
 		hsn_code = item_data.get('hsn_code') or item_data.get('HSN Code') or item_data.get('HSN_CODE')
 	
-	item_dict = {
-		"doctype": "Item",
-		"item_code": item_code,
-		"item_name": str(model_variant).strip() if model_variant else item_code,
-		"item_group": item_group,
-		"stock_uom": stock_uom,
-		"is_stock_item": 1,
-		"has_serial_no": 1,
-	}
-	if print_name_value:
-		item_dict["print_name"] = print_name_value
-	
-	# Add HSN code to item_dict if field exists
-	if hsn_code:
-		# Check which HSN field exists in Item doctype
-		if frappe.db.has_column("Item", "gst_hsn_code"):
-			item_dict["gst_hsn_code"] = hsn_code
-		elif frappe.db.has_column("Item", "custom_gst_hsn_code"):
-			item_dict["custom_gst_hsn_code"] = hsn_code
-	
-	item_doc = frappe.get_doc(item_dict)
-	
-	if rkg_settings:
-		if rkg_settings.get("default_supplier") and source_type == "dispatch_item":
-			if hasattr(item_doc, "supplier_items"):
-				item_doc.append("supplier_items", {"supplier": rkg_settings.default_supplier, "is_default": 1})
-			elif hasattr(item_doc, "supplier"):
-				item_doc.supplier = rkg_settings.default_supplier
-	
-	# Also set HSN code on item_doc object as backup
-	if hsn_code:
-		if hasattr(item_doc, "gst_hsn_code"):
-			item_doc.gst_hsn_code = hsn_code
-		elif hasattr(item_doc, "custom_gst_hsn_code"):
-			item_doc.custom_gst_hsn_code = hsn_code
-	
-	if print_name_value and hasattr(item_doc, "print_name"):
-		item_doc.print_name = print_name_value
+	item_doc = _build_item_doc(
+		item_code,
+		str(model_variant).strip() if model_variant else item_code,
+		item_group,
+		stock_uom,
+		print_name=print_name_value,
+		hsn_code=hsn_code,
+		default_supplier=_get_default_supplier() if source_type == "dispatch_item" else None,
+	)
 	
 	try:
+		# print_name and HSN code are part of the insert, so one write is enough
 		item_doc.insert(ignore_permissions=True)
-		frappe.db.commit()
-		
-		# Save print_name using db.set_value to ensure it's persisted
-		if print_name_value and frappe.db.has_column("Item", "print_name"):
-			try:
-				frappe.db.set_value("Item", item_code, "print_name", print_name_value, update_modified=False)
-				frappe.db.commit()
-			except Exception as e:
-				frappe.log_error(f"Failed to set print_name for Item {item_code}: {str(e)}", "Item Print Name Update Failed")
-		
-		# Save HSN code using db.set_value to ensure it's persisted
-		if hsn_code:
-			hsn_field = None
-			if frappe.db.has_column("Item", "gst_hsn_code"):
-				hsn_field = "gst_hsn_code"
-			elif frappe.db.has_column("Item", "custom_gst_hsn_code"):
-				hsn_field = "custom_gst_hsn_code"
-			
-			if hsn_field:
-				try:
-					frappe.db.set_value("Item", item_code, hsn_field, hsn_code, update_modified=False)
-					frappe.db.commit()
-				except Exception as e:
-					frappe.log_error(f"Failed to set HSN code for Item {item_code}: {str(e)}", "Item HSN Code Update Failed")
-		frappe.clear_cache(doctype="Item")
-		if not frappe.db.exists("Item", item_code):
-			frappe.db.commit()
-			if not frappe.db.exists("Item", item_code):
-				frappe.log_error(f"Item {item_code} was inserted but not found", "Item Creation Verification Failed")
-				raise frappe.ValidationError(_("Item '{0}' was created but not found in database.").format(item_code))
 		return item_doc
 	except frappe.ValidationError:
 		raise
@@ -1396,51 +1588,48 @@ def _create_item_unified(item_data, item_code, source_type="dispatch_item", prin
 		frappe.log_error(f"Failed to insert Item {item_code}: {str(e)}", "Item Insert Failed")
 		raise frappe.ValidationError(_("Failed to create Item '{0}': {1}").format(item_code, str(e)))
 
-def _get_or_create_item_group_unified(model_name):
-	"""Unified Item Group creation - creates hierarchy: All Item Groups -> Two Wheelers Vehicle -> Model Name."""
-	all_groups = "All Item Groups"
-	if not frappe.db.exists("Item Group", all_groups):
+
+ALL_ITEM_GROUPS = "All Item Groups"
+TWO_WHEELER_ITEM_GROUP = "Two Wheelers Vehicle"
+
+# model name -> Item Group, per worker; cleared on any Item Group change
+_item_groups_by_model = WorkerCache("item_group_by_model")
+
+
+def clear_item_group_cache(doc=None, method=None):
+	"""Hooked to Item Group changes."""
+	_item_groups_by_model.invalidate()
+
+
+def _ensure_parent_item_groups():
+	"""Create the All Item Groups -> Two Wheelers Vehicle hierarchy if missing."""
+	existing = set(frappe.get_all("Item Group", filters={"name": ["in", [ALL_ITEM_GROUPS, TWO_WHEELER_ITEM_GROUP]]}, pluck="name"))
+	
+	if ALL_ITEM_GROUPS not in existing:
 		try:
 			frappe.get_doc({
 				"doctype": "Item Group",
-				"item_group_name": all_groups,
+				"item_group_name": ALL_ITEM_GROUPS,
 				"is_group": 1
 			}).insert(ignore_permissions=True)
-			frappe.db.commit()
 		except Exception as e:
 			frappe.log_error(f"Failed to create 'All Item Groups': {str(e)}", "Item Group Creation Failed")
 	
-	two_wheeler_vehicle = "Two Wheelers Vehicle"
-	if not frappe.db.exists("Item Group", two_wheeler_vehicle):
+	if TWO_WHEELER_ITEM_GROUP not in existing:
 		try:
 			frappe.get_doc({
 				"doctype": "Item Group",
-				"item_group_name": two_wheeler_vehicle,
+				"item_group_name": TWO_WHEELER_ITEM_GROUP,
 				"is_group": 1,
-				"parent_item_group": all_groups
+				"parent_item_group": ALL_ITEM_GROUPS
 			}).insert(ignore_permissions=True)
-			frappe.db.commit()
 		except Exception as e:
 			frappe.log_error(f"Failed to create 'Two Wheelers Vehicle': {str(e)}", "Item Group Creation Failed")
-	
-	if model_name and str(model_name).strip():
-		model_name = str(model_name).strip()
-		if frappe.db.exists("Item Group", model_name):
-			return model_name
-		try:
-			frappe.get_doc({
-				"doctype": "Item Group",
-				"item_group_name": model_name,
-				"is_group": 0,
-				"parent_item_group": two_wheeler_vehicle
-			}).insert(ignore_permissions=True)
-			frappe.db.commit()
-			return model_name
-		except Exception as e:
-			frappe.log_error(f"Failed to create Item Group '{model_name}': {str(e)}", "Item Group Creation Failed")
-	
-	if frappe.db.exists("Item Group", two_wheeler_vehicle):
-		return two_wheeler_vehicle
+
+
+def _get_fallback_item_group():
+	if frappe.db.exists("Item Group", TWO_WHEELER_ITEM_GROUP):
+		return TWO_WHEELER_ITEM_GROUP
 	
 	any_group = frappe.db.get_value("Item Group", {}, "name", order_by="name")
 	if any_group:
@@ -1449,90 +1638,163 @@ def _get_or_create_item_group_unified(model_name):
 	frappe.throw(_("Could not create or find an Item Group. Please create one manually."))
 
 
-@frappe.whitelist()
-def get_totals_from_purchase_documents(load_dispatch):
-	"""Get total_receipt_quantity and total_billed_quantity from Purchase Receipts/Invoices linked to Load Dispatch."""
-	if not load_dispatch:
-		return {"total_receipt_quantity": 0, "total_billed_quantity": 0}
+def resolve_item_groups(model_names):
+	"""Return {model_name: item_group} for the distinct model names, creating missing groups in one pass.
 	
-	total_received_qty = 0
-	total_billed_qty = 0
+	Resolved groups are kept in a worker-level cache. Groups created here are only cached once
+	the transaction commits, so a rollback cannot leave a stale entry behind.
+	"""
+	model_names = {str(model_name).strip() for model_name in model_names if model_name and str(model_name).strip()}
+	if not model_names:
+		return {}
 	
-	if frappe.db.has_column("Purchase Receipt", "custom_load_dispatch"):
-		pr_list = frappe.get_all(
-			"Purchase Receipt",
-			filters={
-				"docstatus": 1,
-				"custom_load_dispatch": load_dispatch
-			},
-			fields=["name", "total_qty"]
-		)
-		
-		for pr in pr_list:
-			try:
-				pr_qty = flt(pr.get("total_qty")) or 0
-				if pr_qty == 0:
-					try:
-						pr_doc = frappe.get_doc("Purchase Receipt", pr.name)
-						if hasattr(pr_doc, "items") and pr_doc.items:
-							pr_qty = sum(flt(item.get("qty") or item.get("stock_qty") or item.get("received_qty") or 0) for item in pr_doc.items)
-					except Exception:
-						pass
-				total_received_qty += pr_qty
-			except Exception:
-				continue
+	cache = _item_groups_by_model.get_values()
+	resolved = {model_name: cache[model_name] for model_name in model_names if model_name in cache}
+	pending = [model_name for model_name in model_names if model_name not in resolved]
 	
-	if frappe.db.has_column("Purchase Invoice", "custom_load_dispatch"):
-		pi_list = frappe.get_all(
-			"Purchase Invoice",
-			filters={
-				"docstatus": 1,
-				"custom_load_dispatch": load_dispatch
-			},
-			fields=["name", "total_qty"]
-		)
+	if pending:
+		_ensure_parent_item_groups()
+		existing = set(frappe.get_all("Item Group", filters={"name": ["in", pending]}, pluck="name"))
+		created = []
 		
-		for pi in pi_list:
-			try:
-				pi_qty = flt(pi.get("total_qty")) or 0
-				if pi_qty == 0:
-					try:
-						pi_doc = frappe.get_doc("Purchase Invoice", pi.name)
-						if hasattr(pi_doc, "items") and pi_doc.items:
-							pi_qty = sum(flt(item.get("qty") or item.get("stock_qty") or item.get("received_qty") or 0) for item in pi_doc.items)
-					except Exception:
-						pass
-				total_billed_qty += pi_qty
-			except Exception:
+		for model_name in pending:
+			if model_name in existing:
+				resolved[model_name] = cache[model_name] = model_name
 				continue
-		
-		for pi in pi_list:
 			try:
-				pi_doc = frappe.get_doc("Purchase Invoice", pi.name)
-				if hasattr(pi_doc, "items") and pi_doc.items:
-					linked_purchase_receipts = {item.purchase_receipt for item in pi_doc.items if hasattr(item, "purchase_receipt") and item.purchase_receipt}
-					if linked_purchase_receipts:
-						for pr_name in linked_purchase_receipts:
-							if frappe.db.has_column("Purchase Receipt", "custom_load_dispatch"):
-								pr_load_dispatch = frappe.db.get_value("Purchase Receipt", pr_name, "custom_load_dispatch")
-								if pr_load_dispatch == load_dispatch:
-									total_received_qty = total_billed_qty
-									break
-			except Exception:
-				continue
+				frappe.get_doc({
+					"doctype": "Item Group",
+					"item_group_name": model_name,
+					"is_group": 0,
+					"parent_item_group": TWO_WHEELER_ITEM_GROUP
+				}).insert(ignore_permissions=True)
+				resolved[model_name] = model_name
+				created.append(model_name)
+			except Exception as e:
+				frappe.log_error(f"Failed to create Item Group '{model_name}': {str(e)}", "Item Group Creation Failed")
+		
+		if created:
+			def cache_created_groups():
+				_item_groups_by_model.get_values().update({model_name: model_name for model_name in created})
+			
+			frappe.db.after_commit.add(cache_created_groups)
 	
-	return {
-		"total_receipt_quantity": total_received_qty,
-		"total_billed_quantity": total_billed_qty
-	}
+	for model_name in model_names:
+		if model_name not in resolved:
+			resolved[model_name] = _get_fallback_item_group()
+	
+	return resolved
+
+
+def _get_or_create_item_group_unified(model_name):
+	"""Unified Item Group creation - creates hierarchy: All Item Groups -> Two Wheelers Vehicle -> Model Name."""
+	if model_name and str(model_name).strip():
+		model_name = str(model_name).strip()
+		return resolve_item_groups([model_name])[model_name]
+	
+	_ensure_parent_item_groups()
+	return _get_fallback_item_group()
+
+
+# Quantity of one purchase document: its total_qty, or the sum of its item quantities when total_qty is 0
+_PURCHASE_DOCUMENT_QTY_SQL = """
+	SELECT p.custom_load_dispatch as load_dispatch, '{doctype}' as doctype, p.total_qty,
+		SUM(COALESCE(NULLIF(i.qty, 0), NULLIF(i.stock_qty, 0), i.received_qty, 0)) as item_qty,
+		{has_linked_receipt} as has_linked_receipt
+	FROM `tab{doctype}` p
+	LEFT JOIN `tab{doctype} Item` i ON i.parent = p.name AND i.parenttype = '{doctype}'
+	{join}
+	WHERE p.docstatus = 1 AND p.custom_load_dispatch IN %(load_dispatches)s
+	GROUP BY p.name
+"""
+
+
+def get_purchase_totals(load_dispatches):
+	"""Return received and billed quantities for one or many Load Dispatches with one grouped query.
+	
+	Received quantity is the sum over submitted Purchase Receipts, billed quantity the sum over
+	submitted Purchase Invoices. When an invoice of a Load Dispatch is made from one of its own
+	receipts, the received quantity follows the billed quantity.
+	
+	Returns:
+		{load_dispatch: {"total_receipt_quantity": qty, "total_billed_quantity": qty}}
+	"""
+	load_dispatches = [name for name in dict.fromkeys(load_dispatches or []) if name]
+	totals = {name: {"total_receipt_quantity": 0, "total_billed_quantity": 0} for name in load_dispatches}
+	if not load_dispatches:
+		return totals
+	
+	pr_has_link = has_column("Purchase Receipt", "custom_load_dispatch")
+	per_document = []
+	if pr_has_link:
+		per_document.append(_PURCHASE_DOCUMENT_QTY_SQL.format(doctype="Purchase Receipt", has_linked_receipt="0", join=""))
+	if has_column("Purchase Invoice", "custom_load_dispatch"):
+		per_document.append(_PURCHASE_DOCUMENT_QTY_SQL.format(
+			doctype="Purchase Invoice",
+			has_linked_receipt="MAX(IF(pr.custom_load_dispatch = p.custom_load_dispatch, 1, 0))" if pr_has_link else "0",
+			join="LEFT JOIN `tabPurchase Receipt` pr ON pr.name = i.purchase_receipt" if pr_has_link else "",
+		))
+	if not per_document:
+		return totals
+	
+	rows = frappe.db.sql(
+		f"""
+		SELECT load_dispatch, doctype,
+			SUM(IF(IFNULL(total_qty, 0) != 0, total_qty, IFNULL(item_qty, 0))) as qty,
+			MAX(has_linked_receipt) as has_linked_receipt
+		FROM ({" UNION ALL ".join(per_document)}) per_document
+		GROUP BY load_dispatch, doctype
+		""",
+		{"load_dispatches": load_dispatches},
+		as_dict=True,
+	)
+	
+	linked = set()
+	for row in rows:
+		fieldname = "total_receipt_quantity" if row.doctype == "Purchase Receipt" else "total_billed_quantity"
+		totals[row.load_dispatch][fieldname] = flt(row.qty)
+		if row.has_linked_receipt:
+			linked.add(row.load_dispatch)
+	
+	for name in linked:
+		totals[name]["total_receipt_quantity"] = totals[name]["total_billed_quantity"]
+	
+	return totals
+
+
+@frappe.whitelist()
+def get_totals_from_purchase_documents(load_dispatch):
+	"""Get total_receipt_quantity and total_billed_quantity from Purchase Receipts/Invoices linked to Load Dispatch."""
+	if not load_dispatch:
+		return {"total_receipt_quantity": 0, "total_billed_quantity": 0}
+	
+	return get_purchase_totals([load_dispatch])[load_dispatch]
+
+
+def get_item_projections(item_codes):
+	"""Return {item_code: {stock_uom, item_group}} for many Items in one query per chunk."""
+	item_codes = [item_code for item_code in dict.fromkeys(item_codes or []) if item_code]
+	projections = {}
+	for start in range(0, len(item_codes), BULK_CHUNK_SIZE):
+		for row in frappe.get_all(
+			"Item",
+			filters={"name": ["in", item_codes[start:start + BULK_CHUNK_SIZE]]},
+			fields=["name", "stock_uom", "item_group"],
+		):
+			projections[row.name] = row
+	return projections
 
 
 def _create_purchase_document_unified_from_load_dispatch(source_name, doctype, target_doc=None, warehouse=None, frame_warehouse_mapping=None):
-	"""Unified Purchase Receipt/Invoice creation from Load Dispatch"""
+	"""Unified Purchase Receipt/Invoice creation from Load Dispatch.
+	
+	The Load Dispatch is read once by get_mapped_doc; the Item stock_uom / item_group of
+	every row comes from one prefetch over the distinct item codes of that same read.
+	"""
 	from frappe.model.mapper import get_mapped_doc
 	import json
 	
-	if frappe.db.has_column(doctype, "custom_load_dispatch"):
+	if has_column(doctype, "custom_load_dispatch"):
 		existing = frappe.get_all(doctype, filters={"custom_load_dispatch": source_name}, fields=["name"], limit=1)
 		if existing:
 			frappe.throw(_("{0} {1} already exists for this Load Dispatch.").format(doctype, existing[0].name))
@@ -1560,7 +1822,7 @@ def _create_purchase_document_unified_from_load_dispatch(source_name, doctype, t
 			target.custom_load_reference_no = source.load_reference_no
 		if hasattr(target, "custom_load_dispatch"):
 			target.custom_load_dispatch = source_name
-		elif frappe.db.has_column(doctype, "custom_load_dispatch"):
+		elif has_column(doctype, "custom_load_dispatch"):
 			target.db_set("custom_load_dispatch", source_name)
 		
 		has_pr = any(getattr(item, "purchase_receipt", None) for item in (target.items or []))
@@ -1587,7 +1849,14 @@ def _create_purchase_document_unified_from_load_dispatch(source_name, doctype, t
 					if hasattr(item, "target_warehouse"):
 						item.target_warehouse = wh
 	
+	item_projections = None
+	
 	def update_item(source, target, source_parent):
+		nonlocal item_projections
+		if item_projections is None:
+			item_projections = get_item_projections(row.item_code for row in source_parent.items or [])
+		item = item_projections.get(source.item_code) or {}
+		
 		target.item_code, target.qty = source.item_code, 1
 		if hasattr(target, "use_serial_batch_fields"):
 			target.use_serial_batch_fields = 1
@@ -1610,8 +1879,7 @@ def _create_purchase_document_unified_from_load_dispatch(source_name, doctype, t
 			if hasattr(target, "__dict__"):
 				target.__dict__["serial_no"] = fn
 		
-		uom = (hasattr(source, "unit") and source.unit and str(source.unit).strip()) or \
-		      (target.item_code and frappe.db.get_value("Item", target.item_code, "stock_uom")) or "Pcs"
+		uom = (hasattr(source, "unit") and source.unit and str(source.unit).strip()) or item.get("stock_uom") or "Pcs"
 		if hasattr(target, "uom"):
 			target.uom = uom
 		if hasattr(target, "stock_uom"):
@@ -1619,10 +1887,8 @@ def _create_purchase_document_unified_from_load_dispatch(source_name, doctype, t
 		
 		if hasattr(source, "item_group") and source.item_group and hasattr(target, "item_group"):
 			target.item_group = source.item_group
-		elif target.item_code:
-			ig = frappe.db.get_value("Item", target.item_code, "item_group")
-			if ig and hasattr(target, "item_group"):
-				target.item_group = ig
+		elif item.get("item_group") and hasattr(target, "item_group"):
+			target.item_group = item["item_group"]
 		
 		if hasattr(source, "hsn_code") and source.hsn_code:
 			hsn_code = source.hsn_code
@@ -1645,30 +1911,23 @@ def _create_purchase_document_unified_from_load_dispatch(source_name, doctype, t
 		"Load Dispatch Item": {"doctype": item_doctype, "field_map": {"item_code": "item_code", "model_variant": "item_name", "frame_no": "serial_no", "item_group": "item_group"}, "postprocess": update_item}
 	}, target_doc, set_missing_values)
 	
-	if doctype == "Purchase Invoice" and doc and hasattr(doc, "items"):
-		source_doc = frappe.get_doc("Load Dispatch", source_name)
-		if source_doc and source_doc.items:
-			item_to_frame = {ldi.item_code: str(ldi.frame_no).strip() for ldi in source_doc.items if hasattr(ldi, "item_code") and ldi.item_code and hasattr(ldi, "frame_no") and ldi.frame_no}
-			for item in doc.items:
-				if hasattr(item, "item_code") and item.item_code in item_to_frame:
-					fn = item_to_frame[item.item_code]
-					if hasattr(item, "serial_no"):
-						item.serial_no = fn
-					if hasattr(item, "__dict__"):
-						item.__dict__["serial_no"] = fn
-	
 	if doc:
 		doc.save(ignore_permissions=True)
-		frappe.db.commit()
 		return {"name": doc.name}
 	return None
 
 
 @frappe.whitelist()
-def create_purchase_receipt_from_load_dispatch(source_name, target_doc=None, warehouse=None):
-	"""Create Purchase Receipt from Load Dispatch."""
-	load_dispatch = frappe.get_doc("Load Dispatch", source_name)
-	load_dispatch.reload()
+def create_purchase_receipt_from_load_dispatch(source_name, target_doc=None, warehouse=None, frame_warehouse_mapping=None):
+	"""Create Purchase Receipt from Load Dispatch.
+	
+	frame_warehouse_mapping ([{"frame_no", "warehouse"}]) puts individual frames in their own
+	warehouse; the others go to warehouse (or the Load Dispatch warehouse).
+	"""
+	# Header only; get_mapped_doc reads the full document once
+	load_dispatch = frappe.db.get_value("Load Dispatch", source_name, ["docstatus", "warehouse"], as_dict=True)
+	if not load_dispatch:
+		frappe.throw(_("Load Dispatch {0} not found").format(source_name), frappe.DoesNotExistError)
 	
 	if load_dispatch.docstatus != 1:
 		frappe.throw(_("Load Dispatch must be submitted before creating Purchase Receipt"))
@@ -1676,168 +1935,382 @@ def create_purchase_receipt_from_load_dispatch(source_name, target_doc=None, war
 	# Use warehouse from parameter if provided, otherwise use from document
 	selected_warehouse = warehouse or load_dispatch.warehouse
 	
-	if not selected_warehouse:
+	if not selected_warehouse and not frame_warehouse_mapping:
 		frappe.throw(_("Warehouse must be set in Load Dispatch before creating Purchase Receipt"))
 	
 	# Always save warehouse to Load Dispatch if provided (even if same value, ensures it's persisted)
 	if warehouse:
 		frappe.db.set_value("Load Dispatch", source_name, "warehouse", warehouse, update_modified=False)
-		frappe.db.commit()
-		load_dispatch.reload()
 	
-	return _create_purchase_document_unified_from_load_dispatch(source_name, "Purchase Receipt", target_doc, selected_warehouse)
+	if frame_warehouse_mapping and selected_warehouse:
+		frame_warehouse_mapping = _complete_frame_warehouse_mapping(source_name, frame_warehouse_mapping, selected_warehouse)
+	
+	return _create_purchase_document_unified_from_load_dispatch(
+		source_name, "Purchase Receipt", target_doc, selected_warehouse, frame_warehouse_mapping
+	)
+
+
+def _complete_frame_warehouse_mapping(load_dispatch, frame_warehouse_mapping, default_warehouse):
+	"""Return a mapping that covers every frame of the Load Dispatch: mapped frames keep their own
+	warehouse, the rest get default_warehouse."""
+	mapped = {}
+	for row in frappe.parse_json(frame_warehouse_mapping) or []:
+		row = frappe.parse_json(row) if isinstance(row, str) else row
+		if isinstance(row, dict) and cstr(row.get("frame_no")).strip() and cstr(row.get("warehouse")).strip():
+			mapped[cstr(row["frame_no"]).strip()] = cstr(row["warehouse"]).strip()
+	
+	projection = get_load_dispatch_projection(load_dispatch)
+	frames = list(projection.frames) if projection else []
+	return [
+		{"frame_no": frame_no, "warehouse": mapped.get(frame_no) or default_warehouse}
+		for frame_no in dict.fromkeys(frames + list(mapped))
+	]
+
+
+BULK_RECEIPT_CACHE_KEY = "rkg:load_dispatch_bulk_receipt:{0}"
+BULK_RECEIPT_EXPIRY = 6 * 60 * 60
+BULK_RECEIPT_PROGRESS_EVENT = "load_dispatch_bulk_receipt_progress"
+
+
+def _get_bulk_receipt_results(batch_id):
+	"""{load_dispatch: {"status", "purchase_receipt", "error"}} recorded so far for a batch."""
+	results = frappe.cache().hgetall(BULK_RECEIPT_CACHE_KEY.format(batch_id) + ":results") or {}
+	return {
+		(name.decode() if isinstance(name, bytes) else name): result
+		for name, result in results.items()
+	}
+
+
+@frappe.whitelist()
+def enqueue_bulk_purchase_receipts(load_dispatches, warehouse=None, frame_warehouse_mapping=None):
+	"""Create Purchase Receipts for many submitted Load Dispatches in parallel background jobs.
+	
+	Every dispatch is its own job and transaction, so one failure does not hold back the others.
+	Returns the batch_id to follow progress with (get_bulk_purchase_receipt_status).
+	"""
+	frappe.has_permission("Purchase Receipt", "create", throw=True)
+	
+	load_dispatches = [name for name in dict.fromkeys(frappe.parse_json(load_dispatches) or []) if name]
+	if not load_dispatches:
+		frappe.throw(_("Select at least one Load Dispatch"))
+	
+	frame_warehouse_mapping = frappe.parse_json(frame_warehouse_mapping) if frame_warehouse_mapping else None
+	
+	batch_id = frappe.generate_hash(length=12)
+	user = frappe.session.user
+	frappe.cache().set_value(
+		BULK_RECEIPT_CACHE_KEY.format(batch_id),
+		{"user": user, "load_dispatches": load_dispatches},
+		expires_in_sec=BULK_RECEIPT_EXPIRY
+	)
+	
+	for load_dispatch in load_dispatches:
+		frappe.enqueue(
+			"rkg.rkg.doctype.load_dispatch.load_dispatch.run_bulk_purchase_receipt",
+			queue="long",
+			timeout=1800,
+			job_name=f"load_dispatch_bulk_receipt_{batch_id}_{load_dispatch}",
+			batch_id=batch_id,
+			load_dispatch=load_dispatch,
+			warehouse=warehouse,
+			frame_warehouse_mapping=frame_warehouse_mapping,
+			user=user,
+		)
+	
+	return {"batch_id": batch_id, "total": len(load_dispatches)}
 
 
-def update_load_dispatch_totals_from_document(doc, method=None):
-	"""Update Load Dispatch totals (total_receipt_quantity and total_billed_quantity) when Purchase Receipt/Invoice is submitted or cancelled."""
+def run_bulk_purchase_receipt(batch_id, load_dispatch, warehouse=None, frame_warehouse_mapping=None, user=None):
+	"""Background job for enqueue_bulk_purchase_receipts: one Load Dispatch, one transaction."""
 	try:
-		load_dispatch_name = (doc.custom_load_dispatch if hasattr(doc, "custom_load_dispatch") and doc.custom_load_dispatch
-			else (frappe.db.get_value(doc.doctype, doc.name, "custom_load_dispatch") if frappe.db.has_column(doc.doctype, "custom_load_dispatch") else None))
+		result = create_purchase_receipt_from_load_dispatch(
+			load_dispatch, warehouse=warehouse, frame_warehouse_mapping=frame_warehouse_mapping
+		)
+		frappe.db.commit()
+		outcome = {"status": "created", "purchase_receipt": (result or {}).get("name")}
+	except Exception as e:
+		frappe.db.rollback()
+		frappe.log_error(
+			f"Error creating Purchase Receipt from Load Dispatch {load_dispatch}: {str(e)}\nTraceback: {frappe.get_traceback()}",
+			"Bulk Purchase Receipt Error"
+		)
+		outcome = {"status": "failed", "error": frappe.utils.strip_html(cstr(e))}
+	
+	results_key = BULK_RECEIPT_CACHE_KEY.format(batch_id) + ":results"
+	cache = frappe.cache()
+	cache.hset(results_key, load_dispatch, outcome)
+	cache.expire(cache.make_key(results_key), BULK_RECEIPT_EXPIRY)
+	
+	frappe.publish_realtime(
+		BULK_RECEIPT_PROGRESS_EVENT,
+		{"batch_id": batch_id, "load_dispatch": load_dispatch, "done": len(_get_bulk_receipt_results(batch_id))},
+		user=user
+	)
 
-		if not load_dispatch_name:
-			return
 
-		if not frappe.db.exists("Load Dispatch", load_dispatch_name):
-			return
+@frappe.whitelist()
+def get_bulk_purchase_receipt_status(batch_id):
+	"""Return the summary of a bulk Purchase Receipt batch: total, done, created/failed lists and status."""
+	state = frappe.cache().get_value(BULK_RECEIPT_CACHE_KEY.format(batch_id))
+	if not state:
+		return {"status": "not_found"}
+	
+	if state.get("user") != frappe.session.user:
+		frappe.throw(_("Not permitted"), frappe.PermissionError)
+	
+	results = _get_bulk_receipt_results(batch_id)
+	created, failed = [], []
+	for load_dispatch in state["load_dispatches"]:
+		result = results.get(load_dispatch)
+		if not result:
+			continue
+		if result["status"] == "created":
+			created.append({"load_dispatch": load_dispatch, "purchase_receipt": result.get("purchase_receipt")})
+		else:
+			failed.append({"load_dispatch": load_dispatch, "error": result.get("error")})
+	
+	total = len(state["load_dispatches"])
+	return {
+		"status": "finished" if len(results) >= total else "running",
+		"total": total,
+		"done": len(results),
+		"created": created,
+		"failed": failed,
+	}
 
-		total_received_qty = 0
-		total_billed_qty = 0
 
-		if doc.doctype == "Purchase Receipt":
-			if not frappe.db.has_column("Purchase Receipt", "custom_load_dispatch"):
-				return
-			
-			pr_list = frappe.get_all(
-				"Purchase Receipt",
-				filters={
-					"docstatus": 1,
-					"custom_load_dispatch": load_dispatch_name
-				},
-				fields=["name", "total_qty"]
-			)
-			
-			for pr in pr_list:
-				try:
-					pr_qty = flt(pr.get("total_qty")) or 0
-					if pr_qty == 0:
-						try:
-							pr_doc = frappe.get_doc("Purchase Receipt", pr.name)
-							if hasattr(pr_doc, "items") and pr_doc.items:
-								pr_qty = sum(flt(item.get("qty") or item.get("stock_qty") or item.get("received_qty") or 0) for item in pr_doc.items)
-						except Exception:
-							pass
-					total_received_qty += pr_qty
-				except Exception as e:
-					frappe.log_error(
-						f"Error processing Purchase Receipt {pr.get('name', 'Unknown')}: {str(e)}",
-						"Load Dispatch Totals Update Error"
-					)
-					continue
+PURCHASE_DOCUMENT_CONTEXT_FIELDS = [
+	"name",
+	"load_reference_no",
+	"warehouse",
+	"status",
+	"total_dispatch_quantity",
+	"total_receipt_quantity",
+	"total_billed_quantity",
+]
+
+
+def get_purchase_document_load_dispatch(doc):
+	"""Return the Load Dispatch a Purchase Receipt/Invoice was made from (custom_load_dispatch)."""
+	if doc.get("custom_load_dispatch"):
+		return doc.custom_load_dispatch
+	if has_column(doc.doctype, "custom_load_dispatch"):
+		return frappe.db.get_value(doc.doctype, doc.name, "custom_load_dispatch")
+	return None
 
-		elif doc.doctype == "Purchase Invoice":
-			if not frappe.db.has_column("Purchase Invoice", "custom_load_dispatch"):
-				return
-			
-			pr_list = frappe.get_all(
-				"Purchase Receipt",
-				filters={
-					"docstatus": 1,
-					"custom_load_dispatch": load_dispatch_name
-				},
-				fields=["name", "total_qty"]
-			)
-			
-			for pr in pr_list:
-				try:
-					pr_qty = flt(pr.get("total_qty")) or 0
-					if pr_qty == 0:
-						try:
-							pr_doc = frappe.get_doc("Purchase Receipt", pr.name)
-							if hasattr(pr_doc, "items") and pr_doc.items:
-								pr_qty = sum(flt(item.get("qty") or item.get("stock_qty") or item.get("received_qty") or 0) for item in pr_doc.items)
-						except Exception:
-							pass
-					total_received_qty += pr_qty
-				except Exception as e:
-					frappe.log_error(
-						f"Error processing Purchase Receipt {pr.get('name', 'Unknown')}: {str(e)}",
-						"Load Dispatch Totals Update Error"
-					)
-					continue
-			
-			linked_purchase_receipts = set()
-			try:
-				if doc.items:
-					linked_purchase_receipts = {item.purchase_receipt for item in doc.items if hasattr(item, "purchase_receipt") and item.purchase_receipt}
-			except Exception as e:
-				frappe.log_error(
-					f"Error getting linked purchase receipts: {str(e)}",
-					"Load Dispatch Totals Update Error"
-				)
-			has_purchase_receipt_link = bool(linked_purchase_receipts)
-			
-			pi_list = frappe.get_all(
-				"Purchase Invoice",
-				filters={
-					"docstatus": 1,
-					"custom_load_dispatch": load_dispatch_name
-				},
-				fields=["name", "total_qty"]
-			)
-			
-			for pi in pi_list:
-				try:
-					pi_qty = flt(pi.get("total_qty")) or 0
-					if pi_qty == 0:
-						try:
-							pi_doc = frappe.get_doc("Purchase Invoice", pi.name)
-							if hasattr(pi_doc, "items") and pi_doc.items:
-								pi_qty = sum(flt(item.get("qty") or item.get("stock_qty") or item.get("received_qty") or 0) for item in pi_doc.items)
-						except Exception:
-							pass
-					total_billed_qty += pi_qty
-				except Exception as e:
-					frappe.log_error(
-						f"Error processing Purchase Invoice {pi.get('name', 'Unknown')}: {str(e)}",
-						"Load Dispatch Totals Update Error"
-					)
-					continue
-			
-			if has_purchase_receipt_link and linked_purchase_receipts:
-				pr_from_ld = []
-				for pr_name in linked_purchase_receipts:
-					pr_load_dispatch = None
-					if frappe.db.has_column("Purchase Receipt", "custom_load_dispatch"):
-						pr_load_dispatch = frappe.db.get_value("Purchase Receipt", pr_name, "custom_load_dispatch")
-					
-					if pr_load_dispatch == load_dispatch_name:
-						pr_from_ld.append(pr_name)
-				
-				if pr_from_ld:
-					total_received_qty = total_billed_qty
 
+def _get_purchase_document_warehouse(doc):
+	"""First non-empty item warehouse of a Purchase Receipt."""
+	for item in doc.get("items") or []:
+		if item.get("warehouse"):
+			return item.warehouse
+	return None
+
+
+def get_purchase_document_context(doc):
+	"""Resolve once what the Purchase Receipt/Invoice hooks need: the linked Load Dispatch and its Load Plan."""
+	from rkg.rkg.doctype.load_plan.load_plan import get_load_plan_from_document
+	
+	context = frappe._dict(doc=doc, load_dispatch=None, load_plan=None)
+	
+	load_dispatch_name = get_purchase_document_load_dispatch(doc)
+	if load_dispatch_name:
+		context.load_dispatch = frappe.db.get_value(
+			"Load Dispatch", load_dispatch_name, PURCHASE_DOCUMENT_CONTEXT_FIELDS, as_dict=True
+		)
+	
+	if context.load_dispatch:
+		context.load_plan = context.load_dispatch.load_reference_no
+	
+	context.load_plan = context.load_plan or get_load_plan_from_document(doc)
+	return context
+
+
+def _get_load_dispatch_status(total_dispatch_quantity, total_receipt_quantity):
+	"""Received once every dispatched frame is received, In-Transit otherwise."""
+	total_dispatch = flt(total_dispatch_quantity)
+	if total_dispatch > 0 and flt(total_receipt_quantity) >= total_dispatch:
+		return "Received"
+	return "In-Transit"
+
+
+def refresh_load_dispatch_rollups(load_dispatch_names):
+	"""Recompute total_receipt_quantity, total_billed_quantity and status of submitted Load Dispatches.
+	
+	Totals come from one grouped query for all names and only changed values are written,
+	one UPDATE ... CASE per field. Does not commit.
+	"""
+	load_dispatches = frappe.get_all(
+		"Load Dispatch",
+		filters={"name": ["in", list(load_dispatch_names)], "docstatus": 1},
+		fields=PURCHASE_DOCUMENT_CONTEXT_FIELDS,
+	)
+	totals = get_purchase_totals([load_dispatch.name for load_dispatch in load_dispatches])
+	
+	changes = {}
+	for load_dispatch in load_dispatches:
+		values = dict(totals[load_dispatch.name])
+		values["status"] = _get_load_dispatch_status(load_dispatch.total_dispatch_quantity, values["total_receipt_quantity"])
+		for fieldname, value in values.items():
+			current = load_dispatch.get(fieldname)
+			if (current != value) if fieldname == "status" else (flt(current) != flt(value)):
+				changes.setdefault(fieldname, {})[load_dispatch.name] = value
+	
+	for fieldname, values_by_name in changes.items():
+		bulk_set_values("Load Dispatch", fieldname, values_by_name)
+
+
+def _get_purchase_document_qty(doc):
+	"""Quantity a Purchase Receipt/Invoice counts for: total_qty, or the sum of item quantities when it is 0."""
+	return flt(doc.get("total_qty")) or sum(
+		flt(item.get("qty") or item.get("stock_qty") or item.get("received_qty") or 0) for item in doc.get("items") or []
+	)
+
+
+def _has_linked_invoice(load_dispatch):
+	"""True if a submitted Purchase Invoice of the Load Dispatch is made from one of its own Purchase Receipts."""
+	if not (has_column("Purchase Receipt", "custom_load_dispatch") and has_column("Purchase Invoice", "custom_load_dispatch")):
+		return False
+	
+	return bool(frappe.db.sql(
+		"""
+		SELECT 1
+		FROM `tabPurchase Invoice` p
+		INNER JOIN `tabPurchase Invoice Item` i ON i.parent = p.name AND i.parenttype = 'Purchase Invoice'
+		INNER JOIN `tabPurchase Receipt` pr ON pr.name = i.purchase_receipt
+		WHERE p.docstatus = 1 AND p.custom_load_dispatch = %(load_dispatch)s
+			AND pr.custom_load_dispatch = %(load_dispatch)s
+		LIMIT 1
+		""",
+		{"load_dispatch": load_dispatch},
+	))
+
+
+def _links_own_receipt(doc, load_dispatch):
+	"""True if a Purchase Invoice is made from one of the Load Dispatch's own Purchase Receipts."""
+	linked_receipts = list({item.purchase_receipt for item in doc.get("items") or [] if item.get("purchase_receipt")})
+	return bool(linked_receipts and has_column("Purchase Receipt", "custom_load_dispatch") and frappe.db.exists(
+		"Purchase Receipt", {"name": ["in", linked_receipts], "custom_load_dispatch": load_dispatch}
+	))
+
+
+def apply_purchase_document_delta(context):
+	"""Add (submit) or subtract (cancel) a Purchase Receipt/Invoice quantity to its Load Dispatch counters.
+	
+	One atomic UPDATE, independent of how many receipts the dispatch already has. The counters
+	follow the same rule as get_purchase_totals: while an invoice of the dispatch is made from one
+	of its own receipts, total_receipt_quantity equals total_billed_quantity. reconcile_dispatch_counters
+	repairs drift.
+	"""
+	doc = context.doc
+	qty = _get_purchase_document_qty(doc)
+	if not qty:
+		return
+	load_dispatch = context.load_dispatch.name
+	values = {"delta": qty if doc.docstatus == 1 else -qty, "load_dispatch": load_dispatch}
+	
+	receipt_sql = "IFNULL(total_receipt_quantity, 0)"
+	billed_sql = "IFNULL(total_billed_quantity, 0)"
+	if doc.doctype == "Purchase Invoice":
+		billed_sql += " + %(delta)s"
+	
+	if _has_linked_invoice(load_dispatch):
+		receipt_sql = billed_sql
+	elif doc.doctype == "Purchase Receipt":
+		receipt_sql += " + %(delta)s"
+	elif doc.docstatus == 2 and _links_own_receipt(doc, load_dispatch):
+		# The last invoice made from the dispatch's own receipts is cancelled: back to the receipt sum
+		values["receipt"] = get_purchase_totals([load_dispatch])[load_dispatch]["total_receipt_quantity"]
+		receipt_sql = "%(receipt)s"
+	
+	# status comes first and no expression reads a column assigned before it,
+	# so the result does not depend on the order SET assignments are evaluated in
+	frappe.db.sql(
+		f"""
+		UPDATE `tabLoad Dispatch`
+		SET status = IF(IFNULL(total_dispatch_quantity, 0) > 0 AND ({receipt_sql}) >= total_dispatch_quantity, 'Received', 'In-Transit'),
+			total_receipt_quantity = {receipt_sql},
+			total_billed_quantity = {billed_sql}
+		WHERE name = %(load_dispatch)s
+		""",
+		values,
+	)
+	frappe.clear_document_cache("Load Dispatch", load_dispatch)
+
+
+def on_purchase_document_event(doc, method=None):
+	"""Single on_submit / on_cancel hook of Purchase Receipt and Purchase Invoice.
+	
+	Builds the shared context once, syncs the Load Dispatch warehouse and applies the
+	receipt/billing counter delta in the same transaction. Load Plan status is requested
+	from the rollup queue (rkg.utils.rollups), which coalesces bulk submits into one recompute.
+	"""
+	from rkg.rkg.doctype.load_plan.load_plan import affects_load_plan_status
+	
+	context = get_purchase_document_context(doc)
+	
+	if context.load_dispatch:
+		if doc.doctype == "Purchase Receipt" and doc.docstatus == 1:
+			warehouse = _get_purchase_document_warehouse(doc)
+			if warehouse and context.load_dispatch.warehouse != warehouse:
+				buffer_set_value("Load Dispatch", context.load_dispatch.name, {"warehouse": warehouse})
+		
 		try:
-			frappe.db.set_value(
-				"Load Dispatch",
-				load_dispatch_name,
-				{
-					"total_receipt_quantity": total_received_qty,
-					"total_billed_quantity": total_billed_qty
-				},
-				update_modified=False
-			)
+			apply_purchase_document_delta(context)
 		except Exception as e:
 			frappe.log_error(
-				f"Error updating Load Dispatch {load_dispatch_name}: {str(e)}",
+				f"Error updating Load Dispatch {context.load_dispatch.name} from {doc.doctype} {doc.name}: {str(e)}\nTraceback: {frappe.get_traceback()}",
 				"Load Dispatch Totals Update Error"
 			)
+			request_rollups("Load Dispatch", [context.load_dispatch.name])
+	
+	if affects_load_plan_status(doc):
+		if context.load_plan:
+			request_rollups("Load Plan", [context.load_plan])
+		else:
+			frappe.logger().warning(f"Load Plan status update skipped: No Load Plan link found for {doc.doctype} {doc.name}")
 
-		frappe.db.commit()
-	except Exception as e:
-		frappe.log_error(
-			f"Error updating Load Dispatch totals from {doc.doctype} {doc.name}: {str(e)}\nTraceback: {frappe.get_traceback()}",
-			"Load Dispatch Totals Update Error"
-		)
+
+@frappe.whitelist()
+def reconcile_dispatch_counters(load_dispatch_names=None):
+	"""Rebuild the delta-maintained counters from scratch to repair drift.
+	
+	Recomputes total_receipt_quantity / total_billed_quantity / status of submitted Load Dispatches
+	and load_dispatch_quantity of their Load Plans. Runs daily for everything, or on demand for
+	the given Load Dispatches.
+	"""
+	frappe.only_for("System Manager")
+	
+	if load_dispatch_names:
+		filters = {"name": ["in", frappe.parse_json(load_dispatch_names)]}
+	else:
+		filters = {"docstatus": 1}
+	load_dispatches = frappe.get_all("Load Dispatch", filters=filters, fields=["name", "load_reference_no"])
+	
+	names = [load_dispatch.name for load_dispatch in load_dispatches]
+	for start in range(0, len(names), BULK_CHUNK_SIZE):
+		refresh_load_dispatch_rollups(names[start:start + BULK_CHUNK_SIZE])
+	
+	load_plans = list({load_dispatch.load_reference_no for load_dispatch in load_dispatches if load_dispatch.load_reference_no})
+	if load_plans:
+		dispatched = dict(frappe.db.sql(
+			"""
+			SELECT load_reference_no, SUM(IFNULL(total_dispatch_quantity, 0))
+			FROM `tabLoad Dispatch`
+			WHERE docstatus = 1 AND load_reference_no IN %(load_plans)s
+			GROUP BY load_reference_no
+			""",
+			{"load_plans": load_plans},
+		))
+		current = dict(frappe.get_all(
+			"Load Plan", filters={"name": ["in", load_plans]}, fields=["name", "load_dispatch_quantity"], as_list=True
+		))
+		bulk_set_values("Load Plan", "load_dispatch_quantity", {
+			name: flt(dispatched.get(name))
+			for name in current
+			if flt(current[name]) != flt(dispatched.get(name))
+		})
+		request_rollups("Load Plan", load_plans)
 
 
 @frappe.whitelist()
@@ -1882,17 +2355,16 @@ def update_frames_status_counts_in_load_dispatch(load_dispatch_name, damage_asse
 	
 	counts = get_frames_status_counts(damage_assessment_name)
 	if isinstance(counts, dict):
-		frappe.db.set_value("Load Dispatch", load_dispatch_name, {
+		buffer_set_value("Load Dispatch", load_dispatch_name, {
 			"frames_ok": counts.get("frames_ok", 0),
 			"frames_not_ok": counts.get("frames_not_ok", 0)
-		}, update_modified=False)
-		frappe.db.commit()
+		})
 
 
 def set_purchase_receipt_serial_batch_fields_readonly(doc, method=None):
 	"""Set "Use Serial No / Batch Fields" to checked on child table items for Purchase Receipts created from Load Dispatch."""
 	load_dispatch_name = (doc.custom_load_dispatch if hasattr(doc, "custom_load_dispatch") and doc.custom_load_dispatch
-		else (frappe.db.get_value("Purchase Receipt", doc.name, "custom_load_dispatch") if frappe.db.has_column("Purchase Receipt", "custom_load_dispatch") else None))
+		else (frappe.db.get_value("Purchase Receipt", doc.name, "custom_load_dispatch") if has_column("Purchase Receipt", "custom_load_dispatch") else None))
 	
 	if load_dispatch_name and doc.items:
 		for item in doc.items:
@@ -1901,6 +2373,60 @@ def set_purchase_receipt_serial_batch_fields_readonly(doc, method=None):
 					item.use_serial_batch_fields = 1
 
 
+LOAD_DISPATCH_PROJECTION_KEY = "rkg:load_dispatch_projection:v2"
+LOAD_DISPATCH_PROJECTION_TTL = 24 * 60 * 60
+
+
+def get_load_dispatch_projection(load_dispatch_name):
+	"""Compact view of a submitted Load Dispatch for the Purchase Receipt/Invoice hooks, cached in Redis.
+	
+	Returns:
+		frappe._dict with units ({item_code: unit}) and frames ({frame_no: {"item_code", "item_group"}},
+		in row order), or None if the Load Dispatch does not exist.
+	
+	Only submitted dispatches are cached; the entry is dropped when the dispatch is cancelled
+	(and so before it is amended) or updated after submit. Warehouses are left out: the dispatch
+	warehouse is set when a Purchase Receipt is made and a frame's warehouse lives on its Serial No,
+	so both change after submit and are read live by the warehouse sync hooks.
+	"""
+	if not load_dispatch_name:
+		return None
+	
+	cache = frappe.cache()
+	cache_key = f"{LOAD_DISPATCH_PROJECTION_KEY}:{load_dispatch_name}"
+	projection = cache.get_value(cache_key)
+	if projection is not None:
+		return frappe._dict(projection)
+	
+	docstatus = frappe.db.get_value("Load Dispatch", load_dispatch_name, "docstatus")
+	if docstatus is None:
+		return None
+	
+	projection = {"units": {}, "frames": {}}
+	for item_code, unit, frame_no, item_group in frappe.db.sql(
+		"""
+		SELECT item_code, unit, frame_no, item_group
+		FROM `tabLoad Dispatch Item`
+		WHERE parent = %s AND parenttype = 'Load Dispatch'
+		ORDER BY idx
+		""",
+		(load_dispatch_name,),
+	):
+		if item_code and unit:
+			projection["units"][item_code] = cstr(unit).strip()
+		if frame_no and cstr(frame_no).strip():
+			projection["frames"][cstr(frame_no).strip()] = {"item_code": item_code, "item_group": item_group}
+	
+	if docstatus == 1:
+		cache.set_value(cache_key, projection, expires_in_sec=LOAD_DISPATCH_PROJECTION_TTL)
+	return frappe._dict(projection)
+
+
+def clear_load_dispatch_projection(load_dispatch_name):
+	"""Drop the cached projection of a Load Dispatch."""
+	frappe.cache().delete_value(f"{LOAD_DISPATCH_PROJECTION_KEY}:{load_dispatch_name}")
+
+
 @frappe.whitelist()
 def preserve_purchase_receipt_uom(doc, method=None):
 	"""Preserve UOM from Load Dispatch Item's unit field when Purchase Receipt is validated."""
@@ -1916,59 +2442,34 @@ def preserve_uom_from_load_dispatch(doc, doctype_name):
 	if not doc.items:
 		return
 	
-	load_dispatch_name = (doc.custom_load_dispatch if hasattr(doc, "custom_load_dispatch") and doc.custom_load_dispatch
-		else (frappe.db.get_value(doctype_name, doc.name, "custom_load_dispatch") if frappe.db.has_column(doctype_name, "custom_load_dispatch") else None))
-	
-	if not load_dispatch_name:
-		return
-	
-	try:
-		load_dispatch = frappe.get_doc("Load Dispatch", load_dispatch_name)
-	except frappe.DoesNotExistError:
+	projection = get_load_dispatch_projection(get_purchase_document_load_dispatch(doc))
+	if not projection or not projection.units:
 		return
 	
-	item_uom_map = {}
-	if load_dispatch.items:
-		for ld_item in load_dispatch.items:
-			if ld_item.item_code and hasattr(ld_item, "unit") and ld_item.unit:
-				item_uom_map[ld_item.item_code] = str(ld_item.unit).strip()
-	
-	if item_uom_map:
-		for doc_item in doc.items:
-			if doc_item.item_code and doc_item.item_code in item_uom_map:
-				uom_value = item_uom_map[doc_item.item_code]
-				if hasattr(doc_item, "uom") and doc_item.uom != uom_value:
-					doc_item.uom = uom_value
-				if hasattr(doc_item, "stock_uom") and doc_item.stock_uom != uom_value:
-					doc_item.stock_uom = uom_value
+	item_uom_map = projection.units
+	for doc_item in doc.items:
+		if doc_item.item_code and doc_item.item_code in item_uom_map:
+			uom_value = item_uom_map[doc_item.item_code]
+			if hasattr(doc_item, "uom") and doc_item.uom != uom_value:
+				doc_item.uom = uom_value
+			if hasattr(doc_item, "stock_uom") and doc_item.stock_uom != uom_value:
+				doc_item.stock_uom = uom_value
 
 
 def sync_warehouse_from_purchase_receipt_to_load_dispatch(doc, method=None):
 	"""Sync warehouse from Purchase Receipt back to Load Dispatch when PR is created."""
 	try:
-		load_dispatch_name = (doc.custom_load_dispatch if hasattr(doc, "custom_load_dispatch") and doc.custom_load_dispatch
-			else (frappe.db.get_value("Purchase Receipt", doc.name, "custom_load_dispatch") if frappe.db.has_column("Purchase Receipt", "custom_load_dispatch") else None))
-		
+		load_dispatch_name = get_purchase_document_load_dispatch(doc)
 		if not load_dispatch_name:
 			return
 		
-		if not frappe.db.exists("Load Dispatch", load_dispatch_name):
+		warehouse = _get_purchase_document_warehouse(doc)
+		if not warehouse:
 			return
 		
-		# Get warehouse from Purchase Receipt items (use the first non-empty warehouse)
-		warehouse = None
-		if doc.items:
-			for item in doc.items:
-				if hasattr(item, "warehouse") and item.warehouse:
-					warehouse = item.warehouse
-					break
-		
-		# If warehouse found and Load Dispatch doesn't have it, set it
-		if warehouse:
-			current_warehouse = frappe.db.get_value("Load Dispatch", load_dispatch_name, "warehouse")
-			if not current_warehouse or current_warehouse != warehouse:
-				frappe.db.set_value("Load Dispatch", load_dispatch_name, "warehouse", warehouse, update_modified=False)
-				frappe.db.commit()
+		load_dispatch = frappe.db.get_value("Load Dispatch", load_dispatch_name, ["name", "warehouse"], as_dict=True)
+		if load_dispatch and load_dispatch.warehouse != warehouse:
+			buffer_set_value("Load Dispatch", load_dispatch_name, {"warehouse": warehouse})
 	except Exception as e:
 		frappe.log_error(
 			f"Error syncing warehouse from Purchase Receipt {doc.name} to Load Dispatch: {str(e)}\nTraceback: {frappe.get_traceback()}",
@@ -1986,7 +2487,7 @@ def sync_warehouse_from_existing_purchase_receipt(load_dispatch_name):
 		return {"warehouse": None}
 	
 	# Check if Purchase Receipt exists for this Load Dispatch
-	if not frappe.db.has_column("Purchase Receipt", "custom_load_dispatch"):
+	if not has_column("Purchase Receipt", "custom_load_dispatch"):
 		return {"warehouse": None}
 	
 	pr_list = frappe.get_all(
@@ -2011,8 +2512,7 @@ def sync_warehouse_from_existing_purchase_receipt(load_dispatch_name):
 					# Save warehouse to Load Dispatch if it's empty
 					current_warehouse = frappe.db.get_value("Load Dispatch", load_dispatch_name, "warehouse")
 					if not current_warehouse:
-						frappe.db.set_value("Load Dispatch", load_dispatch_name, "warehouse", warehouse, update_modified=False)
-						frappe.db.commit()
+						buffer_set_value("Load Dispatch", load_dispatch_name, {"warehouse": warehouse})
 					return {"warehouse": warehouse}
 	except Exception as e:
 		frappe.log_error(
@@ -2023,51 +2523,85 @@ def sync_warehouse_from_existing_purchase_receipt(load_dispatch_name):
 	return {"warehouse": None}
 
 
+def get_receipt_serial_no_index(purchase_receipts):
+	"""Read (parent, item_code, idx, serial_no) of the given Purchase Receipts in one query.
+	
+	Returns:
+		{(purchase_receipt, item_code): {idx: serial_no}}, rows in idx order
+	"""
+	index = {}
+	for parent, item_code, idx, serial_no in frappe.get_all(
+		"Purchase Receipt Item",
+		filters={
+			"parent": ["in", list(purchase_receipts)],
+			"parenttype": "Purchase Receipt",
+			"item_code": ["is", "set"],
+			"serial_no": ["is", "set"],
+		},
+		fields=["parent", "item_code", "idx", "serial_no"],
+		order_by="parent, idx",
+		as_list=True,
+	):
+		index.setdefault((parent, item_code), {})[idx] = serial_no
+	return index
+
+
 def preserve_purchase_invoice_serial_no_from_receipt(doc, method=None):
 	"""Preserve serial_no from Purchase Receipt Item when creating Purchase Invoice from Purchase Receipt."""
 	if not doc.items:
 		return
 	
-	purchase_receipts = {item.purchase_receipt for item in doc.items if hasattr(item, "purchase_receipt") and item.purchase_receipt}
+	purchase_receipts = {item.purchase_receipt for item in doc.items if item.get("purchase_receipt")}
+	
+	if purchase_receipts:
+		receipt_serial_nos = get_receipt_serial_no_index(purchase_receipts)
+		
+		for pi_item in doc.items:
+			if not (pi_item.item_code and pi_item.get("purchase_receipt")):
+				continue
+			
+			serial_nos_by_idx = receipt_serial_nos.get((pi_item.purchase_receipt, pi_item.item_code))
+			if not serial_nos_by_idx:
+				continue
+			
+			# Same row of the receipt, else its first row of this item
+			serial_no_value = serial_nos_by_idx.get(pi_item.idx) or next(iter(serial_nos_by_idx.values()))
+			
+			if hasattr(pi_item, "use_serial_batch_fields") and not pi_item.use_serial_batch_fields:
+				pi_item.use_serial_batch_fields = 1
+			if hasattr(pi_item, "serial_no"):
+				pi_item.serial_no = serial_no_value
+	elif hasattr(doc, "update_stock") and not doc.update_stock:
+		doc.update_stock = 1
 	
-	if not purchase_receipts:
+	# Rows still without a serial_no take a frame of their item from the Load Dispatch
+	_fill_serial_nos_from_load_dispatch(doc)
+
+
+def _fill_serial_nos_from_load_dispatch(doc):
+	"""Give Purchase Invoice rows without a serial_no a frame of their item from the Load Dispatch projection.
+	
+	Rows that already carry a serial_no are kept; each frame is handed out once, in dispatch row order.
+	"""
+	projection = get_load_dispatch_projection(get_purchase_document_load_dispatch(doc))
+	if not projection or not projection.get("frames"):
 		return
 	
-	receipt_item_map = {}
+	used = {cstr(item.get("serial_no")).strip() for item in doc.items if item.get("serial_no")}
+	free_frames = {}
+	for frame_no, frame in projection.frames.items():
+		if frame_no not in used and frame["item_code"]:
+			free_frames.setdefault(frame["item_code"], []).append(frame_no)
 	
-	for pr_name in purchase_receipts:
-		try:
-			purchase_receipt = frappe.get_doc("Purchase Receipt", pr_name)
-			if not purchase_receipt.items:
-				continue
-			
-			for pr_item in purchase_receipt.items:
-				if pr_item.item_code and hasattr(pr_item, "serial_no") and pr_item.serial_no:
-					key = (pr_name, pr_item.item_code, pr_item.idx)
-					receipt_item_map[key] = pr_item.serial_no
-		except frappe.DoesNotExistError:
+	for item in doc.items:
+		if item.get("serial_no") or not free_frames.get(item.item_code):
 			continue
-	
-	if receipt_item_map:
-		for pi_item in doc.items:
-			if pi_item.item_code and hasattr(pi_item, "purchase_receipt") and pi_item.purchase_receipt:
-				pr_name = pi_item.purchase_receipt
-				key = (pr_name, pi_item.item_code, pi_item.idx)
-				if key in receipt_item_map:
-					serial_no_value = receipt_item_map[key]
-				else:
-					serial_no_value = next((v for (pr_key, item_code, idx), v in receipt_item_map.items() if pr_key == pr_name and item_code == pi_item.item_code), None)
-				
-				if serial_no_value:
-					if hasattr(pi_item, "use_serial_batch_fields") and not pi_item.use_serial_batch_fields:
-						pi_item.use_serial_batch_fields = 1
-					if hasattr(pi_item, "serial_no"):
-						pi_item.serial_no = serial_no_value
-	
-	has_purchase_receipt = any(hasattr(item, "purchase_receipt") and item.purchase_receipt for item in (doc.items or []))
-	
-	if not has_purchase_receipt and hasattr(doc, "update_stock") and not doc.update_stock:
-		doc.update_stock = 1
+		frame_no = free_frames[item.item_code].pop(0)
+		item.serial_no = frame_no
+		if hasattr(item, "use_serial_batch_fields") and not item.use_serial_batch_fields:
+			item.use_serial_batch_fields = 1
+		if hasattr(item, "item_group") and not item.item_group and projection.frames[frame_no]["item_group"]:
+			item.item_group = projection.frames[frame_no]["item_group"]
 
 
 def validate_purchase_invoice_requires_receipt(doc, method=None):
@@ -2084,7 +2618,7 @@ def validate_purchase_invoice_requires_receipt(doc, method=None):
 		return
 	
 	load_dispatch_name = (doc.custom_load_dispatch if hasattr(doc, "custom_load_dispatch") and doc.custom_load_dispatch
-		else (frappe.db.get_value("Purchase Invoice", doc.name, "custom_load_dispatch") if frappe.db.has_column("Purchase Invoice", "custom_load_dispatch") else None))
+		else (frappe.db.get_value("Purchase Invoice", doc.name, "custom_load_dispatch") if has_column("Purchase Invoice", "custom_load_dispatch") else None))
 	
 	if load_dispatch_name:
 		pr_list = frappe.get_all(
@@ -1,4 +1,15 @@
 frappe.listview_settings["Load Dispatch"] = {
+	onload: function (listview) {
+		listview.page.add_actions_menu_item(__("Create Purchase Receipts"), function () {
+			const load_dispatches = listview.get_checked_items(true);
+			if (!load_dispatches.length) {
+				frappe.msgprint(__("Select at least one Load Dispatch"));
+				return;
+			}
+			show_bulk_purchase_receipt_dialog(load_dispatches);
+		});
+	},
+
 	get_indicator: function (doc) {
 		// Status options (from doctype):
 		// In-Transit, Received
@@ -18,4 +29,137 @@ frappe.listview_settings["Load Dispatch"] = {
 	},
 };
 
+function show_bulk_purchase_receipt_dialog(load_dispatches) {
+	const dialog = new frappe.ui.Dialog({
+		title: __("Create Purchase Receipts for {0} Load Dispatches", [load_dispatches.length]),
+		fields: [
+			{
+				fieldname: "warehouse",
+				fieldtype: "Link",
+				options: "Warehouse",
+				label: __("Warehouse"),
+				description: __("Leave empty to use the warehouse of each Load Dispatch")
+			},
+			{
+				fieldname: "frame_section",
+				fieldtype: "Section Break",
+				label: __("Frame Warehouses"),
+				collapsible: 1
+			},
+			{
+				fieldname: "frame_warehouse_mapping",
+				fieldtype: "Table",
+				label: __("Frame Warehouse Mapping"),
+				fields: [
+					{ fieldname: "frame_no", fieldtype: "Data", label: __("Frame No"), in_list_view: 1 },
+					{ fieldname: "warehouse", fieldtype: "Link", options: "Warehouse", label: __("Warehouse"), in_list_view: 1 }
+				],
+				data: []
+			}
+		],
+		primary_action_label: __("Create"),
+		primary_action: function (values) {
+			const mapping = (values.frame_warehouse_mapping || [])
+				.filter((row) => row.frame_no && row.warehouse)
+				.map((row) => ({ frame_no: row.frame_no, warehouse: row.warehouse }));
+
+			frappe.call({
+				method: "rkg.rkg.doctype.load_dispatch.load_dispatch.enqueue_bulk_purchase_receipts",
+				args: {
+					load_dispatches: load_dispatches,
+					warehouse: values.warehouse || null,
+					frame_warehouse_mapping: mapping.length ? mapping : null
+				},
+				freeze: true,
+				callback: function (r) {
+					if (r.message && r.message.batch_id) {
+						dialog.hide();
+						wait_for_bulk_purchase_receipts(r.message.batch_id, r.message.total);
+					}
+				}
+			});
+		}
+	});
+	dialog.show();
+}
+
+function wait_for_bulk_purchase_receipts(batch_id, total) {
+	// Progress is pushed over realtime; polling covers a missed or unavailable socket.
+	let done = false;
+	let poll_timer = null;
+
+	const finish = function (state) {
+		if (done) {
+			return;
+		}
+		done = true;
+		clearInterval(poll_timer);
+		frappe.realtime.off("load_dispatch_bulk_receipt_progress", on_progress);
+		frappe.hide_progress();
+		show_bulk_purchase_receipt_summary(state);
+		cur_list && cur_list.refresh();
+	};
+
+	const fetch_status = function () {
+		frappe.call({
+			method: "rkg.rkg.doctype.load_dispatch.load_dispatch.get_bulk_purchase_receipt_status",
+			args: { batch_id: batch_id },
+			callback: function (r) {
+				const state = r.message || {};
+				if (["finished", "not_found"].includes(state.status)) {
+					finish(state);
+				}
+			}
+		});
+	};
+
+	const on_progress = function (data) {
+		if (!data || data.batch_id !== batch_id || done) {
+			return;
+		}
+		frappe.show_progress(__("Creating Purchase Receipts"), data.done, total,
+			__("{0} of {1} Load Dispatches processed", [data.done, total]));
+		if (data.done >= total) {
+			// the summary itself is fetched once, it is not sent over the socket
+			fetch_status();
+		}
+	};
+
+	frappe.show_progress(__("Creating Purchase Receipts"), 0, total, __("Queued"));
+	frappe.realtime.on("load_dispatch_bulk_receipt_progress", on_progress);
+	poll_timer = setInterval(fetch_status, 3000);
+}
+
+function show_bulk_purchase_receipt_summary(state) {
+	if (state.status === "not_found") {
+		frappe.msgprint({
+			title: __("Purchase Receipts"),
+			message: __("The batch has expired. Check the Load Dispatch list for the receipts created."),
+			indicator: "orange"
+		});
+		return;
+	}
+
+	const created = state.created || [];
+	const failed = state.failed || [];
+	let message = `<p>${__("{0} Purchase Receipts created, {1} failed.", [created.length, failed.length])}</p>`;
+
+	if (created.length) {
+		message += "<ul>" + created.map((row) =>
+			`<li>${frappe.utils.get_form_link("Load Dispatch", row.load_dispatch, true)} → ` +
+			`${frappe.utils.get_form_link("Purchase Receipt", row.purchase_receipt, true)}</li>`
+		).join("") + "</ul>";
+	}
+	if (failed.length) {
+		message += `<p><b>${__("Failed")}</b></p><ul>` + failed.map((row) =>
+			`<li>${frappe.utils.get_form_link("Load Dispatch", row.load_dispatch, true)}: ` +
+			`${frappe.utils.escape_html(row.error || "")}</li>`
+		).join("") + "</ul>";
+	}
 
+	frappe.msgprint({
+		title: __("Purchase Receipts"),
+		message: message,
+		indicator: failed.length ? (created.length ? "orange" : "red") : "green"
+	});
+}
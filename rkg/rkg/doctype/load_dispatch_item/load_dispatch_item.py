@@ -1,6 +1,11 @@
-# import frappe
+import frappe
 from frappe.model.document import Document
 
 
 class LoadDispatchItem(Document):
 	pass
+
+
+def on_doctype_update():
+	# Duplicate frame checks look up (frame_no, item_code) pairs across all dispatches
+	frappe.db.add_index("Load Dispatch Item", ["frame_no", "item_code"])
@@ -4,9 +4,15 @@ import os
 import frappe
 from frappe import _
 from frappe.model.document import Document
-from frappe.utils import flt
+from frappe.utils import flt, getdate
 from frappe.utils.xlsxutils import read_xlsx_file_from_attached_file
 
+from rkg.utils.db import BULK_CHUNK_SIZE
+from rkg.utils.file_import import compile_column_plan, get_file_path, open_csv_file
+from rkg.utils.parse_cache import get_cached_parse
+from rkg.utils.schema import has_column
+from rkg.utils.write_buffer import buffer_set_value
+
 
 class LoadPlan(Document):
 	def before_insert(self):
@@ -145,88 +151,39 @@ class LoadPlan(Document):
 		return dashboard_data
 
 
-def update_load_plan_status_from_document(doc, method=None):
-	"""
-	Update Load Plan status based on Purchase Receipt or Purchase Invoice submission.
-	Called from hooks when Purchase Receipt or Purchase Invoice is submitted/cancelled.
-	
-	Purchase Receipt/Invoice -> Load Dispatch (via custom_load_dispatch) -> Load Plan (via load_reference_no)
-	OR
-	Purchase Receipt/Invoice -> Load Plan (via custom_load_reference_no, load_reference_to, or load_reference_no)
-	
-	Args:
-		doc: Purchase Receipt or Purchase Invoice document
-		method: Hook method name (optional)
-	"""
-	# For Purchase Invoice, only update status if update_stock is enabled
-	if doc.doctype == "Purchase Invoice":
-		update_stock = flt(doc.get("update_stock")) or 0
-		if update_stock != 1:
-			return
-	
-	load_reference_no = None
-	
-	# Method 1: Get Load Plan via Load Dispatch (PR/PI -> LD -> LP)
-	load_dispatch_name = None
-	
-	# Check custom_load_dispatch field (primary link from PR/PI to Load Dispatch)
-	if hasattr(doc, 'custom_load_dispatch') and doc.custom_load_dispatch:
-		load_dispatch_name = doc.custom_load_dispatch
-	elif frappe.db.has_column(doc.doctype, "custom_load_dispatch"):
-		load_dispatch_name = frappe.db.get_value(doc.doctype, doc.name, "custom_load_dispatch")
+def affects_load_plan_status(doc):
+	"""Purchase Invoices only move a Load Plan when they update stock."""
+	return doc.doctype != "Purchase Invoice" or flt(doc.get("update_stock")) == 1
+
+
+def get_load_plan_from_document(doc):
+	"""Return the Load Plan a Purchase Receipt/Invoice links to directly, without going through Load Dispatch."""
+	for fieldname in ("custom_load_reference_no", "load_reference_to", "load_reference_no"):
+		if doc.get(fieldname):
+			return doc.get(fieldname)
 	
-	if load_dispatch_name and frappe.db.exists("Load Dispatch", load_dispatch_name):
-		# Get Load Plan from Load Dispatch
-		load_dispatch = frappe.get_doc("Load Dispatch", load_dispatch_name)
-		load_reference_no = load_dispatch.get("load_reference_no")
+	if has_column(doc.doctype, "custom_load_reference_no"):
+		return frappe.db.get_value(doc.doctype, doc.name, "custom_load_reference_no")
 	
-	# Method 2: Fallback - Try direct link to Load Plan (if PR/PI has direct link)
-	if not load_reference_no:
-		if hasattr(doc, 'custom_load_reference_no') and doc.custom_load_reference_no:
-			load_reference_no = doc.custom_load_reference_no
-		elif hasattr(doc, 'load_reference_to') and doc.load_reference_to:
-			load_reference_no = doc.load_reference_to
-		elif hasattr(doc, 'load_reference_no') and doc.load_reference_no:
-			load_reference_no = doc.load_reference_no
-		elif frappe.db.has_column(doc.doctype, "custom_load_reference_no"):
-			load_reference_no = frappe.db.get_value(doc.doctype, doc.name, "custom_load_reference_no")
+	return None
+
+
+def refresh_load_plan_statuses(load_plan_names, triggered_by="rollup queue"):
+	"""Rollup queue handler: recompute the status of the given Load Plans as one set. Does not commit.
 	
-	if not load_reference_no:
-		# No Load Plan link found, skip status update
-		# Log for debugging
-		frappe.logger().warning(
-			f"Load Plan status update skipped: No Load Plan link found for {doc.doctype} {doc.name}. "
-			f"LD: {load_dispatch_name or 'N/A'}"
+	Returns:
+		list: names of the Load Plans whose status changed
+	"""
+	try:
+		return update_load_plan_statuses(load_plan_names, triggered_by)
+	except Exception as e:
+		frappe.log_error(
+			f"Error updating Load Plan status for {', '.join(load_plan_names)}: {str(e)}\n"
+			f"Triggered by: {triggered_by}\n"
+			f"Traceback: {frappe.get_traceback()}",
+			"Load Plan Status Update Error"
 		)
-		return
-	
-	# Update Load Plan status using centralized get_load_plan_status function
-	if frappe.db.exists("Load Plan", load_reference_no):
-		try:
-			new_status = get_load_plan_status(load_reference_no)
-			if new_status:
-				current_status = frappe.db.get_value("Load Plan", load_reference_no, "status")
-				if current_status != new_status:
-					frappe.db.set_value("Load Plan", load_reference_no, "status", new_status)
-					frappe.db.commit()
-					# Log status change for debugging
-					frappe.logger().info(
-						f"Load Plan {load_reference_no} status updated: {current_status} -> {new_status} "
-						f"(triggered by {doc.doctype} {doc.name}, LD: {load_dispatch_name or 'N/A'})"
-					)
-			else:
-				# Log if status calculation returned None
-				frappe.logger().warning(
-					f"Load Plan {load_reference_no} status calculation returned None "
-					f"(triggered by {doc.doctype} {doc.name}, LD: {load_dispatch_name or 'N/A'})"
-				)
-		except Exception as e:
-			frappe.log_error(
-				f"Error updating Load Plan status for {load_reference_no}: {str(e)}\n"
-				f"PR/PI: {doc.doctype} {doc.name}, LD: {load_dispatch_name or 'N/A'}\n"
-				f"Traceback: {frappe.get_traceback()}",
-				"Load Plan Status Update Error"
-			)
+		return []
 
 
 @frappe.whitelist()
@@ -266,59 +223,126 @@ def get_first_row_for_mandatory_fields(file_url):
 	return None
 
 
+LOAD_PLAN_COLUMN_MAPPING = {
+	# Parent
+	"load reference no": "load_reference_no",
+	"dispatch plan date": "dispatch_plan_date",
+	"payment plan date": "payment_plan_date",
+	# Alternate (from Load Dispatch CSV)
+	"hmsi load reference no": "load_reference_no",
+	"dispatch date": "dispatch_plan_date",
+	# Child
+	"model": "model",
+	"model name": "model_name",
+	"type": "model_type",
+	"variant": "model_variant",
+	"color": "model_color",
+	"colour": "model_color",
+	"group color": "group_color",
+	"group colour": "group_color",
+	"group co": "group_color",
+	"tax rate": "group_color",  # fallback
+	"option": "option",
+	"qty": "quantity",
+	"quantity": "quantity",
+}
+
+LOAD_PLAN_REQUIRED_HEADERS = [
+	"Load Reference No",
+	"Dispatch Plan Date",
+	"Payment Plan Date",
+	"Model",
+	"Model Name",
+	"Type",
+	"Variant",
+	"Color",
+	"Group Color",
+	"Option",
+	"Quantity",
+]
+
+# Minimal header set of a Load Dispatch CSV, accepted when the primary headers are missing
+LOAD_PLAN_DISPATCH_MIN_HEADERS = [
+	"HMSI Load Reference No",
+	"Dispatch Date",
+	"Model",
+	"Model Name",
+	"Colour",
+	"Variant",
+	"Qty",
+]
+
+# Column order assumed when no header could be matched
+LOAD_PLAN_POSITIONAL_HEADERS = [
+	"load reference no",
+	"dispatch plan date",
+	"payment plan date",
+	"model",
+	"model name",
+	"type",
+	"variant",
+	"color",
+	"group color",
+	"option",
+	"quantity",
+]
+
+LOAD_PLAN_CHILD_FIELDS = {
+	"model",
+	"model_name",
+	"model_type",
+	"model_variant",
+	"model_color",
+	"group_color",
+	"option",
+	"quantity",
+}
+
+
+def _strip_cell(value):
+	return value.strip() if isinstance(value, str) else value
+
+
+def _convert_plan_date(value):
+	try:
+		return getdate(_strip_cell(value))
+	except Exception:
+		return _strip_cell(value)
+
+
+def _convert_quantity(value):
+	try:
+		return int(float(_strip_cell(value)))
+	except Exception:
+		return _strip_cell(value)
+
+
+LOAD_PLAN_COLUMN_CONVERTERS = {
+	"dispatch_plan_date": _convert_plan_date,
+	"payment_plan_date": _convert_plan_date,
+	"quantity": _convert_quantity,
+}
+
+
+def compile_load_plan_column_plan(headers):
+	"""Compile a Load Plan file header row into a column plan."""
+	return compile_column_plan(
+		headers, LOAD_PLAN_COLUMN_MAPPING, converters=LOAD_PLAN_COLUMN_CONVERTERS, default_converter=_strip_cell
+	)
+
+
 @frappe.whitelist()
 def process_tabular_file(file_url):
 	"""Read the attached file row-wise (CSV or Excel) and map it to Load Plan Item fields. Returns a list of dicts ready to be added to the child table."""
 	if not file_url:
 		frappe.throw(_("No file provided"))
 
-	# Reusable header normalizer
-	def _norm_header(h):
-		if not h:
-			return ""
-		normalized = str(h).replace("\ufeff", "").replace("\u200b", "").strip()
-		return " ".join(normalized.lower().split())
-
-	# Header → fieldname mapping (parent fields included to pass back)
-	column_mapping = {
-		# Parent
-		"load reference no": "load_reference_no",
-		"dispatch plan date": "dispatch_plan_date",
-		"payment plan date": "payment_plan_date",
-		# Alternate (from Load Dispatch CSV)
-		"hmsi load reference no": "load_reference_no",
-		"dispatch date": "dispatch_plan_date",
-		# Child
-		"model": "model",
-		"model name": "model_name",
-		"type": "model_type",
-		"variant": "model_variant",
-		"color": "model_color",
-		"colour": "model_color",
-		"group color": "group_color",
-		"group colour": "group_color",
-		"group co": "group_color",
-		"tax rate": "group_color",  # fallback
-		"option": "option",
-		"qty": "quantity",
-		"quantity": "quantity",
-	}
+	# Parsed rows are cached by file content, so re-attaching the same file skips the parse
+	return get_cached_parse("load_plan", get_file_path(file_url), lambda: _read_load_plan_file(file_url))
 
-	required_headers = [
-		"Load Reference No",
-		"Dispatch Plan Date",
-		"Payment Plan Date",
-		"Model",
-		"Model Name",
-		"Type",
-		"Variant",
-		"Color",
-		"Group Color",
-		"Option",
-		"Quantity",
-	]
-	optional_headers = []
 
+def _read_load_plan_file(file_url):
+	"""Read and map a Load Plan file, trying Excel first and falling back to CSV."""
 	# Try Excel first (works even if extension is .csv but content is xlsx)
 	data = None
 	try:
@@ -327,7 +351,11 @@ def process_tabular_file(file_url):
 		data = None
 
 	if data:
-		result = _process_tabular_rows(data, column_mapping, required_headers, optional_headers, _norm_header)
+		frappe.log_error(
+			message=f"Load Plan import: headers detected={data[0]}",
+			title="Load Plan Import Debug"
+		)
+		result = _process_tabular_rows(data, LOAD_PLAN_REQUIRED_HEADERS, [])
 		if not result:
 			frappe.log_error(
 				message=f"Load Plan import: no rows built from Excel. Headers={data[0] if data else 'N/A'}",
@@ -336,7 +364,7 @@ def process_tabular_file(file_url):
 		return result
 
 	# CSV path (fallback to previous logic)
-	result = _process_load_plan_csv(file_url, column_mapping, required_headers, optional_headers)
+	result = _process_load_plan_csv(file_url, LOAD_PLAN_REQUIRED_HEADERS, [])
 	if not result:
 		frappe.log_error(
 			message="Load Plan import: no rows built from CSV after fallback.",
@@ -345,46 +373,25 @@ def process_tabular_file(file_url):
 	return result
 
 
-def _process_tabular_rows(data, column_mapping, required_headers, optional_headers, norm_func):
+def _process_tabular_rows(data, required_headers, optional_headers, strict_headers=True):
+	"""Map header + data rows to Load Plan fields. With strict_headers, a file without any known header is rejected."""
 	if not data or len(data) == 0:
 		return []
 
-	headers = [(cell or "").strip() for cell in data[0]]
-	norm_csv_headers = {norm_func(h): h for h in headers if h}
-	frappe.log_error(
-		message=f"Load Plan import: headers detected={headers}",
-		title="Load Plan Import Debug"
-	)
+	headers = [str(cell).strip() if cell is not None else "" for cell in data[0]]
+	plan = compile_load_plan_column_plan(headers)
 
 	# Validate headers (accept either primary set or dispatch-style set)
-	def _missing(headers, norm_headers):
-		miss = []
-		for req in headers:
-			if norm_func(req) not in norm_headers:
-				miss.append(req)
-		return miss
-
-	missing_headers = _missing(required_headers, norm_csv_headers)
-	missing_optional = _missing(optional_headers, norm_csv_headers)
+	missing_headers = plan.missing_headers(required_headers)
+	missing_optional = plan.missing_headers(optional_headers)
 
 	# Fallback: accept dispatch CSV headers (subset) when primary missing
-	dispatch_min_headers = [
-		"HMSI Load Reference No",
-		"Dispatch Date",
-		"Model",
-		"Model Name",
-		"Colour",
-		"Variant",
-		"Qty",
-	]
-	dispatch_missing = _missing(dispatch_min_headers, norm_csv_headers)
-	if missing_headers and not dispatch_missing:
+	if missing_headers and not plan.missing_headers(LOAD_PLAN_DISPATCH_MIN_HEADERS):
 		missing_headers = []
 
 	if missing_headers:
 		# If we still have at least one mapped column, just warn and continue
-		has_any_mapped = any(norm_func(col) in norm_csv_headers for col in column_mapping.keys())
-		if has_any_mapped:
+		if plan.fields or not strict_headers:
 			frappe.msgprint(
 				_("Missing headers (processing will continue):<br>{0}").format(
 					"<br>".join([f"• {h}" for h in missing_headers])
@@ -416,57 +423,10 @@ def _process_tabular_rows(data, column_mapping, required_headers, optional_heade
 			alert=True,
 		)
 
-	rows = []
-	for row in data[1:]:
-		row_data = {}
-		for csv_col, fieldname in column_mapping.items():
-			actual_col = norm_csv_headers.get(norm_func(csv_col))
-			if not actual_col:
-				continue
-
-			try:
-				col_idx = headers.index(actual_col)
-			except ValueError:
-				continue
-
-			raw_value = row[col_idx] if col_idx < len(row) else ""
-			value = raw_value.strip() if isinstance(raw_value, str) else raw_value
-
-			if fieldname in ["dispatch_plan_date", "payment_plan_date"]:
-				if value:
-					try:
-						from frappe.utils import getdate
-						row_data[fieldname] = getdate(value)
-					except Exception:
-						row_data[fieldname] = value
-				else:
-					row_data[fieldname] = None
-			elif fieldname == "quantity":
-				if value or value == 0:
-					try:
-						row_data[fieldname] = int(float(value))
-					except Exception:
-						row_data[fieldname] = value
-				else:
-					row_data[fieldname] = None
-			else:
-				row_data[fieldname] = value
-
-		rows.append(row_data)
-
-	child_fields = {
-		"model",
-		"model_name",
-		"model_type",
-		"model_variant",
-		"model_color",
-		"group_color",
-		"option",
-		"quantity",
-	}
+	rows = [plan.map_row(row, keep_empty=True) for row in data[1:]]
 
 	def _has_child_fields(row):
-		return any(k in child_fields for k in row.keys())
+		return any(k in LOAD_PLAN_CHILD_FIELDS for k in row.keys())
 
 	if (not rows) or all(not _has_child_fields(r) for r in rows):
 		frappe.log_error(
@@ -474,54 +434,11 @@ def _process_tabular_rows(data, column_mapping, required_headers, optional_heade
 			title="Load Plan Import Debug (no rows)"
 		)
 		# Fallback: positional mapping using expected order
-		expected_order = [
-			"load reference no",
-			"dispatch plan date",
-			"payment plan date",
-			"model",
-			"model name",
-			"type",
-			"variant",
-			"color",
-			"group color",
-			"option",
-			"quantity",
-		]
-		for row in data[1:]:
-			row_data = {}
-			for idx, key in enumerate(expected_order):
-				if idx >= len(row):
-					break
-				raw_value = row[idx]
-				value = raw_value.strip() if isinstance(raw_value, str) else raw_value
-				fieldname = column_mapping.get(key, key)
-				if fieldname in ["dispatch_plan_date", "payment_plan_date"]:
-					if value:
-						try:
-							from frappe.utils import getdate
-							row_data[fieldname] = getdate(value)
-						except Exception:
-							row_data[fieldname] = value
-					else:
-						row_data[fieldname] = None
-				elif fieldname == "quantity":
-					if value or value == 0:
-						try:
-							row_data[fieldname] = int(float(value))
-						except Exception:
-							row_data[fieldname] = value
-					else:
-						row_data[fieldname] = None
-				else:
-					row_data[fieldname] = value
-			rows.append(row_data)
+		positional_plan = compile_load_plan_column_plan(LOAD_PLAN_POSITIONAL_HEADERS)
+		rows = [positional_plan.map_row(row, keep_empty=True) for row in data[1:]]
 
 	# Filter out invalid fields that don't exist in Load Plan Item doctype
-	valid_child_fields = {
-		"model", "model_name", "model_type", "model_variant",
-		"model_color", "group_color", "option", "quantity",
-		"load_reference_no", "dispatch_plan_date", "payment_plan_date"
-	}
+	valid_child_fields = LOAD_PLAN_CHILD_FIELDS | {"load_reference_no", "dispatch_plan_date", "payment_plan_date"}
 	
 	# Remove invalid fields from each row (like item_code)
 	filtered_rows = []
@@ -532,210 +449,30 @@ def _process_tabular_rows(data, column_mapping, required_headers, optional_heade
 	return filtered_rows
 
 
-def _process_load_plan_csv(file_url, column_mapping, required_headers, optional_headers):
+def _process_load_plan_csv(file_url, required_headers, optional_headers):
 	"""CSV-only processing reused by process_tabular_file."""
-	if file_url.startswith("/files/"):
-		file_name = file_url.split("/files/")[-1]
-		file_path = frappe.get_site_path("public", "files", file_name)
-	else:
-		file_path = frappe.get_site_path("public", file_url.lstrip("/"))
+	file_path = get_file_path(file_url)
 
 	if not os.path.exists(file_path):
 		frappe.throw(_("File not found: {0}").format(file_url))
 
-	# Try multiple encodings
-	encodings = ["utf-8-sig", "utf-8", "utf-16-le", "utf-16-be", "latin-1", "cp1252"]
-	csvfile = None
-	for encoding in encodings:
-		try:
-			csvfile = open(file_path, "r", encoding=encoding)
-			sample = csvfile.read(1024)
-			csvfile.seek(0)
-			break
-		except (UnicodeDecodeError, UnicodeError):
-			if csvfile:
-				csvfile.close()
-			csvfile = None
-			continue
-
-	if not csvfile:
-		frappe.throw(_("Unable to read the file. Please ensure it is saved as CSV."))
-
+	csvfile = open_csv_file(file_path)
 	try:
-		def _norm_header(h):
-			if not h:
-				return ""
-			normalized = str(h).replace("\ufeff", "").replace("\u200b", "").strip()
-			return " ".join(normalized.lower().split())
-
 		# Detect delimiter
 		try:
-			delimiter = csv.Sniffer().sniff(sample, delimiters=",;\t|").delimiter
+			delimiter = csv.Sniffer().sniff(csvfile.read(1024), delimiters=",;\t|").delimiter
 		except Exception:
 			delimiter = ","
-
-		# Build reader and headers
 		csvfile.seek(0)
-		reader = csv.DictReader(csvfile, delimiter=delimiter)
-		reader_headers = [h.strip() if h else "" for h in (reader.fieldnames or [])]
-		csv_headers = reader_headers
-		norm_csv_headers = {_norm_header(h): h for h in csv_headers if h}
-
-		if not csv_headers:
-			frappe.throw(_("CSV file appears to have no headers. Please ensure the first row contains column headers."))
-
-		# Check missing headers
-		missing_headers = []
-		for req in required_headers:
-			if _norm_header(req) not in norm_csv_headers:
-				missing_headers.append(req)
-		missing_optional = []
-		for opt in optional_headers:
-			if _norm_header(opt) not in norm_csv_headers:
-				missing_optional.append(opt)
-
-		if missing_headers:
-			has_any_mapped = any(_norm_header(col) in norm_csv_headers for col in column_mapping.keys())
-			if has_any_mapped:
-				frappe.msgprint(
-					_("Missing headers (processing will continue):<br>{0}").format(
-						"<br>".join([f"• {h}" for h in missing_headers])
-					),
-					indicator="orange",
-					alert=True,
-				)
-			else:
-				# Don't block; just warn and continue
-				frappe.msgprint(
-					_("Missing headers (processing will continue):<br>{0}").format(
-						"<br>".join([f"• {h}" for h in missing_headers])
-					),
-					indicator="orange",
-					alert=True,
-				)
-		elif missing_optional:
-			frappe.msgprint(
-				_("Optional headers missing (processing will continue):<br>{0}").format(
-					"<br>".join([f"• {h}" for h in missing_optional])
-				),
-				indicator="orange",
-				alert=True,
-			)
 
-		rows = []
-		for csv_row in reader:
-			row_data = {}
-			for csv_col, fieldname in column_mapping.items():
-				actual_col = norm_csv_headers.get(_norm_header(csv_col))
-				if not actual_col:
-					continue
-
-				raw_value = csv_row.get(actual_col, "")
-				value = raw_value.strip() if isinstance(raw_value, str) else raw_value
-
-				if fieldname in ["dispatch_plan_date", "payment_plan_date"]:
-					if value:
-						try:
-							from frappe.utils import getdate
-							row_data[fieldname] = getdate(value)
-						except Exception:
-							row_data[fieldname] = value
-					else:
-						row_data[fieldname] = None
-				elif fieldname == "quantity":
-					if value or value == 0:
-						try:
-							row_data[fieldname] = int(float(value))
-						except Exception:
-							row_data[fieldname] = value
-					else:
-						row_data[fieldname] = None
-				else:
-					row_data[fieldname] = value
-
-			rows.append(row_data)
-
-		child_fields = {
-			"model",
-			"model_name",
-			"model_type",
-			"model_variant",
-			"model_color",
-			"group_color",
-			"option",
-			"quantity",
-		}
+		data = list(csv.reader(csvfile, delimiter=delimiter))
+	finally:
+		csvfile.close()
 
-		def _has_child_fields(row):
-			return any(k in child_fields for k in row.keys())
+	if not data or not any(h and str(h).strip() for h in data[0]):
+		frappe.throw(_("CSV file appears to have no headers. Please ensure the first row contains column headers."))
 
-		# Fallback positional mapping if still empty or no child fields populated
-		if (not rows) or all(not _has_child_fields(r) for r in rows):
-			try:
-				csvfile.seek(0)
-				raw_reader = csv.reader(csvfile, delimiter=delimiter)
-				raw_headers = next(raw_reader, [])
-				expected_order = [
-					"load reference no",
-					"dispatch plan date",
-					"payment plan date",
-					"model",
-					"model name",
-					"type",
-					"variant",
-					"color",
-					"group color",
-					"option",
-					"quantity",
-				]
-				for raw_row in raw_reader:
-					row_data = {}
-					for idx, key in enumerate(expected_order):
-						if idx >= len(raw_row):
-							break
-						raw_value = raw_row[idx]
-						value = raw_value.strip() if isinstance(raw_value, str) else raw_value
-						fieldname = column_mapping.get(key, key)
-						if fieldname in ["dispatch_plan_date", "payment_plan_date"]:
-							if value:
-								try:
-									from frappe.utils import getdate
-									row_data[fieldname] = getdate(value)
-								except Exception:
-									row_data[fieldname] = value
-							else:
-								row_data[fieldname] = None
-						elif fieldname == "quantity":
-							if value or value == 0:
-								try:
-									row_data[fieldname] = int(float(value))
-								except Exception:
-									row_data[fieldname] = value
-							else:
-								row_data[fieldname] = None
-						else:
-							row_data[fieldname] = value
-					rows.append(row_data)
-			except Exception:
-				pass
-
-		# Filter out invalid fields that don't exist in Load Plan Item doctype
-		valid_child_fields = {
-			"model", "model_name", "model_type", "model_variant",
-			"model_color", "group_color", "option", "quantity",
-			"load_reference_no", "dispatch_plan_date", "payment_plan_date"
-		}
-		
-		# Remove invalid fields from each row (like item_code)
-		filtered_rows = []
-		for row in rows:
-			filtered_row = {k: v for k, v in row.items() if k in valid_child_fields}
-			filtered_rows.append(filtered_row)
-		
-		return filtered_rows
-	finally:
-		if csvfile:
-			csvfile.close()
+	return _process_tabular_rows(data, required_headers, optional_headers, strict_headers=False)
 
 
 @frappe.whitelist()
@@ -896,23 +633,29 @@ def _create_single_load_plan(load_reference_no, dispatch_plan_date, payment_plan
 	load_plan.flags.from_file_upload = True
 	load_plan.flags.ignore_mandatory = True
 	
-	# Save the document
-	load_plan.save(ignore_permissions=True)
-	frappe.db.commit()
+	# Save the document; a failed plan is rolled back to the savepoint so the other plans of the
+	# file still go through in the request's single commit
+	frappe.db.savepoint("rkg_load_plan_save")
+	try:
+		load_plan.save(ignore_permissions=True)
+	except Exception:
+		frappe.db.rollback(save_point="rkg_load_plan_save")
+		raise
 	
 	# Submit the Load Plan if it's in Draft state
 	# Reload the document to ensure it's in the correct state
 	load_plan.reload()
 	
 	if load_plan.docstatus == 0:
+		frappe.db.savepoint("rkg_load_plan_submit")
 		try:
 			# Keep ignore_mandatory flag during submit to ensure it goes through
 			# All mandatory fields are already set, so this is safe
 			load_plan.flags.ignore_mandatory = True
 			load_plan.flags.ignore_permissions = True
 			load_plan.submit()
-			frappe.db.commit()
 		except Exception as e:
+			frappe.db.rollback(save_point="rkg_load_plan_submit")
 			# Log error but don't fail the entire process
 			frappe.log_error(
 				message=f"Error submitting Load Plan {load_reference_no}: {str(e)}\nTraceback: {frappe.get_traceback()}",
@@ -923,125 +666,104 @@ def _create_single_load_plan(load_reference_no, dispatch_plan_date, payment_plan
 	return load_plan
 
 
-@frappe.whitelist()
-def get_load_plan_status(load_plan_name):
-	"""Get the status of a Load Plan based on dates, Load Dispatch, and Purchase Receipt.
+# Purchase Receipt columns that link a receipt straight to its Load Plan
+LOAD_PLAN_RECEIPT_LINK_FIELDS = ("custom_load_reference_no", "load_reference_to", "load_reference_no")
+
+
+def get_load_plan_statuses(load_plan_names):
+	"""Compute the status of many Load Plans with two grouped queries per chunk.
 	
 	Logic:
-	1. If Purchase Receipt exists for Load Dispatches linked to this Load Plan: Status = "Received"
-	2. If Load Dispatch exists for this Load Plan: Status = "In-Transit"
-	3. If dispatch_plan_date exists (any date): Status = "Planned"
-	4. Otherwise: Default to "Planned"
+	1. A submitted Purchase Receipt linked to the Load Plan (directly or through one of its
+	   Load Dispatches), or a submitted stock-updating Purchase Invoice made from one of its
+	   Load Dispatches: Status = "Received"
+	2. A Load Dispatch exists for the Load Plan: Status = "In-Transit"
+	3. Otherwise: Status = "Planned"
 	
 	Args:
-		load_plan_name: Name of the Load Plan document
-		
+		load_plan_names: Load Plan names
+	
 	Returns:
-		str: Status of the Load Plan
+		dict: {load_plan: frappe._dict(current_status, status)} for the Load Plans that exist
 	"""
-	from frappe.utils import getdate, today
-	
-	if not load_plan_name:
-		return "Planned"
-	
-	# Get Load Plan document
-	if not frappe.db.exists("Load Plan", load_plan_name):
-		return "Planned"
-	
-	load_plan = frappe.get_doc("Load Plan", load_plan_name)
-	
-	# Priority 1: Check if Purchase Receipt exists for Load Dispatches linked to this Load Plan
-	# First, get all Load Dispatches for this Load Plan
-	load_dispatches = frappe.get_all(
-		'Load Dispatch',
-		filters={'load_reference_no': load_plan_name},
-		fields=['name'],
-		limit_page_length=1000
-	)
-	
-	# Check if any Purchase Receipt exists for these Load Dispatches
-	# Purchase Receipt can link to Load Plan via custom_load_reference_no, load_reference_to, or load_reference_no
-	# Or it might link to Load Dispatch directly - need to check both
-	
-	# Check PR linked to Load Plan
-	pr_filters = {"docstatus": 1}
-	pr_found = False
-	
-	# Check custom_load_reference_no
-	if frappe.db.has_column("Purchase Receipt", "custom_load_reference_no"):
-		prs = frappe.get_all(
-			"Purchase Receipt",
-			filters={**pr_filters, "custom_load_reference_no": load_plan_name},
-			limit=1
-		)
-		if prs:
-			pr_found = True
-	
-	# Check load_reference_to
-	if not pr_found and frappe.db.has_column("Purchase Receipt", "load_reference_to"):
-		prs = frappe.get_all(
-			"Purchase Receipt",
-			filters={**pr_filters, "load_reference_to": load_plan_name},
-			limit=1
-		)
-		if prs:
-			pr_found = True
-	
-	# Check load_reference_no
-	if not pr_found and frappe.db.has_column("Purchase Receipt", "load_reference_no"):
-		prs = frappe.get_all(
-			"Purchase Receipt",
-			filters={**pr_filters, "load_reference_no": load_plan_name},
-			limit=1
-		)
-		if prs:
-			pr_found = True
-	
-	# Check if PR links to Load Dispatch directly via custom_load_dispatch
-	if not pr_found and load_dispatches:
-		ld_names = [ld.name for ld in load_dispatches]
+	load_plan_names = [name for name in dict.fromkeys(load_plan_names or []) if name]
+	statuses = {}
+	
+	received_queries = [
+		f"""
+		SELECT pr.`{fieldname}` as load_plan
+		FROM `tabPurchase Receipt` pr
+		WHERE pr.docstatus = 1 AND pr.`{fieldname}` IN %(load_plans)s
+		"""
+		for fieldname in LOAD_PLAN_RECEIPT_LINK_FIELDS
+		if has_column("Purchase Receipt", fieldname)
+	]
+	for doctype, condition in (("Purchase Receipt", ""), ("Purchase Invoice", "AND p.update_stock = 1")):
+		if has_column(doctype, "custom_load_dispatch"):
+			received_queries.append(f"""
+				SELECT ld.load_reference_no as load_plan
+				FROM `tab{doctype}` p
+				INNER JOIN `tabLoad Dispatch` ld ON ld.name = p.custom_load_dispatch
+				WHERE p.docstatus = 1 {condition} AND ld.load_reference_no IN %(load_plans)s
+			""")
+	
+	for start in range(0, len(load_plan_names), BULK_CHUNK_SIZE):
+		values = {"load_plans": load_plan_names[start:start + BULK_CHUNK_SIZE]}
 		
-		# Check custom_load_dispatch field (primary link from PR to Load Dispatch)
-		# Use exact match for each Load Dispatch name
-		for ld_name in ld_names:
-			if frappe.db.has_column("Purchase Receipt", "custom_load_dispatch"):
-				prs = frappe.get_all(
-					"Purchase Receipt",
-					filters={**pr_filters, "custom_load_dispatch": ld_name},
-					limit=1
-				)
-				if prs:
-					pr_found = True
-					break
+		received = set()
+		if received_queries:
+			received = {row[0] for row in frappe.db.sql(" UNION ".join(received_queries), values)}
 		
-		# Also check Purchase Invoice with update_stock
-		if not pr_found:
-			for ld_name in ld_names:
-				if frappe.db.has_column("Purchase Invoice", "custom_load_dispatch"):
-					pi_filters = {**pr_filters, "update_stock": 1}
-					pis = frappe.get_all(
-						"Purchase Invoice",
-						filters={**pi_filters, "custom_load_dispatch": ld_name},
-						limit=1
-					)
-					if pis:
-						pr_found = True
-						break
-	
-	if pr_found:
-		return "Received"
+		for name, current_status, has_dispatch in frappe.db.sql(
+			"""
+			SELECT lp.name, lp.status,
+				EXISTS(SELECT 1 FROM `tabLoad Dispatch` ld WHERE ld.load_reference_no = lp.name) as has_dispatch
+			FROM `tabLoad Plan` lp
+			WHERE lp.name IN %(load_plans)s
+			""",
+			values,
+		):
+			if name in received:
+				status = "Received"
+			elif has_dispatch:
+				status = "In-Transit"
+			else:
+				status = "Planned"
+			statuses[name] = frappe._dict(current_status=current_status, status=status)
 	
-	# Priority 2: If Load Dispatch exists but no PR - return "In-Transit"
-	if load_dispatches:
-		return "In-Transit"
+	return statuses
+
+
+def update_load_plan_statuses(load_plan_names, triggered_by):
+	"""Recompute Load Plan statuses as a set; changes are written through the write buffer.
 	
-	# Priority 3: If dispatch_plan_date exists, return "Planned"
-	dispatch_plan_date = load_plan.get("dispatch_plan_date")
-	if dispatch_plan_date:
-		return "Planned"
+	Returns:
+		list: names of the Load Plans whose status changed
+	"""
+	changed = []
+	for name, plan in get_load_plan_statuses(load_plan_names).items():
+		if plan.current_status == plan.status:
+			continue
+		buffer_set_value("Load Plan", name, {"status": plan.status}, update_modified=True)
+		frappe.logger().info(
+			f"Load Plan {name} status updated: {plan.current_status} -> {plan.status} (triggered by {triggered_by})"
+		)
+		changed.append(name)
+	return changed
+
+
+@frappe.whitelist()
+def get_load_plan_status(load_plan_name):
+	"""Get the status of a Load Plan (see get_load_plan_statuses).
 	
-	# Default: Planned
-	return "Planned"
+	Args:
+		load_plan_name: Name of the Load Plan document
+		
+	Returns:
+		str: Status of the Load Plan
+	"""
+	plan = get_load_plan_statuses([load_plan_name]).get(load_plan_name)
+	return plan.status if plan else "Planned"
 
 
 @frappe.whitelist()
@@ -1054,30 +776,17 @@ def batch_update_load_plan_status(load_plan_names):
 	Returns:
 		dict: Summary of updates with 'updated' count
 	"""
+	load_plan_names = frappe.parse_json(load_plan_names) if isinstance(load_plan_names, str) else load_plan_names
 	if not load_plan_names:
 		return {"updated": 0}
 	
-	updated_count = 0
-	
-	for load_plan_name in load_plan_names:
-		try:
-			# Get calculated status
-			new_status = get_load_plan_status(load_plan_name)
-			
-			# Update the status field if it's different
-			current_status = frappe.db.get_value("Load Plan", load_plan_name, "status")
-			
-			if current_status != new_status:
-				frappe.db.set_value("Load Plan", load_plan_name, "status", new_status)
-				updated_count += 1
-		except Exception as e:
-			frappe.log_error(
-				message=f"Error updating status for Load Plan {load_plan_name}: {str(e)}",
-				title="Batch Update Load Plan Status Error"
-			)
-			continue
-	
-	if updated_count > 0:
-		frappe.db.commit()
+	try:
+		changed = update_load_plan_statuses(load_plan_names, "list view")
+	except Exception as e:
+		frappe.log_error(
+			message=f"Error updating status for Load Plans {', '.join(load_plan_names)}: {str(e)}",
+			title="Batch Update Load Plan Status Error"
+		)
+		return {"updated": 0}
 	
-	return {"updated": updated_count}
\ No newline at end of file
+	return {"updated": len(changed)}
@@ -4,6 +4,8 @@
 import frappe
 from frappe.utils import flt, getdate, nowdate, date_diff
 
+from rkg.utils.schema import has_column
+
 
 def _build_where_clause(warehouse=None, item_code=None, status=None, from_date=None, to_date=None):
 	"""Build WHERE clause for Frame Aging queries."""
@@ -59,25 +61,20 @@ def get_frame_aging_data(where_clause, params):
 	]
 	
 	# Add custom fields if they exist
-	if frappe.db.has_column("Serial No", "color_code"):
+	if has_column("Serial No", "color_code"):
 		select_fields.append("sn.color_code")
-	if frappe.db.has_column("Serial No", "custom_engine_number"):
+	if has_column("Serial No", "custom_engine_number"):
 		select_fields.append("sn.custom_engine_number")
-	if frappe.db.has_column("Serial No", "custom_key_no"):
+	if has_column("Serial No", "custom_key_no"):
 		select_fields.append("sn.custom_key_no")
-	if frappe.db.has_column("Serial No", "custom_battery_no"):
+	if has_column("Serial No", "custom_battery_no"):
 		select_fields.append("sn.custom_battery_no")
 	
 	# Get frames with Purchase Receipt creation date
 	frames = frappe.db.sql(
 		f"""
 		SELECT {', '.join(select_fields)},
-			(SELECT DATE(MIN(pr.creation))
-			 FROM `tabPurchase Receipt` pr
-			 INNER JOIN `tabPurchase Receipt Item` pri ON pr.name = pri.parent
-			 WHERE (pri.serial_no = sn.name OR FIND_IN_SET(sn.name, pri.serial_no) > 0) 
-			   AND pr.docstatus = 1
-			 LIMIT 1) as purchase_receipt_date,
+			DATE(fl.purchase_receipt_date) as purchase_receipt_date,
 			fb.name as frame_bundle_name,
 			fb.battery_serial_no,
 			fb.battery_type,
@@ -86,6 +83,7 @@ def get_frame_aging_data(where_clause, params):
 			(SELECT COUNT(*) FROM `tabFrame Bundle Discard History` WHERE parent = fb.name) as discard_count,
 			(SELECT COUNT(*) FROM `tabFrame Bundle Swap History` WHERE parent = fb.name) as swap_count
 		FROM `tabSerial No` sn
+		LEFT JOIN `tabFrame Lineage` fl ON fl.name = sn.name
 		LEFT JOIN `tabFrame Bundle` fb ON fb.frame_no = sn.serial_no AND fb.docstatus = 1
 		WHERE {where_clause}
 		ORDER BY sn.creation DESC
@@ -365,14 +363,11 @@ def get_frame_aging_details(name):
 	# Get Purchase Receipt creation date (start date)
 	purchase_receipt_date = frappe.db.sql(
 		"""
-		SELECT DATE(MIN(pr.creation))
-		FROM `tabPurchase Receipt` pr
-		INNER JOIN `tabPurchase Receipt Item` pri ON pr.name = pri.parent
-		WHERE (pri.serial_no = %s OR FIND_IN_SET(%s, pri.serial_no) > 0)
-		  AND pr.docstatus = 1
-		LIMIT 1
+		SELECT DATE(purchase_receipt_date)
+		FROM `tabFrame Lineage`
+		WHERE name = %s
 		""",
-		(name, name),
+		(name,),
 		as_list=True,
 	)
 	
@@ -467,13 +462,13 @@ def get_frame_aging_details(name):
 		result["swap_count"] = 0
 	
 	# Add custom fields if they exist
-	if frappe.db.has_column("Serial No", "color_code"):
+	if has_column("Serial No", "color_code"):
 		result["color_code"] = getattr(frame_no, "color_code", None) or "-"
-	if frappe.db.has_column("Serial No", "custom_engine_number"):
+	if has_column("Serial No", "custom_engine_number"):
 		result["custom_engine_number"] = getattr(frame_no, "custom_engine_number", None) or "-"
-	if frappe.db.has_column("Serial No", "custom_key_no"):
+	if has_column("Serial No", "custom_key_no"):
 		result["custom_key_no"] = getattr(frame_no, "custom_key_no", None) or "-"
-	if frappe.db.has_column("Serial No", "custom_battery_no"):
+	if has_column("Serial No", "custom_battery_no"):
 		result["custom_battery_no"] = getattr(frame_no, "custom_battery_no", None) or "-"
 	
 	return {"frame_no": result}
@@ -1,6 +1,8 @@
 import frappe
 from frappe.utils import flt, getdate, nowdate
 
+from rkg.utils.write_buffer import buffer_set_value
+
 
 def _build_where_clause(doctype="Load Plan", status=None, from_date=None, to_date=None, load_reference=None):
 	"""Build WHERE clause for Load Plan or Load Dispatch queries."""
@@ -482,8 +484,7 @@ def recalculate_load_plan_quantities(load_reference_no=None):
 		total_qty = sum(flt(item.quantity) or 0 for item in items)
 		
 		# Update Load Plan
-		frappe.db.set_value("Load Plan", load_reference_no, "total_quantity", total_qty, update_modified=False)
-		frappe.db.commit()
+		buffer_set_value("Load Plan", load_reference_no, {"total_quantity": total_qty})
 		
 		return {
 			"success": True,
@@ -507,11 +508,9 @@ def recalculate_load_plan_quantities(load_reference_no=None):
 			
 			# Only update if different
 			if total_qty != current_qty:
-				frappe.db.set_value("Load Plan", lp.name, "total_quantity", total_qty, update_modified=False)
+				buffer_set_value("Load Plan", lp.name, {"total_quantity": total_qty})
 				updated_count += 1
 		
-		frappe.db.commit()
-		
 		return {
 			"success": True,
 			"message": f"Recalculated {updated_count} Load Plan(s) out of {len(load_plans)} total"
@@ -0,0 +1,20 @@
+# For license information, please see license.txt
+
+"""
+Patch to build Frame Lineage rows for frames dispatched, received, invoiced,
+bundled or assessed before the lineage table existed. From then on the rows are
+kept current by document events.
+"""
+
+import frappe
+
+from rkg.rkg.doctype.frame_lineage.frame_lineage import rebuild_frame_lineage
+
+
+def execute():
+	"""Build Frame Lineage from submitted Load Dispatch, Purchase Receipt/Invoice, Frame Bundle and Damage Assessment"""
+	frappe.reload_doc("rkg", "doctype", "frame_lineage")
+	rebuild_frame_lineage()
+	frappe.db.commit()
+	
+	frappe.logger().info(f"Built Frame Lineage for {frappe.db.count('Frame Lineage')} frame(s)")
@@ -0,0 +1,37 @@
+"""Set-based database helpers used where rows were previously written one at a time."""
+
+import frappe
+
+BULK_CHUNK_SIZE = 500
+
+
+def bulk_set_values(doctype, fieldname, values_by_name, update_modified=False, chunk_size=BULK_CHUNK_SIZE):
+	"""Set fieldname to a different value per document with one UPDATE ... CASE statement per chunk.
+
+	Args:
+		doctype: DocType whose table is updated
+		fieldname: column to set
+		values_by_name: {docname: value}
+		update_modified: also set modified / modified_by like frappe.db.set_value does
+	"""
+	names = list(values_by_name)
+	for start in range(0, len(names), chunk_size):
+		chunk = names[start:start + chunk_size]
+
+		case_sql = " ".join(["WHEN %s THEN %s"] * len(chunk))
+		params = []
+		for name in chunk:
+			params.extend((name, values_by_name[name]))
+
+		extra_sql = ""
+		if update_modified:
+			extra_sql = ", `modified` = %s, `modified_by` = %s"
+			params.extend((frappe.utils.now(), frappe.session.user))
+
+		params.extend(chunk)
+		frappe.db.sql(
+			f"""UPDATE `tab{doctype}`
+			SET `{fieldname}` = CASE `name` {case_sql} END{extra_sql}
+			WHERE `name` IN ({", ".join(["%s"] * len(chunk))})""",
+			params,
+		)
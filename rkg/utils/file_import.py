@@ -0,0 +1,208 @@
+"""Streaming readers shared by the CSV/Excel importers.
+
+Files are read lazily and handed downstream in bounded chunks so that a large
+dispatch file never has to be held in memory as a whole (nor duplicated into a
+pandas DataFrame) while it is being normalised.
+"""
+
+import csv
+import os
+from itertools import islice
+
+import frappe
+from frappe import _
+
+CSV_ENCODINGS = ["utf-8-sig", "utf-8", "utf-16-le", "utf-16-be", "latin-1", "cp1252"]
+IMPORT_CHUNK_SIZE = 500
+
+
+def get_file_path(file_url):
+	"""Resolve an attached file URL to its path on disk."""
+	from frappe.utils import get_site_path
+
+	if file_url.startswith("/files/"):
+		return get_site_path("public", file_url[1:])
+	elif file_url.startswith("/private/files/"):
+		return get_site_path("private", "files", file_url.split("/")[-1])
+	return get_site_path("public", "files", file_url)
+
+
+def open_csv_file(file_path, encodings=None):
+	"""Open a CSV file with the first encoding that can decode its head. Caller must close it."""
+	for encoding in encodings or CSV_ENCODINGS:
+		csvfile = None
+		try:
+			csvfile = open(file_path, "r", encoding=encoding, newline="")
+			csvfile.read(1024)
+			csvfile.seek(0)
+			return csvfile
+		except (UnicodeDecodeError, UnicodeError):
+			if csvfile:
+				csvfile.close()
+			continue
+
+	frappe.throw(_("Unable to read the file. Please ensure it is saved as CSV with a supported encoding (UTF-8, UTF-16, or Windows-1252)."))
+
+
+def iter_csv_rows(file_path, encodings=None):
+	"""Yield CSV rows as lists; the first row yielded is the header."""
+	csvfile = open_csv_file(file_path, encodings)
+	try:
+		yield from csv.reader(csvfile)
+	finally:
+		csvfile.close()
+
+
+def iter_xlsx_rows(file_path):
+	"""Yield rows of the first sheet as tuples using openpyxl read-only mode; the first row is the header."""
+	from openpyxl import load_workbook
+
+	workbook = load_workbook(file_path, read_only=True, data_only=True)
+	try:
+		yield from workbook.worksheets[0].iter_rows(values_only=True)
+	finally:
+		workbook.close()
+
+
+def iter_xls_rows(file_path):
+	"""Yield rows of a legacy .xls sheet. Falls back to pandas since openpyxl only reads .xlsx."""
+	try:
+		import pandas as pd
+	except ImportError:
+		frappe.throw(_("pandas library is required for Excel files. Please install it or use CSV format."))
+
+	df = pd.read_excel(file_path, header=None, dtype=object)
+	for row in df.itertuples(index=False, name=None):
+		yield row
+
+
+def iter_tabular_rows(file_path):
+	"""Yield raw rows (header first) from a CSV, XLSX or XLS file."""
+	file_ext = os.path.splitext(file_path)[1].lower()
+	if file_ext == ".csv":
+		return iter_csv_rows(file_path)
+	elif file_ext == ".xlsx":
+		return iter_xlsx_rows(file_path)
+	elif file_ext == ".xls":
+		return iter_xls_rows(file_path)
+
+	frappe.throw(_("Unsupported file format. Please upload CSV or Excel file."))
+
+
+def is_empty_value(value):
+	"""Check if value is empty or NaN."""
+	if value is None:
+		return True
+	if isinstance(value, float):
+		return value != value
+	if isinstance(value, str):
+		return not value.strip()
+	return False
+
+
+def read_tabular_file(file_path):
+	"""Return (headers, rows) for a CSV/Excel file; rows is a lazy iterator over the data rows."""
+	rows = iter_tabular_rows(file_path)
+	header = next(rows, None) or ()
+	return [str(h).strip() if h is not None else "" for h in header], rows
+
+
+def iter_chunks(rows, chunk_size=IMPORT_CHUNK_SIZE):
+	"""Yield lists of at most chunk_size rows, skipping blank rows, without materialising the input."""
+	non_blank = (row for row in rows if row and not all(is_empty_value(value) for value in row))
+	while chunk := list(islice(non_blank, chunk_size)):
+		yield chunk
+
+
+def normalize_header(header):
+	"""Normalise a header or alias for matching: case, BOM, punctuation and whitespace insensitive."""
+	if header is None:
+		return ""
+	normalized = str(header).replace("\ufeff", "").replace("\u200b", "").lower().strip()
+	normalized = normalized.replace(".", "").replace("_", " ").replace("-", " ")
+	return " ".join(normalized.split())
+
+
+class ColumnPlan:
+	"""A header row resolved once into a fixed column index -> fieldname projection.
+
+	Build it with compile_column_plan(); map_row() then only does positional
+	lookups, so no header or alias is re-normalised per cell.
+	"""
+
+	def __init__(self, headers, projection, passthrough=()):
+		self.headers = headers
+		# ((fieldname, (col_idx, ...), converter), ...), candidate columns in alias priority order
+		self.projection = projection
+		# ((header, col_idx), ...) for columns no alias claimed
+		self.passthrough = passthrough
+		self.fields = frozenset(fieldname for fieldname, _, _ in projection)
+		self._normalized_headers = frozenset(normalize_header(h) for h in headers if h)
+
+	def has_header(self, header):
+		return normalize_header(header) in self._normalized_headers
+
+	def missing_headers(self, expected_headers):
+		return [h for h in expected_headers if not self.has_header(h)]
+
+	def map_row(self, row, keep_empty=False):
+		"""Project a positional row onto fieldnames.
+
+		For each field the first non-empty candidate column wins. Empty or
+		unconvertible fields are omitted, or set to None when keep_empty is set.
+		"""
+		row_len = len(row)
+		mapped = {}
+		for fieldname, indexes, converter in self.projection:
+			value = None
+			for idx in indexes:
+				if idx < row_len and not is_empty_value(row[idx]):
+					value = row[idx]
+					break
+
+			if value is not None and converter:
+				value = converter(value)
+
+			if value is not None or keep_empty:
+				mapped[fieldname] = value
+
+		for header, idx in self.passthrough:
+			if idx < row_len and not is_empty_value(row[idx]):
+				mapped[header] = row[idx]
+
+		return mapped
+
+
+def compile_column_plan(headers, aliases, converters=None, default_converter=None, passthrough=False):
+	"""Compile a header row against an alias table.
+
+	Args:
+		headers: header row as read from the file
+		aliases: ordered {alias: fieldname}; earlier aliases take priority for the same field
+		converters: optional {fieldname: callable} applied to non-empty values
+		default_converter: converter for fields without an entry in converters
+		passthrough: keep unmatched columns under their original header
+	"""
+	converters = converters or {}
+	header_indexes = {}
+	for idx, header in enumerate(headers):
+		header_indexes.setdefault(normalize_header(header), []).append(idx)
+
+	field_indexes = {}
+	claimed = set()
+	for alias, fieldname in aliases.items():
+		for idx in header_indexes.get(normalize_header(alias), ()):
+			indexes = field_indexes.setdefault(fieldname, [])
+			if idx not in indexes:
+				indexes.append(idx)
+				claimed.add(idx)
+
+	projection = tuple(
+		(fieldname, tuple(indexes), converters.get(fieldname, default_converter))
+		for fieldname, indexes in field_indexes.items()
+	)
+	unclaimed = ()
+	if passthrough:
+		unclaimed = tuple((h, idx) for idx, h in enumerate(headers) if h and idx not in claimed)
+
+	return ColumnPlan(headers, projection, unclaimed)
@@ -0,0 +1,93 @@
+"""Parse cache for attached import files.
+
+The same dispatch, load plan or battery file is usually attached several times
+(preview, import, re-import after fixing the load reference). Parsed rows are
+kept in Redis keyed by the SHA-256 of the file content, so an identical file is
+only read and normalised once. Entries expire after PARSE_CACHE_TTL and the
+least recently used ones are evicted once the cache grows past
+PARSE_CACHE_MAX_BYTES.
+"""
+
+import hashlib
+import pickle
+import time
+
+import frappe
+
+PARSE_CACHE_PREFIX = "rkg:parse_cache"
+PARSE_CACHE_INDEX = f"{PARSE_CACHE_PREFIX}:index"
+PARSE_CACHE_TTL = 6 * 60 * 60
+PARSE_CACHE_MAX_BYTES = 64 * 1024 * 1024
+# Bump when the normalised row format of any importer changes
+PARSE_CACHE_VERSION = 3
+
+
+def get_file_content_hash(file_path, block_size=1024 * 1024):
+	"""Return the SHA-256 hex digest of a file, read in blocks."""
+	sha256 = hashlib.sha256()
+	with open(file_path, "rb") as f:
+		for block in iter(lambda: f.read(block_size), b""):
+			sha256.update(block)
+	return sha256.hexdigest()
+
+
+def _value_key(entry):
+	return f"{PARSE_CACHE_PREFIX}:{entry}"
+
+
+def get_cached_parse(namespace, file_path, parse):
+	"""Return parse() for file_path, reusing an earlier result for a file with identical content.
+
+	Args:
+		namespace: importer name, so different importers never share entries
+		file_path: path of the attached file on disk
+		parse: callable that reads and normalises the file; only called on a miss
+
+	The value is pickled once; the same bytes are measured and stored, and every hit
+	unpickles a private copy.
+	"""
+	try:
+		entry = f"{namespace}:{PARSE_CACHE_VERSION}:{get_file_content_hash(file_path)}"
+	except OSError:
+		return parse()
+
+	cache = frappe.cache()
+	now = time.time()
+
+	redis_key = cache.make_key(_value_key(entry))
+	data = cache.get(redis_key)
+	if data is not None:
+		meta = cache.hget(PARSE_CACHE_INDEX, entry)
+		if meta:
+			cache.hset(PARSE_CACHE_INDEX, entry, {**meta, "last_used": now})
+		return pickle.loads(data)
+
+	value = parse()
+
+	data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+	if len(data) <= PARSE_CACHE_MAX_BYTES:
+		cache.set(redis_key, data, ex=PARSE_CACHE_TTL)
+		cache.hset(PARSE_CACHE_INDEX, entry, {"size": len(data), "stored_at": now, "last_used": now})
+		_evict_parse_cache(cache, now)
+
+	return value
+
+
+def _evict_parse_cache(cache, now):
+	"""Drop expired index entries, then least recently used ones until the cache fits PARSE_CACHE_MAX_BYTES."""
+	live = []
+	for entry, meta in (cache.hgetall(PARSE_CACHE_INDEX) or {}).items():
+		entry = entry.decode() if isinstance(entry, bytes) else entry
+		if not meta or meta.get("stored_at", 0) + PARSE_CACHE_TTL < now:
+			cache.hdel(PARSE_CACHE_INDEX, entry)
+			continue
+		live.append((meta.get("last_used", 0), meta.get("size", 0), entry))
+
+	total_size = sum(size for _, size, _ in live)
+	for _, size, entry in sorted(live):
+		if total_size <= PARSE_CACHE_MAX_BYTES:
+			break
+		cache.delete_value(_value_key(entry))
+		cache.hdel(PARSE_CACHE_INDEX, entry)
+		total_size -= size
+
@@ -0,0 +1,122 @@
+"""Coalescing background queue for Load Dispatch and Load Plan rollups.
+
+Purchase Receipt/Invoice hooks do not recompute Load Plan status (or Load
+Dispatch totals, when their delta update fails) themselves; they request a
+rollup for the affected documents.
+Requests are kept in a Redis set, so the same document requested by fifty
+invoice submits is recomputed once. A single job, guarded by the
+ROLLUP_SCHEDULED_KEY flag, runs once no new request arrived for
+ROLLUP_DEBOUNCE_SECONDS (at most ROLLUP_MAX_DELAY_SECONDS after it was
+scheduled) and recomputes every pending document in one batch per DocType.
+While requests keep arriving the job does not sleep through the debounce: it
+re-enqueues itself behind the other queued jobs and returns. It clears the flag
+before it takes the pending set, so a request arriving while it runs schedules
+the next job instead of being left for the scheduler, which only flushes what a
+lost job left behind.
+"""
+
+import time
+
+import frappe
+
+ROLLUP_PENDING_KEY = "rkg:rollups:pending"
+ROLLUP_LAST_REQUEST_KEY = "rkg:rollups:last_request"
+ROLLUP_SCHEDULED_KEY = "rkg:rollups:scheduled"
+ROLLUP_DEBOUNCE_SECONDS = 3
+ROLLUP_MAX_DELAY_SECONDS = 30
+# A lost job only holds the flag this long; the scheduler flushes its requests meanwhile
+ROLLUP_SCHEDULED_EXPIRY = 5 * 60
+# Longest pause a job takes before handing its worker back
+ROLLUP_POLL_SECONDS = 1
+
+# Handlers run in this order: Load Dispatches first, then Load Plans
+ROLLUP_HANDLERS = {
+	"Load Dispatch": "rkg.rkg.doctype.load_dispatch.load_dispatch.refresh_load_dispatch_rollups",
+	"Load Plan": "rkg.rkg.doctype.load_plan.load_plan.refresh_load_plan_statuses",
+}
+
+
+def request_rollups(doctype, names, now=False):
+	"""Queue a rollup recompute for documents once the current transaction commits.
+
+	Args:
+		doctype: a DocType of ROLLUP_HANDLERS
+		names: document names
+		now: recompute synchronously, for callers that return the value in the response
+	"""
+	names = [name for name in dict.fromkeys(names or []) if name]
+	if not names:
+		return
+
+	if now or frappe.flags.in_test or frappe.flags.in_migrate or frappe.flags.in_install:
+		frappe.get_attr(ROLLUP_HANDLERS[doctype])(names)
+		return
+
+	def enqueue():
+		cache = frappe.cache()
+		cache.sadd(ROLLUP_PENDING_KEY, *(f"{doctype}::{name}" for name in names))
+		now = time.time()
+		cache.set(cache.make_key(ROLLUP_LAST_REQUEST_KEY), now, ex=ROLLUP_SCHEDULED_EXPIRY)
+		if cache.set(cache.make_key(ROLLUP_SCHEDULED_KEY), 1, nx=True, ex=ROLLUP_SCHEDULED_EXPIRY):
+			_enqueue_rollup_job(now)
+
+	frappe.db.after_commit.add(enqueue)
+
+
+def _enqueue_rollup_job(scheduled_at):
+	frappe.enqueue(
+		"rkg.utils.rollups.run_rollup_queue",
+		queue="long",
+		job_name="rkg_rollup_queue",
+		scheduled_at=scheduled_at,
+	)
+
+
+def run_rollup_queue(scheduled_at=None):
+	"""Background job: once requests have settled, recompute everything pending.
+
+	Until then it re-enqueues itself instead of holding the worker for the whole debounce.
+	"""
+	cache = frappe.cache()
+	deadline = (scheduled_at or time.time()) + ROLLUP_MAX_DELAY_SECONDS
+	last_request = float(cache.get(cache.make_key(ROLLUP_LAST_REQUEST_KEY)) or 0)
+	wait = min(last_request + ROLLUP_DEBOUNCE_SECONDS, deadline) - time.time()
+	if wait > 0:
+		time.sleep(min(wait, ROLLUP_POLL_SECONDS))
+		if wait > ROLLUP_POLL_SECONDS:
+			_enqueue_rollup_job(scheduled_at)
+			return
+
+	# Requests from here on schedule a new job; the ones already pending are flushed below
+	cache.delete(cache.make_key(ROLLUP_SCHEDULED_KEY))
+	flush_rollup_queue()
+
+
+def flush_rollup_queue():
+	"""Recompute every pending rollup once. Also run by the scheduler as a safety net."""
+	cache = frappe.cache()
+	# Requests that arrive while a batch is running are picked up by the next pass
+	while True:
+		members = cache.smembers(ROLLUP_PENDING_KEY)
+		if not members:
+			return
+		cache.srem(ROLLUP_PENDING_KEY, *members)
+
+		names_by_doctype = {}
+		for member in members:
+			member = member.decode() if isinstance(member, bytes) else member
+			doctype, name = member.split("::", 1)
+			names_by_doctype.setdefault(doctype, []).append(name)
+
+		for doctype, handler in ROLLUP_HANDLERS.items():
+			if doctype not in names_by_doctype:
+				continue
+			try:
+				frappe.get_attr(handler)(names_by_doctype[doctype])
+				frappe.db.commit()
+			except Exception:
+				frappe.db.rollback()
+				frappe.log_error(
+					f"Error recomputing {doctype} rollups for {', '.join(names_by_doctype[doctype])}\nTraceback: {frappe.get_traceback()}",
+					"Rollup Queue Error"
+				)
@@ -0,0 +1,35 @@
+"""Schema capability registry.
+
+Optional columns (custom fields such as Serial No.custom_engine_number or
+Purchase Receipt.custom_load_dispatch) are looked up once per worker and table
+instead of calling frappe.db.has_column inside loops and hooks. The registry is
+cleared after migrate and whenever a Custom Field changes.
+"""
+
+import frappe
+
+from rkg.utils.worker_cache import WorkerCache
+
+_table_columns = WorkerCache("schema")
+
+
+def get_columns(doctype):
+	"""Return the set of columns of a DocType's table (empty if the table does not exist)."""
+	columns = _table_columns.get_values()
+	if doctype not in columns:
+		try:
+			columns[doctype] = frozenset(frappe.db.get_table_columns(doctype))
+		except Exception:
+			# Table missing (e.g. app not installed yet); don't cache so it is retried
+			return frozenset()
+	return columns[doctype]
+
+
+def has_column(doctype, column):
+	"""Cached replacement for frappe.db.has_column."""
+	return column in get_columns(doctype)
+
+
+def clear_schema_cache(doc=None, method=None):
+	"""Drop the registry in every worker. Hooked to after_migrate and Custom Field changes."""
+	_table_columns.invalidate()
@@ -0,0 +1,33 @@
+# Copyright (c) 2026, beetashoke.chakraborty@clapgrow.com and Contributors
+# See license.txt
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from rkg.utils.schema import clear_schema_cache, has_column
+from rkg.utils.worker_cache import WorkerCache
+
+
+class TestWorkerCache(FrappeTestCase):
+	def test_has_column(self):
+		self.assertTrue(has_column("Load Dispatch", "load_reference_no"))
+		self.assertFalse(has_column("Load Dispatch", "rkg_no_such_column"))
+		self.assertFalse(has_column("RKG No Such DocType", "name"))
+
+	def test_has_column_after_invalidate(self):
+		self.assertTrue(has_column("Load Dispatch", "name"))
+		clear_schema_cache()
+		self.assertTrue(has_column("Load Dispatch", "name"))
+
+	def test_invalidate_clears_values(self):
+		cache = WorkerCache("rkg_test_worker_cache")
+		cache.get_values()["key"] = "value"
+		self.assertEqual(cache.get_values().get("key"), "value")
+
+		cache.invalidate()
+		self.assertNotIn("key", cache.get_values())
+
+	def test_generation_is_read_once_per_request(self):
+		cache = WorkerCache("rkg_test_worker_cache")
+		cache.get_values()
+		self.assertIn("rkg_test_worker_cache", frappe.local.rkg_worker_cache_generations)
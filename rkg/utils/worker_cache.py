@@ -0,0 +1,39 @@
+"""Per-worker caches that are invalidated across workers.
+
+Values live in a plain dict in the worker process, per site. Invalidating bumps a
+generation counter in Redis; every worker compares its copy against that counter
+once per request or job and starts over when it has changed.
+"""
+
+import frappe
+
+
+class WorkerCache:
+	def __init__(self, name):
+		self.name = name
+		self.generation_key = f"rkg:{name}:generation"
+		# {site: {"generation": ..., "values": {...}}}
+		self._sites = {}
+
+	def _get_generation(self):
+		generations = getattr(frappe.local, "rkg_worker_cache_generations", None)
+		if generations is None:
+			generations = frappe.local.rkg_worker_cache_generations = {}
+		if self.name not in generations:
+			generations[self.name] = frappe.cache().get_value(self.generation_key) or 0
+		return generations[self.name]
+
+	def get_values(self):
+		"""Return this site's dict of cached values, emptied if another worker invalidated it."""
+		site = getattr(frappe.local, "site", None)
+		generation = self._get_generation()
+		entry = self._sites.get(site)
+		if entry is None or entry["generation"] != generation:
+			entry = self._sites[site] = {"generation": generation, "values": {}}
+		return entry["values"]
+
+	def invalidate(self):
+		"""Drop the cached values in this worker and in all other workers of the site."""
+		self._sites.pop(getattr(frappe.local, "site", None), None)
+		frappe.cache().set_value(self.generation_key, (frappe.cache().get_value(self.generation_key) or 0) + 1)
+		(getattr(frappe.local, "rkg_worker_cache_generations", None) or {}).pop(self.name, None)
@@ -0,0 +1,65 @@
+"""Request-scoped write buffer for side-effect updates.
+
+Doc event handlers and helpers used to finish each side-effect update (warehouse
+sync, status, counters, link fields) with its own frappe.db.commit(), flushing
+the redo log every time and committing half of the triggering document's
+transaction. They now queue the values here instead. The buffer is flushed as
+one UPDATE ... CASE per DocType and field just before the transaction commits,
+and dropped if it rolls back, so the updates land atomically with the document
+that caused them.
+
+Buffered values are not visible to reads in the same transaction: use it for
+writes nothing reads back before the commit.
+"""
+
+import frappe
+
+from rkg.utils.db import bulk_set_values
+
+
+def _get_buffer():
+	"""{(doctype, fieldname, update_modified): {name: value}} for the current transaction."""
+	buffer = getattr(frappe.local, "rkg_write_buffer", None)
+	if buffer is None:
+		buffer = frappe.local.rkg_write_buffer = {}
+		frappe.db.before_commit.add(flush_write_buffer)
+		frappe.db.after_rollback.add(discard_write_buffer)
+	return buffer
+
+
+def buffer_set_value(doctype, name, values, update_modified=False):
+	"""Queue frappe.db.set_value(doctype, name, values) until the transaction commits.
+
+	Args:
+		doctype: DocType to update
+		name: document name
+		values: {fieldname: value}
+		update_modified: also set modified / modified_by
+	"""
+	if not name:
+		return
+
+	buffer = _get_buffer()
+	for fieldname, value in values.items():
+		buffer.setdefault((doctype, fieldname, update_modified), {})[name] = value
+
+
+def flush_write_buffer():
+	"""Write everything buffered with one grouped statement per DocType and field."""
+	buffer = getattr(frappe.local, "rkg_write_buffer", None)
+	frappe.local.rkg_write_buffer = None
+	if not buffer:
+		return
+
+	touched = set()
+	for (doctype, fieldname, update_modified), values_by_name in buffer.items():
+		bulk_set_values(doctype, fieldname, values_by_name, update_modified=update_modified)
+		touched.update((doctype, name) for name in values_by_name)
+
+	for doctype, name in touched:
+		frappe.clear_document_cache(doctype, name)
+
+
+def discard_write_buffer():
+	"""Drop buffered writes when the transaction rolls back."""
+	frappe.local.rkg_write_buffer = None